@@ -6,12 +6,20 @@ Uses Google GenAI for chat with tool use.
 import json
 import logging
 import os
-from typing import Any, Dict, List, Optional
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
 from datetime import datetime
-import asyncio # Import asyncio for list_models call
+import asyncio # Import asyncio for list_models call and the init lock
 
 # Import the newer Google Generative AI library
 import google.generativeai as genai  
+from google.api_core import exceptions as google_exceptions
+
+from database import settings
+from history_window import window_history
+from metrics import metrics
+from resilience import CircuitBreaker, CircuitOpenError, call_with_resilience
+from usage_ledger import usage_ledger
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -20,6 +28,16 @@ logger = logging.getLogger(__name__)
 # --- Global/Cached Model Configuration ---
 _cached_model_name: Optional[str] = None
 _cached_generative_model: Any = None
+_model_init_lock = asyncio.Lock()
+_agent_ready = False
+
+# Shared by every Gemini call in this process
+gemini_breaker = CircuitBreaker(
+    "gemini",
+    failure_threshold=settings.LLM_BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=settings.LLM_BREAKER_RESET_SECONDS,
+)
+metrics.register_gauge("llm_breaker.state", lambda: gemini_breaker.state)
 
 # --- Environment Variables ---
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
@@ -54,27 +72,67 @@ Your main capabilities are:
 - Always acknowledge the user's request before taking action.
 """
 
+def _list_function_calling_models() -> List[str]:
+    """Blocking call to genai.list_models(); run it off the event loop."""
+    available_models_with_tools = []
+    # List models using the newer library approach
+    for model in genai.list_models():
+        # Check if model supports function calling in newer library
+        if "functions" in model.supported_generation_methods:
+            available_models_with_tools.append(model.name)
+            logger.debug(f"Model '{model.name}' supports function calling.")
+    return available_models_with_tools
+
+
+def _read_model_cache(preferred_model: Optional[str]) -> Optional[str]:
+    """Return the model name saved by a previous process, if still fresh."""
+    try:
+        with open(settings.GEMINI_MODEL_CACHE_FILE) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cached, dict) or cached.get("preferred_model") != preferred_model:
+        return None
+    if time.time() - cached.get("resolved_at", 0) > settings.GEMINI_MODEL_CACHE_TTL_SECONDS:
+        return None
+    return cached.get("model_name")
+
+
+def _write_model_cache(model_name: str, preferred_model: Optional[str]) -> None:
+    """Persist the detected model name so restarts can skip list_models."""
+    try:
+        with open(settings.GEMINI_MODEL_CACHE_FILE, "w") as f:
+            json.dump({
+                "model_name": model_name,
+                "preferred_model": preferred_model,
+                "resolved_at": time.time(),
+            }, f)
+    except OSError as e:
+        logger.warning(f"Could not write Gemini model cache file: {e}")
+
+
 async def get_supported_gemini_model_name(api_key: str, preferred_model: Optional[str] = None) -> Optional[str]:
     """
     Dynamically detects an available Gemini model that supports function calling.
     Prioritizes preferred_model if specified and available.
+    A fresh result saved in settings.GEMINI_MODEL_CACHE_FILE is used without
+    listing models; a newly detected model is saved there.
     """
     logger.info("Attempting to detect supported Gemini model name.")
     if not api_key:
         logger.error("API key is required to list Gemini models. Cannot proceed with model detection.")
         return None
 
+    cached_model_name = _read_model_cache(preferred_model)
+    if cached_model_name:
+        logger.info(f"Using Gemini model from cache file: {cached_model_name}")
+        return cached_model_name
+
     # Configure the API key for the library
     genai.configure(api_key=api_key)
 
-    available_models_with_tools = []
     try:
-        # List models using the newer library approach
-        for model in genai.list_models():
-            # Check if model supports function calling in newer library
-            if "functions" in model.supported_generation_methods:
-                available_models_with_tools.append(model.name)
-                logger.debug(f"Model '{model.name}' supports function calling.")
+        available_models_with_tools = await asyncio.to_thread(_list_function_calling_models)
     except Exception as e:
         logger.error(f"Error listing Gemini models: {e}", exc_info=True)
         # Fallback to hardcoded models
@@ -85,6 +143,14 @@ async def get_supported_gemini_model_name(api_key: str, preferred_model: Optiona
         logger.warning(f"Falling back to hardcoded models: {hardcoded_fallbacks}")
         return next((m for m in hardcoded_fallbacks if m.startswith('gemini')), None)
 
+    selected = _select_model_name(available_models_with_tools, preferred_model)
+    if selected:
+        _write_model_cache(selected, preferred_model)
+    return selected
+
+
+def _select_model_name(available_models_with_tools: List[str], preferred_model: Optional[str]) -> Optional[str]:
+    """Pick a model from the models that support function calling."""
     if not available_models_with_tools:
         logger.error("No Gemini models found that support function calling with the provided API key.")
         return None
@@ -105,13 +171,9 @@ async def get_supported_gemini_model_name(api_key: str, preferred_model: Optiona
             logger.info(f"Selected priority model: {model_name}")
             return model_name
 
-    if available_models_with_tools:
-        selected = available_models_with_tools[0]
-        logger.warning(f"No priority model found, selecting first available: {selected}")
-        return selected
-
-    logger.error("Could not find any suitable Gemini model for function calling.")
-    return None
+    selected = available_models_with_tools[0]
+    logger.warning(f"No priority model found, selecting first available: {selected}")
+    return selected
 
 async def initialize_generative_model(api_key: str, model_name: str, tools: list) -> Any:
     """Initializes and returns the GenerativeModel instance."""
@@ -168,47 +230,238 @@ from agent_tools import get_genai_task_management_tools
 async def get_generative_model() -> Any:
     """
     Retrieves the initialized GenerativeModel, initializing it if not already done.
-    Uses cached model name and object.
+    Uses cached model name and object. Normally already done by warm_up_agent
+    at startup; concurrent callers share a single initialization.
     """
     global _cached_model_name, _cached_generative_model
 
     if _cached_generative_model:
-        logger.info("Using cached GenerativeModel.")
         return _cached_generative_model
 
-    logger.info("GenerativeModel not cached, attempting to initialize.")
-    if not GEMINI_API_KEY:
-        logger.error("GEMINI_API_KEY is not set. Cannot initialize GenerativeModel.")
-        return None
+    async with _model_init_lock:
+        if _cached_generative_model:
+            return _cached_generative_model
 
-    if not _cached_model_name:
-        logger.info("Model name not cached, attempting to detect a suitable model.")
-        _cached_model_name = await get_supported_gemini_model_name(GEMINI_API_KEY, GEMINI_MODEL_ENV)
-        if not _cached_model_name:
-            logger.error("Failed to determine a suitable Gemini model name. Cannot initialize GenerativeModel.")
+        logger.info("GenerativeModel not cached, attempting to initialize.")
+        if not GEMINI_API_KEY:
+            logger.error("GEMINI_API_KEY is not set. Cannot initialize GenerativeModel.")
             return None
-        logger.info(f"Detected or selected model name: {_cached_model_name}")
 
-    genai_tools = get_genai_task_management_tools()
-    _cached_generative_model = await initialize_generative_model(GEMINI_API_KEY, _cached_model_name, genai_tools)
-    return _cached_generative_model
+        if not _cached_model_name:
+            logger.info("Model name not cached, attempting to detect a suitable model.")
+            _cached_model_name = await get_supported_gemini_model_name(GEMINI_API_KEY, GEMINI_MODEL_ENV)
+            if not _cached_model_name:
+                logger.error("Failed to determine a suitable Gemini model name. Cannot initialize GenerativeModel.")
+                return None
+            logger.info(f"Detected or selected model name: {_cached_model_name}")
+
+        genai_tools = get_genai_task_management_tools()
+        _cached_generative_model = await initialize_generative_model(GEMINI_API_KEY, _cached_model_name, genai_tools)
+        return _cached_generative_model
 
 
-async def run_agent(
+async def warm_up_agent() -> None:
+    """
+    Resolve the model and build the GenerativeModel ahead of the first chat
+    request. Called in the background from the app lifespan; the agent is
+    reported ready once this finishes, whether or not a model was found
+    (without one, chat falls back to the rule-based parser).
+    """
+    global _agent_ready
+    started = time.monotonic()
+    try:
+        model = await get_generative_model()
+        if model:
+            logger.info(f"Agent warm-up finished in {time.monotonic() - started:.2f}s using {_cached_model_name}.")
+        else:
+            logger.warning("Agent warm-up finished without a usable model.")
+    except Exception as e:
+        logger.error(f"Agent warm-up failed: {e}", exc_info=True)
+    finally:
+        _agent_ready = True
+
+
+def is_agent_ready() -> bool:
+    """True once warm_up_agent has finished."""
+    return _agent_ready
+
+
+def get_model_name() -> Optional[str]:
+    """Name of the resolved Gemini model, if any."""
+    return _cached_model_name
+
+
+def _format_history(history: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Normalize a list of message dicts into GenAI history entries."""
+    formatted_history = []
+    if not history:
+        return formatted_history
+    for msg in history:
+        role = msg.get('role')
+        parts = []
+        if isinstance(msg.get('parts'), list):
+            for part in msg['parts']:
+                if isinstance(part, dict) and 'text' in part:
+                    parts.append({'text': part['text']})
+                elif isinstance(part, dict) and 'function_call' in part:
+                    parts.append({'function_call': part['function_call']})
+                elif isinstance(part, dict) and 'function_response' in part:
+                    func_resp = part['function_response']
+                    if isinstance(func_resp, dict) and 'name' in func_resp and 'response' in func_resp:
+                        parts.append({'function_response': func_resp})
+                    else:
+                        logger.warning(f"Malformed function_response in history: {func_resp}")
+                        if 'name' in func_resp and 'content' in func_resp:
+                            parts.append({'function_response': {'name': func_resp['name'], 'response': {'content': func_resp['content']}}})
+
+        if parts:
+            formatted_history.append({'role': role, 'parts': parts})
+    return formatted_history
+
+
+def _send_error_result(error: Exception) -> Dict[str, Any]:
+    """Map an exception raised while sending a message to an agent result dict."""
+    if isinstance(error, CircuitOpenError):
+        logger.warning(f"Skipping GenAI call: {error}")
+        return {
+            "content": "My AI service is temporarily unavailable.",
+            "tool_calls": [],
+            "error": f"CircuitOpenError: {error}"
+        }
+    if isinstance(error, genai.types.BlockedPromptException):
+        logger.error(f"GenAI BlockedPromptException: {error}", exc_info=True)
+        return {
+            "content": "I'm sorry, your request was blocked due to safety concerns. Please try rephrasing.",
+            "tool_calls": [],
+            "error": f"BlockedPromptException: {error}"
+        }
+    if isinstance(error, (genai.types.StopCandidateException, genai.types.BrokenResponseError)):
+        logger.error(f"GenAI response validation error (tool issue?): {error}", exc_info=True)
+        return {
+            "content": "I encountered an issue processing a tool's response or preparing a tool call. "
+                       "This might be a temporary API issue or a malformed tool definition.",
+            "tool_calls": [],
+            "error": f"ResponseValidationError: {error}"
+        }
+    if isinstance(error, (google_exceptions.TooManyRequests, google_exceptions.ResourceExhausted)) or (
+            isinstance(error, google_exceptions.RetryError) and "429" in str(error)):
+        logger.error(f"GenAI quota error: {error}", exc_info=True)
+        return {
+            "content": "I'm sorry, but we're experiencing high demand and have reached our usage limit for the AI service. Please try again later.",
+            "tool_calls": [],
+            "error": "QuotaExceededError: The user has sent too many requests in a given amount of time."
+        }
+    if isinstance(error, google_exceptions.GoogleAPIError):  # Catch API related client errors
+        logger.error(f"GenAI API error: {error}", exc_info=True)
+        return {
+            "content": "There was a client-side error communicating with the Gemini API. "
+                       "Please check your network or API key permissions, or try again later.",
+            "tool_calls": [],
+            "error": f"RetryError: {error}"
+        }
+    logger.error(f"Error sending message to model: {error}", exc_info=True)
+    return {
+        "content": "I'm sorry, I couldn't get a response from the AI. "
+                   "It might be a temporary issue or an invalid model/API key combination.",
+        "tool_calls": [],
+        "error": f"AI Response Error: {error}"
+    }
+
+
+async def _send_with_resilience(chat: Any, user_input: str, stream: bool = False) -> Any:
+    """
+    Send a message through the Gemini circuit breaker, retrying transient
+    failures with jittered backoff. A failed attempt leaves the chat
+    history untouched, so the same ChatSession can be retried.
+    """
+    return await call_with_resilience(
+        lambda: chat.send_message_async(user_input, stream=stream),
+        gemini_breaker,
+        max_retries=settings.LLM_MAX_RETRIES,
+        base_delay=settings.LLM_RETRY_BASE_DELAY_SECONDS,
+        max_delay=settings.LLM_RETRY_MAX_DELAY_SECONDS,
+        attempt_timeout=settings.LLM_ATTEMPT_TIMEOUT_SECONDS,
+    )
+
+
+async def generate_text(
+    prompt: str,
     user_id: int,
-    user_input: str,
-    history: List[Dict[str, Any]] = None,
-) -> Dict[str, Any]:
+    conversation_id: Optional[int] = None,
+    max_output_tokens: int = 1024,
+) -> Optional[str]:
     """
-    Run the AI agent with the Google GenAI API.
-    Args:
-        user_id: The ID of the user.
-        user_input: The current message from the user.
-        history: The full conversation history (list of message dicts).
-    Returns:
-        Dict with 'content' (AI response), 'tool_calls' (if any), 'error' (if any).
+    One-shot completion without tools or chat history (e.g. for conversation
+    summaries). Goes through the same breaker and retries as chat turns and
+    is recorded in the usage ledger as a "summary" call.
+    Returns None if the agent is not configured or the call fails.
     """
+    if not GEMINI_API_KEY or not await get_generative_model():
+        return None
+    model = genai.GenerativeModel(
+        model_name=_cached_model_name,
+        generation_config=genai.GenerationConfig(temperature=0.2, max_output_tokens=max_output_tokens),
+    )
+    started = time.monotonic()
+    try:
+        response = await call_with_resilience(
+            lambda: model.generate_content_async(prompt),
+            gemini_breaker,
+            max_retries=settings.LLM_MAX_RETRIES,
+            base_delay=settings.LLM_RETRY_BASE_DELAY_SECONDS,
+            max_delay=settings.LLM_RETRY_MAX_DELAY_SECONDS,
+            attempt_timeout=settings.LLM_ATTEMPT_TIMEOUT_SECONDS,
+        )
+        usage_ledger.record(user_id, "summary", _cached_model_name, time.monotonic() - started,
+                            conversation_id=conversation_id, response=response)
+        return response.text.strip() or None
+    except Exception as e:
+        usage_ledger.record(user_id, "summary", _cached_model_name, time.monotonic() - started,
+                            conversation_id=conversation_id, error=e)
+        logger.warning(f"Text generation failed: {type(e).__name__}: {e}")
+        return None
+
 
+def _plain_value(value: Any) -> Any:
+    """Normalize decoded function call args: whole-number floats become ints."""
+    if isinstance(value, dict):
+        return {k: _plain_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_plain_value(v) for v in value]
+    if isinstance(value, float) and value.is_integer():
+        # JSON numbers arrive as floats (e.g. task_id 3.0)
+        return int(value)
+    return value
+
+
+def _function_call_to_tool_call(function_call: Any) -> Dict[str, Any]:
+    """Convert a GenAI function_call part into the agent's tool call dict."""
+    args_dict = {}
+    if hasattr(function_call, 'args') and function_call.args:
+        if isinstance(function_call.args, dict):
+            args_dict = function_call.args
+        else:
+            # Protobuf Struct (MapComposite); to_dict also converts nested
+            # lists and objects, e.g. the items of add_tasks
+            try:
+                args_dict = type(function_call).to_dict(function_call).get("args") or {}
+            except Exception:
+                logger.warning(f"Could not parse function call args: {function_call.args}")
+                args_dict = {}
+        args_dict = _plain_value(args_dict)
+
+    return {
+        "id": function_call.name,
+        "name": function_call.name,
+        "arguments": args_dict,
+    }
+
+
+async def _prepare_chat(history: Optional[List[Dict[str, Any]]], preformatted: bool) -> Any:
+    """
+    Returns a GenAI ChatSession for the history, or an error result dict
+    if the agent is not configured.
+    """
     if not GEMINI_API_KEY:
         logger.error("GEMINI_API_KEY not set in run_agent. Returning configuration error.")
         return {
@@ -226,74 +479,45 @@ async def run_agent(
             "error": "AI Service Initialization Error."
         }
 
+    formatted_history = list(history or []) if preformatted else _format_history(history)
+    return model.start_chat(history=window_history(formatted_history))
+
+
+async def run_agent(
+    user_id: int,
+    user_input: str,
+    history: List[Dict[str, Any]] = None,
+    preformatted: bool = False,
+    conversation_id: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Run the AI agent with the Google GenAI API.
+    Args:
+        user_id: The ID of the user.
+        user_input: The current message from the user.
+        history: The full conversation history (list of message dicts).
+        preformatted: True if history is already in GenAI format (e.g. from the
+            history cache) and can be sent without re-formatting.
+        conversation_id: Recorded with the call in the usage ledger.
+    Returns:
+        Dict with 'content' (AI response), 'tool_calls' (if any), 'error' (if any).
+    """
     try:
-        formatted_history = []
-        if history:
-            for msg in history:
-                role = msg.get('role')
-                parts = []
-                if isinstance(msg.get('parts'), list):
-                    for part in msg['parts']:
-                        if isinstance(part, dict) and 'text' in part:
-                            parts.append({'text': part['text']})
-                        elif isinstance(part, dict) and 'function_call' in part:
-                            parts.append({'function_call': part['function_call']})
-                        elif isinstance(part, dict) and 'function_response' in part:
-                            func_resp = part['function_response']
-                            if isinstance(func_resp, dict) and 'name' in func_resp and 'response' in func_resp:
-                                parts.append({'function_response': func_resp})
-                            else:
-                                logger.warning(f"Malformed function_response in history: {func_resp}")
-                                if 'name' in func_resp and 'content' in func_resp:
-                                    parts.append({'function_response': {'name': func_resp['name'], 'response': {'content': func_resp['content']}}})
-
-                if parts:
-                    formatted_history.append({'role': role, 'parts': parts})
-
-        chat = model.start_chat(history=formatted_history)
-
-        logger.info(f"📤 Sending message to GenAI. User input: '{user_input[:50]}...' History length: {len(formatted_history)}")
+        chat = await _prepare_chat(history, preformatted)
+        if isinstance(chat, dict):
+            return chat
 
+        logger.info(f"📤 Sending message to GenAI. User input: '{user_input[:50]}...' History length: {len(chat.history)}")
+
+        started = time.monotonic()
         try:
-            response = await chat.send_message_async(user_input)
+            response = await _send_with_resilience(chat, user_input)
             logger.info("📥 Response received from GenAI.")
-        except genai.types.BlockedPromptException as e:
-            logger.error(f"GenAI BlockedPromptException: {e}", exc_info=True)
-            return {
-                "content": "I'm sorry, your request was blocked due to safety concerns. Please try rephrasing.",
-                "tool_calls": [],
-                "error": f"BlockedPromptException: {e}"
-            }
-        except genai.types.ResponseValidationError as e:
-            logger.error(f"GenAI ResponseValidationError (tool issue?): {e}", exc_info=True)
-            return {
-                "content": "I encountered an issue processing a tool's response or preparing a tool call. "
-                           "This might be a temporary API issue or a malformed tool definition.",
-                "tool_calls": [],
-                "error": f"ResponseValidationError: {e}"
-            }
-        except genai.types.RetryError as e: # Catch API related client errors
-            logger.error(f"GenAI RetryError: {e}", exc_info=True)
-            if "429" in str(e):
-                return {
-                    "content": "I'm sorry, but we're experiencing high demand and have reached our usage limit for the AI service. Please try again later.",
-                    "tool_calls": [],
-                    "error": "QuotaExceededError: The user has sent too many requests in a given amount of time."
-                }
-            return {
-                "content": "There was a client-side error communicating with the Gemini API. "
-                           "Please check your network or API key permissions, or try again later.",
-                "tool_calls": [],
-                "error": f"RetryError: {e}"
-            }
         except Exception as send_error:
-            logger.error(f"Error sending message to model: {send_error}", exc_info=True)
-            return {
-                "content": "I'm sorry, I couldn't get a response from the AI. "
-                           "It might be a temporary issue or an invalid model/API key combination.",
-                "tool_calls": [],
-                "error": f"AI Response Error: {send_error}"
-            }
+            usage_ledger.record(user_id, "chat", _cached_model_name, time.monotonic() - started,
+                                conversation_id=conversation_id, error=send_error)
+            return _send_error_result(send_error)
+        latency = time.monotonic() - started
 
         response_content = ""
         tool_calls = []
@@ -303,6 +527,8 @@ async def run_agent(
             candidate = response.candidates[0]
             if not hasattr(candidate, 'content') or not hasattr(candidate.content, 'parts'):
                 logger.warning("Gemini response candidate has no content parts. The model might have been blocked.")
+                usage_ledger.record(user_id, "chat", _cached_model_name, latency,
+                                    conversation_id=conversation_id, response=response)
                 return {
                     "content": "The AI provided an empty or malformed response. This might be due to safety settings. Please try again.",
                     "tool_calls": [],
@@ -314,43 +540,17 @@ async def run_agent(
                     response_content += part.text
                 elif hasattr(part, 'function_call'):
                     try:
-                        function_call = part.function_call
-                        if function_call:
-                            # Extract arguments from function call for newer library
-                            args_dict = {}
-                            if hasattr(function_call, 'args') and function_call.args:
-                                # Handle different ways args might be represented in the newer library
-                                if isinstance(function_call.args, dict):
-                                    args_dict = function_call.args
-                                elif hasattr(function_call.args, '__dict__'):
-                                    # If it's an object with attributes
-                                    args_dict = vars(function_call.args)
-                                else:
-                                    # Try to convert to dict if it's a protobuf-like object
-                                    try:
-                                        import json
-                                        args_str = str(function_call.args)
-                                        # Try parsing as JSON if possible
-                                        if args_str.startswith('{') and args_str.endswith('}'):
-                                            args_dict = json.loads(args_str)
-                                        else:
-                                            # If it's not JSON, try to extract values differently
-                                            args_dict = {k: v for k, v in function_call.args.items()} if hasattr(function_call.args, 'items') else {}
-                                    except:
-                                        logger.warning(f"Could not parse function call args: {function_call.args}")
-                                        args_dict = {}
-
-                            tool_calls.append({
-                                "id": function_call.name,
-                                "name": function_call.name,
-                                "arguments": args_dict,
-                            })
-                            logger.info(f"Tool call detected (new library): {function_call.name} with arguments: {args_dict}")
+                        if part.function_call:
+                            tool_call = _function_call_to_tool_call(part.function_call)
+                            tool_calls.append(tool_call)
+                            logger.info(f"Tool call detected (new library): {tool_call['name']} with arguments: {tool_call['arguments']}")
                     except Exception as e:
                         logger.error(f"Error processing function call (new library): {e}", exc_info=True)
                         continue
 
         logger.info(f"Agent response: {response_content[:100]}... Tool calls: {len(tool_calls)}")
+        usage_ledger.record(user_id, "chat", _cached_model_name, latency,
+                            conversation_id=conversation_id, response=response, tool_calls=len(tool_calls))
 
         return {
             "content": response_content,
@@ -366,6 +566,81 @@ async def run_agent(
             "error": f"General Agent Error: {str(e)}"
         }
 
+
+async def run_agent_stream(
+    user_id: int,
+    user_input: str,
+    history: List[Dict[str, Any]] = None,
+    preformatted: bool = False,
+    conversation_id: Optional[int] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streaming variant of run_agent.
+
+    Yields {"type": "delta", "text": ...} events as text arrives from the
+    model, then exactly one {"type": "result", ...} event carrying the same
+    'content', 'tool_calls' and 'error' keys that run_agent returns.
+    """
+    try:
+        chat = await _prepare_chat(history, preformatted)
+        if isinstance(chat, dict):
+            yield {"type": "result", **chat}
+            return
+
+        logger.info(f"📤 Streaming message to GenAI. User input: '{user_input[:50]}...' History length: {len(chat.history)}")
+
+        started = time.monotonic()
+        try:
+            response = await _send_with_resilience(chat, user_input, stream=True)
+        except Exception as send_error:
+            usage_ledger.record(user_id, "stream", _cached_model_name, time.monotonic() - started,
+                                conversation_id=conversation_id, error=send_error)
+            yield {"type": "result", **_send_error_result(send_error)}
+            return
+
+        response_content = ""
+        tool_calls = []
+        try:
+            async for chunk in response:
+                if not getattr(chunk, 'candidates', None):
+                    continue
+                candidate = chunk.candidates[0]
+                if not hasattr(candidate, 'content') or not hasattr(candidate.content, 'parts'):
+                    continue
+                for part in candidate.content.parts:
+                    if hasattr(part, 'text') and part.text:
+                        response_content += part.text
+                        yield {"type": "delta", "text": part.text}
+                    elif hasattr(part, 'function_call') and part.function_call:
+                        try:
+                            tool_call = _function_call_to_tool_call(part.function_call)
+                            tool_calls.append(tool_call)
+                            logger.info(f"Tool call detected (stream): {tool_call['name']} with arguments: {tool_call['arguments']}")
+                        except Exception as e:
+                            logger.error(f"Error processing function call (stream): {e}", exc_info=True)
+        except Exception as stream_error:
+            # Already streaming, so no retry; still count it against the breaker
+            gemini_breaker.record_failure()
+            usage_ledger.record(user_id, "stream", _cached_model_name, time.monotonic() - started,
+                                conversation_id=conversation_id, response=response, error=stream_error)
+            yield {"type": "result", **_send_error_result(stream_error)}
+            return
+
+        logger.info(f"Agent streamed response: {response_content[:100]}... Tool calls: {len(tool_calls)}")
+        # Usage metadata of a streamed response is complete once it has been consumed
+        usage_ledger.record(user_id, "stream", _cached_model_name, time.monotonic() - started,
+                            conversation_id=conversation_id, response=response, tool_calls=len(tool_calls))
+        yield {"type": "result", "content": response_content, "tool_calls": tool_calls, "error": None}
+
+    except Exception as e:
+        logger.error(f"❌ GenAI agent general error (stream): {str(e)}", exc_info=True)
+        yield {
+            "type": "result",
+            "content": "I'm sorry, but I'm currently experiencing some technical difficulties. Please try again in a moment. If the issue persists, it might be related to my AI services being temporarily unavailable.",
+            "tool_calls": [],
+            "error": f"General Agent Error: {str(e)}"
+        }
+
 # --- Test function as requested ---
 if __name__ == "__main__":
     import asyncio
@@ -3,125 +3,39 @@ Phase III Agent Tools - Google GenAI Function Declarations
 Defines the tools for the Google GenAI AI agent using proper FunctionDeclaration format.
 """
 
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 # Import the newer google-generativeai library directly
 import google.generativeai as genai
 from google.generativeai.types import FunctionDeclaration, Tool as GenAITool
 
+from tool_registry import TOOLS
+
+# Built on first use and reused for every model instance
+_genai_tools: Optional[List[GenAITool]] = None
+
+
 def get_genai_task_management_tools() -> List[GenAITool]:
     """
-    Creates and returns the task management tools in Google GenAI FunctionDeclaration format.
+    Returns the task management tools in Google GenAI FunctionDeclaration format.
+
+    The declarations come from the shared tool registry, the same source the
+    MCP server lists its tools from.
 
     Returns:
         List of GenAITool objects containing FunctionDeclarations for task management
     """
-    # Define the add_task function
-    add_task_func = FunctionDeclaration(
-        name="add_task",
-        description="Create a new task for the user. Use when the user wants to add a new todo item.",
-        parameters={
-            "type": "object",
-            "properties": {
-                "title": {
-                    "type": "string",
-                    "description": "Task title (required, 1-255 characters)"
-                },
-                "description": {
-                    "type": "string",
-                    "description": "Task description (optional, max 1000 characters)"
-                },
-                "priority": {
-                    "type": "string",
-                    "enum": ["low", "medium", "high"],
-                    "description": "Task priority (defaults to 'medium' if not specified)"
-                }
-            },
-            "required": ["title"]
-        }
-    )
-
-    # Define the list_tasks function
-    list_tasks_func = FunctionDeclaration(
-        name="list_tasks",
-        description="Retrieve tasks from the list. Use when user asks to see, show, or list tasks.",
-        parameters={
-            "type": "object",
-            "properties": {
-                "status": {
-                    "type": "string",
-                    "enum": ["all", "pending", "completed"],
-                    "description": "Filter tasks by status (defaults to 'all')"
-                }
-            },
-            "required": []
-        }
-    )
-
-    # Define the complete_task function
-    complete_task_func = FunctionDeclaration(
-        name="complete_task",
-        description="Mark a task as complete. Use when user indicates a task is done.",
-        parameters={
-            "type": "object",
-            "properties": {
-                "task_id": {
-                    "type": "integer",
-                    "description": "The task ID to mark as completed"
-                }
-            },
-            "required": ["task_id"]
-        }
-    )
-
-    # Define the delete_task function
-    delete_task_func = FunctionDeclaration(
-        name="delete_task",
-        description="Remove a task from the list. Use when user wants to delete/remove/cancel a task.",
-        parameters={
-            "type": "object",
-            "properties": {
-                "task_id": {
-                    "type": "integer",
-                    "description": "The task ID to delete"
-                }
-            },
-            "required": ["task_id"]
-        }
-    )
-
-    # Define the update_task function
-    update_task_func = FunctionDeclaration(
-        name="update_task",
-        description="Modify task title or description. Use when user wants to change/update/rename a task.",
-        parameters={
-            "type": "object",
-            "properties": {
-                "task_id": {
-                    "type": "integer",
-                    "description": "The task ID to update"
-                },
-                "title": {
-                    "type": "string",
-                    "description": "New task title (optional)"
-                },
-                "description": {
-                    "type": "string",
-                    "description": "New task description (optional)"
-                }
-            },
-            "required": ["task_id"]
-        }
-    )
-
-    # Return the tools wrapped in a GenAITool
-    return [GenAITool(function_declarations=[
-        add_task_func,
-        list_tasks_func,
-        complete_task_func,
-        delete_task_func,
-        update_task_func
-    ])]
+    global _genai_tools
+    if _genai_tools is None:
+        _genai_tools = [GenAITool(function_declarations=[
+            FunctionDeclaration(
+                name=spec.name,
+                description=spec.description,
+                parameters=spec.input_schema
+            )
+            for spec in TOOLS.values()
+        ])]
+    return _genai_tools
 
 
 def convert_mcp_tool_to_genai_function(mcp_tool: Dict[str, Any]) -> FunctionDeclaration:
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark: sync vs async DB sessions under mixed chat + CRUD load.
+
+Runs the app in-process (httpx ASGI transport) once with DB_ASYNC=false and
+once with DB_ASYNC=true, and reports requests/sec and p50/p99 latency for the
+task CRUD endpoints while chat requests are in flight. The LLM is replaced by
+a stub that waits --llm-latency seconds, so only the database layer differs.
+
+Usage:
+    python bench_db.py [--requests 400] [--concurrency 32] [--chat-share 0.2]
+
+Needs a server database: set BENCH_DATABASE_URL to a Postgres URL. SQLite
+always runs with sync sessions (see database.async_sessions_enabled), so it
+is only useful as a baseline.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_load(args):
+    """Child process: run the load against the app in the current mode."""
+    import httpx
+    from sqlmodel import SQLModel, Session
+
+    import chat_handler
+    import main
+    from auth import create_access_token
+    from database import async_sessions_enabled, engine, User
+
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as db:
+        user = User(email=f"bench-{time.time()}@example.com", hashed_password="x", name="bench")
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        user_id = user.id
+
+    async def fake_agent(*_args, **_kwargs):
+        await asyncio.sleep(args.llm_latency)
+        return {"content": "ok", "tool_calls": [], "error": None}
+
+    chat_handler.run_agent = fake_agent
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+    latencies = {"crud": [], "chat": []}
+    semaphore = asyncio.Semaphore(args.concurrency)
+    rng = random.Random(42)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench") as client:
+        for i in range(20):
+            await client.post(f"/api/{user_id}/tasks", json={"title": f"seed {i}"}, headers=headers)
+
+        async def one_request(i):
+            kind = "chat" if rng.random() < args.chat_share else "crud"
+            async with semaphore:
+                started = time.perf_counter()
+                if kind == "chat":
+                    await client.post(f"/api/{user_id}/chat", json={"message": f"hello there {i}"}, headers=headers)
+                elif i % 4 == 0:
+                    await client.post(f"/api/{user_id}/tasks", json={"title": f"task {i}"}, headers=headers)
+                else:
+                    await client.get(f"/api/{user_id}/tasks?skip={i % 10}", headers=headers)
+                latencies[kind].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one_request(i) for i in range(args.requests)))
+        elapsed = time.perf_counter() - started
+
+    crud = latencies["crud"]
+    print(json.dumps({
+        "mode": "async" if async_sessions_enabled() else "sync",
+        "crud_rps": len(crud) / elapsed,
+        "crud_p50_ms": percentile(crud, 50) * 1000,
+        "crud_p99_ms": percentile(crud, 99) * 1000,
+        "chat_p99_ms": percentile(latencies["chat"], 99) * 1000,
+        "total_rps": args.requests / elapsed,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--chat-share", type=float, default=0.2)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        asyncio.run(run_load(args))
+        return
+
+    if "BENCH_DATABASE_URL" not in os.environ:
+        print("BENCH_DATABASE_URL not set; using SQLite, where both runs use sync sessions.")
+
+    results = []
+    for mode in ("false", "true"):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ)
+            env["DATABASE_URL"] = os.environ.get("BENCH_DATABASE_URL", f"sqlite:///{tmp}/bench.db")
+            env["DB_ASYNC"] = mode
+            env["TASK_CACHE_SIZE"] = "0"  # measure the database, not the cache
+            env["FAST_PATH_ENABLED"] = "false"
+            env["LLM_MAX_IN_FLIGHT"] = str(args.concurrency)
+            child = subprocess.run(
+                [sys.executable, __file__, "--child"] + sys.argv[1:],
+                env=env, capture_output=True, text=True, check=True,
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+            )
+            results.append(json.loads(child.stdout.strip().splitlines()[-1]))
+
+    print(f"{'mode':<6} {'crud req/s':>10} {'crud p50':>9} {'crud p99':>9} {'chat p99':>9} {'all req/s':>10}")
+    for r in results:
+        print(f"{r['mode']:<6} {r['crud_rps']:>10.1f} {r['crud_p50_ms']:>7.1f}ms {r['crud_p99_ms']:>7.1f}ms "
+              f"{r['chat_p99_ms']:>7.1f}ms {r['total_rps']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark: in-process tool dispatch vs the remote MCP server.
+
+Starts `python mcp_server.py --transport http` as a separate process, then
+runs the same mix of tool calls (add_task / list_tasks / complete_task)
+for many users, once through mcp_server.dispatch_tool in this process and
+once through mcp_client.RemoteToolClient over HTTP. Reports calls/sec and
+p50/p99 latency for both.
+
+Usage:
+    python bench_mcp.py [--calls 1000] [--concurrency 32] [--port 8765]
+
+Uses a throwaway SQLite file unless BENCH_DATABASE_URL is set.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run_calls(call, calls, concurrency):
+    """call(name, arguments, user_id) -> content; returns (elapsed, latencies)."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        user_id = 1 + i % 50
+        if i % 3 == 0:
+            name, arguments = "add_task", {"title": f"bench {i}"}
+        elif i % 3 == 1:
+            name, arguments = "list_tasks", {"status": "pending"}
+        else:
+            name, arguments = "complete_task", {"task_id": 1 + i % 100}
+        async with semaphore:
+            started = time.perf_counter()
+            content = await call(name, arguments, user_id)
+            latencies.append(time.perf_counter() - started)
+            json.loads(content[0].text)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    return time.perf_counter() - started, latencies
+
+
+async def benchmark(args, url):
+    from sqlmodel import SQLModel
+
+    from database import engine
+    from mcp_client import RemoteToolClient
+    from mcp_server import ToolContext, dispatch_tool
+
+    SQLModel.metadata.create_all(engine)
+
+    async def in_process(name, arguments, user_id):
+        return await dispatch_tool(name, arguments, ToolContext(user_id=user_id))
+
+    client = RemoteToolClient(url, max_connections=args.concurrency)
+    results = {}
+    try:
+        for label, call in (("in-process", in_process), ("remote", client.call_tool)):
+            await run_calls(call, 50, args.concurrency)  # warm up
+            elapsed, latencies = await run_calls(call, args.calls, args.concurrency)
+            results[label] = (args.calls / elapsed, percentile(latencies, 50), percentile(latencies, 99))
+    finally:
+        await client.aclose()
+    return results
+
+
+def wait_for_server(port, process, timeout=30):
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("MCP server exited during startup")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("MCP server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = os.environ.get("BENCH_DATABASE_URL", f"sqlite:///{tmp}/bench.db")
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(here, "mcp_server.py"), "--transport", "http",
+             "--host", "127.0.0.1", "--port", str(args.port)],
+            env=dict(os.environ), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_for_server(args.port, server)
+            results = asyncio.run(benchmark(args, f"http://127.0.0.1:{args.port}/mcp"))
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"{args.calls} tool calls, concurrency {args.concurrency}")
+    print(f"{'path':<11} {'calls/s':>9} {'p50':>9} {'p99':>9}")
+    for label, (rate, p50, p99) in results.items():
+        print(f"{label:<11} {rate:>9.1f} {p50 * 1000:>7.1f}ms {p99 * 1000:>7.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Benchmark: SQLite write throughput before and after the production profile.
+
+Runs the same load in a child process per profile, each on a fresh SQLite
+file: --writers threads creating and completing tasks through crud.py
+while --readers threads list tasks. Reports writes/sec, write p50/p99
+latency, reads/sec and how many writes failed (e.g. "database is locked").
+
+Profiles:
+    rollback     rollback journal, synchronous=FULL, a connection per
+                 writer (the previous defaults)
+    wal          WAL, synchronous=NORMAL and the tuned pool, writers
+                 still racing for the lock
+    wal+queue    WAL plus the single-writer queue with group commits
+
+Usage:
+    python bench_sqlite.py [--writes 2000] [--writers 16] [--readers 4]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PROFILES = {
+    "rollback": {
+        "SQLITE_JOURNAL_MODE": "DELETE",
+        "SQLITE_SYNCHRONOUS": "FULL",
+        "SQLITE_CACHE_SIZE_KB": "2000",
+        "SQLITE_MMAP_SIZE": "0",
+        "SQLITE_TEMP_STORE": "DEFAULT",
+        "SQLITE_POOL_SIZE": "5",
+        "SQLITE_MAX_OVERFLOW": "10",
+        "SQLITE_WRITE_QUEUE": "false",
+    },
+    "wal": {"SQLITE_WRITE_QUEUE": "false"},
+    "wal+queue": {"SQLITE_WRITE_QUEUE": "true"},
+}
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_load(args):
+    """Child process: run the load with the profile from the environment."""
+    from sqlmodel import Session
+
+    import crud
+    from database import engine
+    from migrations import upgrade
+    from models import TaskToolInput
+    from sqlite_writer import sqlite_writer
+
+    upgrade(engine)
+
+    def write(func, *func_args):
+        if sqlite_writer.enabled:
+            return sqlite_writer.run(func, *func_args)
+        with Session(engine) as db:
+            return func(db, *func_args)
+
+    latencies, errors = [], []
+    reads = [0]
+    done = threading.Event()
+
+    def one_write(i):
+        user_id = 1 + i % 50
+        started = time.perf_counter()
+        try:
+            task = write(crud.create_task, TaskToolInput(title=f"bench {i}"), user_id)
+            write(crud.update_task, task.id, TaskToolInput(completed=True, priority=None), user_id)
+        except Exception as e:
+            errors.append(type(e).__name__)
+            return
+        # Two committed writes per call
+        latencies.append((time.perf_counter() - started) / 2)
+
+    def reader(n):
+        while not done.is_set():
+            with Session(engine) as db:
+                crud.get_tasks(db, 1 + n % 50, limit=50)
+            reads[0] += 1
+
+    reader_threads = [threading.Thread(target=reader, args=(n,)) for n in range(args.readers)]
+    for thread in reader_threads:
+        thread.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.writers) as pool:
+        list(pool.map(one_write, range(args.writes // 2)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    for thread in reader_threads:
+        thread.join()
+    sqlite_writer.stop()
+
+    print(json.dumps({
+        "writes_per_sec": 2 * len(latencies) / elapsed,
+        "write_p50_ms": percentile(latencies, 50) * 1000,
+        "write_p99_ms": percentile(latencies, 99) * 1000,
+        "reads_per_sec": reads[0] / elapsed,
+        "failed_writes": len(errors),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--writers", type=int, default=16)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_load(args)
+        return
+
+    results = {}
+    for profile, overrides in PROFILES.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ)
+            env["DATABASE_URL"] = f"sqlite:///{tmp}/bench.db"
+            env["TASK_CACHE_SIZE"] = "0"  # readers hit the database, not the cache
+            env.update(overrides)
+            child = subprocess.run(
+                [sys.executable, __file__, "--child"] + sys.argv[1:],
+                env=env, capture_output=True, text=True, check=True,
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+            )
+            results[profile] = json.loads(child.stdout.strip().splitlines()[-1])
+
+    print(f"{'profile':<10} {'writes/s':>9} {'write p50':>10} {'write p99':>10} {'reads/s':>9} {'failed':>7}")
+    for profile, r in results.items():
+        print(f"{profile:<10} {r['writes_per_sec']:>9.1f} {r['write_p50_ms']:>8.1f}ms {r['write_p99_ms']:>8.1f}ms "
+              f"{r['reads_per_sec']:>9.1f} {r['failed_writes']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,41 +2,91 @@
 Orchestrates the AI agent, MCP tools, and database persistence.
 """
 
+import asyncio
 import json
 import logging
 import re
-from typing import List, Dict, Any, Optional, Tuple
+from contextlib import contextmanager, nullcontext
+from typing import AsyncIterator, Iterator, List, Dict, Any, Optional, Tuple
 
 from sqlmodel import Session
 
+from database import engine, settings
 from models import Message, TaskToolInput
 from crud import (
+    OWNED_CONVERSATIONS,
     create_message,
     create_conversation,
     get_conversation,
+    get_conversation_message_count,
     get_conversation_messages,
+    get_conversation_summary,
     get_user_conversations,
     update_conversation_title,
     get_tasks,
     create_task,
-    delete_task,
-    get_task,
+    delete_tasks,
     update_task,
 )
-from agent import run_agent
-from mcp_server import list_tools, call_tool, set_mcp_user_id
+from agent import gemini_breaker, run_agent, run_agent_stream
+from history_cache import history_cache
+from intent_router import route, render_tool_reply
+from llm_gate import llm_gate, LLMOverloadedError
+from metrics import metrics
+from mcp_server import execute_tool, ToolContext
+from mcp_client import remote_tools
+from sqlite_writer import sqlite_writer
+from task_cache import bump_task_version
+from tool_registry import TOOLS
 
 logger = logging.getLogger(__name__)
 
+# Tools whose results are handed back to the model to phrase the reply
+MODEL_FORMATTED_TOOLS = {"list_tasks"}
+
 
 class ChatHandler:
     """
     Handles chat interactions by orchestrating the AI agent and tools.
+
+    A turn runs as short database phases (persist the input, load history,
+    persist tool results, persist the reply), each with its own session
+    whose connection goes back to the pool when the phase ends. No
+    connection is held while the model runs, so slow LLM calls cannot
+    exhaust the pool for the REST endpoints. Pass db only to pin every
+    phase to that session (tests); it is still released between phases.
+
+    The phases share one map of ownership-checked conversations (see
+    crud.OWNED_CONVERSATIONS), so a turn selects its conversation once.
     """
 
-    def __init__(self, db: Session, user_id: int):
+    def __init__(self, db: Optional[Session], user_id: int):
         self.db = db
         self.user_id = user_id
+        self._owned_conversations = {} if db is None else db.info.setdefault(OWNED_CONVERSATIONS, {})
+
+    @contextmanager
+    def _db_phase(self) -> Iterator[Session]:
+        """A session for one DB phase; its connection is returned on exit."""
+        if self.db is None:
+            with Session(engine, info={OWNED_CONVERSATIONS: self._owned_conversations}) as db:
+                yield db
+        else:
+            try:
+                yield self.db
+            finally:
+                self.db.close()
+
+    async def _write(self, db: Session, func, *args, **kwargs):
+        """
+        Run a crud write: through the SQLite write queue when it is enabled
+        (sharing this turn's ownership map), otherwise in the phase's db.
+        """
+        if self.db is None and sqlite_writer.enabled:
+            return await sqlite_writer.run_async(
+                func, *args, session_info={OWNED_CONVERSATIONS: self._owned_conversations}, **kwargs
+            )
+        return func(db, *args, **kwargs)
 
     async def process_message(
         self,
@@ -47,45 +97,87 @@ class ChatHandler:
         Process a user message, run the AI agent with tools, and return a response.
         """
         try:
-            if conversation_id:
-                conversation = get_conversation(self.db, conversation_id, self.user_id)
-                if not conversation:
-                    logger.warning(f"Conversation {conversation_id} not found for user {self.user_id}. Creating new conversation.")
-                    conversation = create_conversation(self.db, self.user_id)
-            else:
-                conversation = create_conversation(self.db, self.user_id)
-            conversation_id = conversation.id
+            intent = route(message)
+            # Only turns that will call the model take an LLM slot; with the
+            # breaker open, run_agent fails fast and the fallback parser answers
+            needs_llm_slot = intent is None and not gemini_breaker.is_open
+            async with (llm_gate.slot() if needs_llm_slot else nullcontext()):
+                with self._db_phase() as db:
+                    conversation_id, new_conversation = await self._resolve_conversation(db, conversation_id)
+                    await self._write(db, create_message, conversation_id, self.user_id, "user", message)
+                    if intent:
+                        agent_response = await self._run_fast_path(db, intent, conversation_id)
 
-            create_message(self.db, conversation_id, self.user_id, "user", message)
-            history_for_agent = await self._get_agent_history(conversation_id)
-            
-            agent_response = await self._run_agent_with_tools(message, history_for_agent, conversation_id)
+                if not intent:
+                    history_for_agent = await self._get_agent_history(conversation_id)
+                    agent_response = await self._run_agent_with_tools(message, history_for_agent, conversation_id)
 
             response_content = agent_response.get("content", "")
-            tool_calls_json = json.dumps(agent_response.get("tool_calls", [])) if agent_response.get("tool_calls") else None
-            
             final_response_content = response_content if response_content else "I've processed your request."
 
-            assistant_message = create_message(
-                self.db,
-                conversation_id,
-                self.user_id,
-                "assistant",
-                final_response_content,
-                tool_calls=tool_calls_json
-            )
+            with self._db_phase() as db:
+                assistant_message = await self._write(
+                    db,
+                    create_message,
+                    conversation_id,
+                    self.user_id,
+                    "assistant",
+                    final_response_content,
+                    tool_calls=agent_response.get("tool_calls")
+                )
 
-            if len(history_for_agent) <= 1:
-                title = self._generate_title(message)
-                update_conversation_title(self.db, conversation_id, self.user_id, title)
+                if new_conversation:
+                    title = self._generate_title(message)
+                    await self._write(db, update_conversation_title, conversation_id, self.user_id, title)
 
             return final_response_content, conversation_id, assistant_message.id
+        except LLMOverloadedError:
+            raise
         except Exception as e:
             logger.error(f"Critical error processing message in ChatHandler: {e}", exc_info=True)
             error_message = "I'm sorry, but I encountered a critical issue while processing your request. Could you please try again? If the problem persists, please contact support."
             return error_message, conversation_id or -1, -1
 
-    async def _fallback_intent_parsing(self, user_input: str) -> Optional[Dict[str, Any]]:
+    async def _resolve_conversation(self, db: Session, conversation_id: Optional[int]) -> Tuple[int, bool]:
+        """
+        Returns (conversation_id, created) for the user's conversation,
+        creating a new one if none is given or it does not belong to the user.
+        """
+        if conversation_id:
+            conversation = get_conversation(db, conversation_id, self.user_id)
+            if conversation:
+                return conversation.id, False
+            logger.warning(f"Conversation {conversation_id} not found for user {self.user_id}. Creating new conversation.")
+        conversation = await self._write(db, create_conversation, self.user_id)
+        return conversation.id, True
+
+    async def _run_fast_path(self, db: Session, intent: Dict[str, Any], conversation_id: int) -> Dict[str, Any]:
+        """
+        Executes a confident intent from the router directly, without the LLM.
+
+        The tool call and its result are persisted the same way as on the
+        agent path, so later agent turns see them in history.
+        """
+        logger.info(f"Fast path matched {intent['name']} ({intent['confidence']}) with arguments: {intent['arguments']}")
+        tool_call = {"id": intent["name"], "name": intent["name"], "arguments": intent["arguments"]}
+        await self._write(
+            db, create_message, conversation_id, self.user_id, "assistant", "",
+            tool_calls=[tool_call]
+        )
+        tool_results = await self._execute_tool_calls([tool_call], db)
+        await self._write(
+            db, create_message, conversation_id, self.user_id, "tool", "",
+            tool_results=tool_results
+        )
+        return {
+            "content": render_tool_reply(tool_call["name"], tool_results[0]["result"]),
+            "tool_calls": [],
+            "error": None,
+            "executed_tool_calls": [tool_call],
+            "tool_results": tool_results,
+        }
+
+    async def _fallback_intent_parsing(self, db: Session, user_input: str) -> Optional[Dict[str, Any]]:
         """
         A simple regex-based fallback for intent parsing if the AI model fails.
         """
@@ -97,12 +189,12 @@ class ChatHandler:
         if add_match:
             title = add_match.group(1).strip()
             task_input = TaskToolInput(title=title, description="", completed=False, priority="medium")
-            task = create_task(self.db, task_input, self.user_id)
+            task = await self._write(db, create_task, task_input, self.user_id)
             return {"content": f"Task added: '{task.title}'."}
 
         # Regex for: list tasks
         if "list" in user_input_lower and "task" in user_input_lower:
-            tasks = get_tasks(self.db, self.user_id, filter_completed=None)
+            tasks = get_tasks(db, self.user_id, filter_completed=None)
             if not tasks:
                 return {"content": "You have no tasks."}
             task_list_str = "Here are your tasks:\n" + "\n".join([f"- {t.title} (ID: {t.id}, Status: {'Completed' if t.completed else 'Pending'})" for t in tasks])
@@ -112,64 +204,49 @@ class ChatHandler:
         complete_match = re.match(r"(?:complete|done|finish) task (\d+)", user_input_lower)
         if complete_match:
             task_id = int(complete_match.group(1))
-            task = get_task(self.db, task_id, self.user_id)
+            task = await self._write(db, update_task, task_id, TaskToolInput(completed=True, priority=None), self.user_id)
             if not task:
                 return {"content": f"Sorry, I couldn't find task with ID {task_id}."}
-            task.completed = True
-            self.db.add(task)
-            self.db.commit()
             return {"content": f"Task {task_id} ('{task.title}') marked as complete."}
 
         # Regex for: delete task <id>
         delete_match = re.match(r"delete task (\d+)", user_input_lower)
         if delete_match:
             task_id = int(delete_match.group(1))
-            task = get_task(self.db, task_id, self.user_id)
-            if not task:
+            deleted = await self._write(db, delete_tasks, [task_id], self.user_id)
+            if not deleted:
                 return {"content": f"Sorry, I couldn't find task with ID {task_id}."}
-            delete_task(self.db, task_id)
-            return {"content": f"Task {task_id} ('{task.title}') has been deleted."}
+            return {"content": f"Task {task_id} ('{deleted[0].title}') has been deleted."}
 
         logger.warning("Fallback could not match any rule.")
         return None
 
     async def _get_agent_history(self, conversation_id: int) -> List[Dict[str, Any]]:
-        """Constructs the message history for the agent in GenAI format."""
-        messages = get_conversation_messages(self.db, conversation_id, self.user_id)
-        history = []
-        for msg in messages:
-            parts = []
-            if msg.content:
-                parts.append({"text": msg.content})
-            if msg.tool_calls:
-                try:
-                    tool_calls = json.loads(msg.tool_calls)
-                    for tc in tool_calls:
-                        parts.append({"function_call": {"name": tc["name"], "args": tc["arguments"]}})
-                    history.append({"role": "model", "parts": parts})
-                    parts = []
-                except (json.JSONDecodeError, TypeError) as e:
-                    logger.warning(f"Malformed tool_calls in message {msg.id}: {e}")
-                    if msg.content:
-                        history.append({"role": "model", "parts": [{"text": msg.content}]})
-                    continue
-            if msg.tool_results:
-                try:
-                    tool_results = json.loads(msg.tool_results)
-                    for tr in tool_results:
-                        parts.append({"function_response": {"name": tr["id"], "response": {"content": tr["result"]}}})
-                    history.append({"role": "function", "parts": parts})
-                    parts = []
-                except (json.JSONDecodeError, TypeError) as e:
-                    logger.warning(f"Malformed tool_results in message {msg.id}: {e}")
-                    if msg.content:
-                        history.append({"role": "function", "parts": [{"text": msg.content}]})
-                    continue
-            if msg.role == "user":
-                history.append({"role": "user", "parts": parts})
-            elif msg.role == "assistant" and not msg.tool_calls:
-                history.append({"role": "model", "parts": parts})
-        return history
+        """
+        Returns the message history for the agent in GenAI format.
+        Served from the history cache after checking the conversation's stored
+        message count, so messages written by other workers are not missed;
+        the messages are only read on a miss. The phase ends before the model
+        is called.
+        """
+        load_token = history_cache.begin_load(conversation_id)
+        try:
+            with self._db_phase() as db:
+                # Read before the messages: a message landing in between makes
+                # the cached count low, so the next turn reloads
+                message_count = get_conversation_message_count(db, conversation_id)
+                history = history_cache.get(conversation_id, message_count)
+                if history is not None:
+                    return history
+                # Older turns may have been folded into a rolling summary (see summarizer.py)
+                summary = get_conversation_summary(db, conversation_id)
+                messages = get_conversation_messages(
+                    db, conversation_id, self.user_id, limit=None,
+                    after_id=summary.through_message_id if summary else None
+                )
+                return history_cache.load(conversation_id, messages, summary, load_token, message_count)
+        finally:
+            history_cache.end_load(conversation_id, load_token)
 
     async def _run_agent_with_tools(
         self,
@@ -178,11 +255,13 @@ class ChatHandler:
         conversation_id: int,
     ) -> Dict[str, Any]:
         """Manages the agent-tool interaction loop."""
-        agent_result = await run_agent(self.user_id, user_input, history)
+        agent_result = await run_agent(self.user_id, user_input, history, preformatted=True,
+                                       conversation_id=conversation_id)
 
         if agent_result.get("error"):
             logger.warning(f"AI agent failed with error: {agent_result['error']}. Attempting rule-based fallback.")
-            fallback_result = await self._fallback_intent_parsing(user_input)
+            with self._db_phase() as db:
+                fallback_result = await self._fallback_intent_parsing(db, user_input)
             if fallback_result:
                 ai_error_content = agent_result.get("content", "I am having trouble with my AI capabilities right now.")
                 fallback_content = fallback_result.get("content", "")
@@ -193,46 +272,314 @@ class ChatHandler:
 
         if agent_result.get("tool_calls"):
             logger.info(f"Agent requested tool calls: {agent_result['tool_calls']}")
-            create_message(
-                self.db, conversation_id, self.user_id, "assistant",
-                agent_result.get("content", ""),
-                tool_calls=json.dumps(agent_result["tool_calls"])
-            )
-            tool_results = []
-            set_mcp_user_id(self.user_id)
-            for tool_call in agent_result["tool_calls"]:
-                tool_name = tool_call["name"]
-                tool_args = tool_call["arguments"]
-                logger.info(f"Executing tool: {tool_name} with args: {tool_args}")
-                try:
-                    mcp_result = await call_tool(tool_name, tool_args)
-                    result_content = mcp_result[0].text if mcp_result and hasattr(mcp_result[0], 'text') else json.dumps(mcp_result)
-                    try:
-                        parsed_result = json.loads(result_content)
-                    except json.JSONDecodeError:
-                        parsed_result = {"content": result_content}
-                    tool_results.append({"id": tool_call["name"], "result": parsed_result})
-                    logger.info(f"Tool {tool_name} executed successfully. Result: {result_content[:100]}...")
-                except Exception as e:
-                    logger.error(f"Error executing tool {tool_name} with args {tool_args}: {e}", exc_info=True)
-                    tool_results.append({"id": tool_call["name"], "result": {"error": str(e)}})
-            create_message(
-                self.db, conversation_id, self.user_id, "tool", "",
-                tool_results=json.dumps(tool_results)
-            )
+            with self._db_phase() as db:
+                await self._write(
+                    db, create_message, conversation_id, self.user_id, "assistant",
+                    agent_result.get("content", ""),
+                    tool_calls=agent_result["tool_calls"]
+                )
+                tool_results = await self._execute_tool_calls(agent_result["tool_calls"], db)
+                await self._write(
+                    db, create_message, conversation_id, self.user_id, "tool", "",
+                    tool_results=tool_results
+                )
+            templated_reply = self._templated_reply(tool_results)
+            if templated_reply is not None:
+                content = " ".join(filter(None, [agent_result.get("content", "").strip(), templated_reply]))
+                return {"content": content, "tool_calls": [], "error": None}
             updated_history_for_agent = await self._get_agent_history(conversation_id)
-            final_agent_result = await run_agent(self.user_id, "", updated_history_for_agent)
+            final_agent_result = await run_agent(self.user_id, "", updated_history_for_agent, preformatted=True,
+                                                 conversation_id=conversation_id)
             return final_agent_result
         else:
             return agent_result
 
+    def _templated_reply(self, tool_results: List[Dict[str, Any]]) -> Optional[str]:
+        """
+        Builds the post-tool reply locally from the tools' structured results,
+        saving the second model round trip.
+
+        Returns None when the model should write the reply instead: templated
+        replies are disabled, a tool failed, or a tool (e.g. list_tasks)
+        returned data the model is better at presenting.
+        """
+        if not settings.TEMPLATED_TOOL_REPLIES:
+            return None
+        for tool_result in tool_results:
+            result = tool_result["result"]
+            if tool_result["id"] in MODEL_FORMATTED_TOOLS or not isinstance(result, dict) or not result.get("success"):
+                return None
+        replies = [render_tool_reply(tool_result["id"], tool_result["result"]) for tool_result in tool_results]
+        metrics.increment("templated_replies")
+        return " ".join(replies)
+
+    async def _execute_tool_call(self, tool_call: Dict[str, Any], db: Optional[Session] = None) -> Dict[str, Any]:
+        """
+        Runs one MCP tool call as this handler's user and returns its tool
+        result entry. Without db, the tool opens its own session. With
+        settings.MCP_SERVER_URL set, the call goes to the remote MCP server,
+        and a tool that writes invalidates this process's cached task lists.
+        """
+        if remote_tools is None:
+            return await self._run_local_tool_call(tool_call, db)
+        tool_name = tool_call["name"]
+        tool_args = tool_call["arguments"]
+        logger.info(f"Executing remote tool: {tool_name} with args: {tool_args}")
+        try:
+            try:
+                mcp_result = await remote_tools.call_tool(tool_name, tool_args, self.user_id)
+            finally:
+                # The MCP process bumped only its own task version (and may have
+                # committed even if the call failed), so invalidate ours too
+                spec = TOOLS.get(tool_name)
+                if spec is not None and spec.mutates:
+                    bump_task_version(self.user_id)
+            result_content = mcp_result[0].text if mcp_result else "{}"
+            try:
+                parsed_result = json.loads(result_content)
+            except json.JSONDecodeError:
+                parsed_result = {"content": result_content}
+            return {"id": tool_name, "result": parsed_result}
+        except Exception as e:
+            logger.error(f"Error executing tool {tool_name} with args {tool_args}: {e}", exc_info=True)
+            return {"id": tool_name, "result": {"error": str(e)}}
+
+    async def _run_local_tool_call(self, tool_call: Dict[str, Any], db: Optional[Session] = None) -> Dict[str, Any]:
+        """
+        Runs one tool call in-process, never on the event loop thread: tools
+        that write go through the SQLite write queue when it is enabled
+        (with this turn's ownership map), everything else runs on a worker
+        thread in db, or in a session of its own if db is None.
+        """
+        spec = TOOLS.get(tool_call["name"])
+        if self.db is None and sqlite_writer.enabled and spec is not None and spec.mutates:
+            try:
+                return await sqlite_writer.run_async(
+                    self._run_tool_call, tool_call,
+                    session_info={OWNED_CONVERSATIONS: self._owned_conversations}
+                )
+            except Exception as e:
+                logger.error(f"Queued tool call {tool_call['name']} failed: {e}", exc_info=True)
+                return {"id": tool_call["name"], "result": {"error": str(e)}}
+        return await asyncio.to_thread(self._run_tool_call, db, tool_call)
+
+    def _run_tool_call(self, db: Optional[Session], tool_call: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Runs one tool call in db (or a session of its own). The handler's
+        result dict is used as is; it is serialized once, when the tool
+        message is persisted.
+        """
+        tool_name = tool_call["name"]
+        tool_args = tool_call["arguments"]
+        logger.info(f"Executing tool: {tool_name} with args: {tool_args}")
+        try:
+            result = execute_tool(tool_name, tool_args, ToolContext(user_id=self.user_id, db=db))
+            logger.debug(f"Tool {tool_name} executed. Success: {result.get('success')}")
+            return {"id": tool_name, "result": result}
+        except Exception as e:
+            logger.error(f"Error executing tool {tool_name} with args {tool_args}: {e}", exc_info=True)
+            return {"id": tool_name, "result": {"error": str(e)}}
+
+    async def _execute_tool_calls(self, tool_calls: List[Dict[str, Any]],
+                                  db: Optional[Session] = None) -> List[Dict[str, Any]]:
+        """
+        Runs the tool calls requested by the agent and returns their results
+        in the original call order.
+
+        A single call runs in db, the current phase's session (or its own
+        if none is given). Independent calls run concurrently, each with its
+        own DB session (execute_tool opens one per call), bounded by
+        settings.TOOL_CALL_CONCURRENCY. Writes go through the SQLite write
+        queue when it is enabled (see _run_local_tool_call). Calls on the same task_id run one
+        after another in call order; add_task/add_tasks touch no existing
+        task and run freely. Calls that read or write across tasks (e.g.
+        list_tasks, complete_tasks) act as a barrier: they wait for
+        everything before them and everything after them waits for them.
+        """
+        if len(tool_calls) <= 1:
+            return [await self._execute_tool_call(tool_call, db) for tool_call in tool_calls]
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(tool_calls)
+        semaphore = asyncio.Semaphore(max(1, settings.TOOL_CALL_CONCURRENCY))
+
+        async def run_lane(indexes: List[int]):
+            for index in indexes:
+                async with semaphore:
+                    results[index] = await self._execute_tool_call(tool_calls[index])
+
+        lanes: Dict[Any, List[int]] = {}
+        for index, tool_call in enumerate(tool_calls):
+            args = tool_call.get("arguments") or {}
+            if args.get("task_id") is not None:
+                lanes.setdefault(("task", str(args["task_id"])), []).append(index)
+            elif tool_call["name"] in ("add_task", "add_tasks"):
+                lanes[("new", index)] = [index]
+            else:
+                await asyncio.gather(*(run_lane(lane) for lane in lanes.values()))
+                lanes = {}
+                await run_lane([index])
+        await asyncio.gather(*(run_lane(lane) for lane in lanes.values()))
+        return results
+
+    async def process_message_stream(
+        self,
+        message: str,
+        conversation_id: Optional[int] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of process_message.
+
+        Yields event dicts for the SSE endpoint:
+          {"event": "delta", "text": ...}
+          {"event": "tool_call_started", "name": ..., "arguments": ...}
+          {"event": "tool_call_finished", "name": ..., "result": ...}
+          {"event": "done", "conversation_id": ..., "message_id": ..., "content": ...}
+        The reply is persisted with create_message before "done" is sent.
+
+        Turns that need the model hold an LLM slot until the stream ends;
+        LLMOverloadedError is raised before the first event if none is free.
+        """
+        intent = route(message)
+        needs_llm_slot = intent is None and not gemini_breaker.is_open
+        if needs_llm_slot:
+            await llm_gate.acquire()
+        try:
+            async for event in self._stream_turn(intent, message, conversation_id):
+                yield event
+        finally:
+            if needs_llm_slot:
+                llm_gate.release()
+
+    async def _stream_turn(
+        self,
+        intent: Optional[Dict[str, Any]],
+        message: str,
+        conversation_id: Optional[int]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Event generator behind process_message_stream."""
+        try:
+            with self._db_phase() as db:
+                conversation_id, new_conversation = await self._resolve_conversation(db, conversation_id)
+                await self._write(db, create_message, conversation_id, self.user_id, "user", message)
+                if intent is not None:
+                    fast_result = await self._run_fast_path(db, intent, conversation_id)
+
+            if intent is not None:
+                for tool_call, tool_result in zip(fast_result["executed_tool_calls"], fast_result["tool_results"]):
+                    yield {"event": "tool_call_started", "name": tool_call["name"], "arguments": tool_call["arguments"]}
+                    yield {"event": "tool_call_finished", "name": tool_call["name"], "result": tool_result["result"]}
+                yield {"event": "delta", "text": fast_result["content"]}
+                with self._db_phase() as db:
+                    assistant_message = await self._write(
+                        db, create_message, conversation_id, self.user_id, "assistant", fast_result["content"]
+                    )
+                    if new_conversation:
+                        title = self._generate_title(message)
+                        await self._write(db, update_conversation_title, conversation_id, self.user_id, title)
+                yield {
+                    "event": "done",
+                    "conversation_id": conversation_id,
+                    "message_id": assistant_message.id,
+                    "content": fast_result["content"],
+                }
+                return
+
+            history_for_agent = await self._get_agent_history(conversation_id)
+
+            agent_result = None
+            async for event in run_agent_stream(self.user_id, message, history_for_agent, preformatted=True,
+                                                conversation_id=conversation_id):
+                if event["type"] == "delta":
+                    yield {"event": "delta", "text": event["text"]}
+                else:
+                    agent_result = event
+
+            if agent_result.get("error"):
+                logger.warning(f"AI agent failed with error: {agent_result['error']}. Attempting rule-based fallback.")
+                with self._db_phase() as db:
+                    fallback_result = await self._fallback_intent_parsing(db, message)
+                if fallback_result:
+                    ai_error_content = agent_result.get("content", "I am having trouble with my AI capabilities right now.")
+                    content = f"{ai_error_content} However, I was able to understand your request. {fallback_result.get('content', '')}"
+                else:
+                    content = agent_result.get("content", "")
+                yield {"event": "delta", "text": content}
+                agent_result = {"content": content, "tool_calls": [], "error": None}
+
+            elif agent_result.get("tool_calls"):
+                for tool_call in agent_result["tool_calls"]:
+                    yield {"event": "tool_call_started", "name": tool_call["name"], "arguments": tool_call["arguments"]}
+                # Events are sent outside the phase: a slow client must not hold a connection
+                with self._db_phase() as db:
+                    await self._write(
+                        db, create_message, conversation_id, self.user_id, "assistant",
+                        agent_result.get("content", ""),
+                        tool_calls=agent_result["tool_calls"]
+                    )
+                    tool_results = await self._execute_tool_calls(agent_result["tool_calls"], db)
+                    await self._write(
+                        db, create_message, conversation_id, self.user_id, "tool", "",
+                        tool_results=tool_results
+                    )
+                for tool_call, tool_result in zip(agent_result["tool_calls"], tool_results):
+                    yield {"event": "tool_call_finished", "name": tool_call["name"], "result": tool_result["result"]}
+                templated_reply = self._templated_reply(tool_results)
+                if templated_reply is not None:
+                    streamed_content = agent_result.get("content", "").strip()
+                    yield {"event": "delta", "text": f" {templated_reply}" if streamed_content else templated_reply}
+                    content = " ".join(filter(None, [streamed_content, templated_reply]))
+                    agent_result = {"content": content, "tool_calls": [], "error": None}
+                else:
+                    updated_history_for_agent = await self._get_agent_history(conversation_id)
+                    async for event in run_agent_stream(self.user_id, "", updated_history_for_agent, preformatted=True,
+                                                        conversation_id=conversation_id):
+                        if event["type"] == "delta":
+                            yield {"event": "delta", "text": event["text"]}
+                        else:
+                            agent_result = event
+                    if agent_result.get("error"):
+                        yield {"event": "delta", "text": agent_result.get("content", "")}
+
+            final_response_content = agent_result.get("content") or "I've processed your request."
+            with self._db_phase() as db:
+                assistant_message = await self._write(
+                    db,
+                    create_message,
+                    conversation_id,
+                    self.user_id,
+                    "assistant",
+                    final_response_content,
+                    tool_calls=agent_result.get("tool_calls")
+                )
+
+                if new_conversation:
+                    title = self._generate_title(message)
+                    await self._write(db, update_conversation_title, conversation_id, self.user_id, title)
+
+            yield {
+                "event": "done",
+                "conversation_id": conversation_id,
+                "message_id": assistant_message.id,
+                "content": final_response_content,
+            }
+        except Exception as e:
+            logger.error(f"Critical error streaming message in ChatHandler: {e}", exc_info=True)
+            yield {
+                "event": "error",
+                "conversation_id": conversation_id or -1,
+                "message_id": -1,
+                "content": "I'm sorry, but I encountered a critical issue while processing your request. Could you please try again? If the problem persists, please contact support.",
+            }
+
     def _generate_title(self, first_message: str) -> str:
         return first_message[:50] if len(first_message) > 50 else first_message
 
     def get_conversations(self, skip: int = 0, limit: int = 50):
         """Get all conversations for the user"""
-        return get_user_conversations(self.db, self.user_id, skip, limit)
+        with self._db_phase() as db:
+            return get_user_conversations(db, self.user_id, skip, limit)
 
     def get_conversation_messages(self, conversation_id: int):
         """Get all messages in a conversation"""
-        return get_conversation_messages(self.db, conversation_id, self.user_id)
+        with self._db_phase() as db:
+            return get_conversation_messages(db, conversation_id, self.user_id)
@@ -4,16 +4,21 @@ Handles database operations for conversations and messages.
 Uses Phase 2 models for tasks.
 """
 
+import base64
 import json
 from datetime import datetime, timezone
-from typing import List, Optional
-from sqlmodel import Session, select
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import delete, insert, not_, tuple_, update
+from sqlmodel import Session, func, select
 
 # Import from database.py to avoid conflicts
 from database import User, Task
 
 # Import Phase 3 models
-from models import Conversation, Message, TaskToolInput
+from models import MESSAGE_PREVIEW_CHARS, Conversation, ConversationSummary, LLMUsage, Message, TaskToolInput
+from history_cache import history_cache
+from task_cache import task_cache, bump_task_version
+from sqlite_writer import after_commit
 
 
 # Task operations - direct implementation
@@ -25,19 +30,104 @@ def get_task(db: Session, task_id: int, user_id: int):
 
 def get_tasks(db: Session, user_id: int, skip: int = 0, limit: int = 100,
               filter_completed: Optional[bool] = None):
-    """Get all tasks for a user with optional filtering."""
+    """
+    Get all tasks for a user with optional filtering.
+    Served from the task cache when the user's tasks have not changed.
+    """
+    cached = task_cache.get(user_id, filter_completed, skip, limit)
+    if cached is not None:
+        return cached
+
+    version = task_cache.version(user_id)
+    statement = _tasks_statement(user_id, filter_completed).offset(skip).limit(limit)
+    tasks = db.exec(statement).all()
+    return task_cache.put(user_id, version, filter_completed, skip, limit, tasks)
+
+
+def _tasks_statement(user_id: int, filter_completed: Optional[bool]):
+    """A user's tasks in id order; served by ix_tasks_user_completed_id / ix_tasks_user_id_id."""
     statement = select(Task).where(Task.user_id == user_id)
     if filter_completed is not None:
         statement = statement.where(Task.completed == filter_completed)
-    statement = statement.offset(skip).limit(limit)
-    return db.exec(statement).all()
+    return statement.order_by(Task.id)
 
 
-def create_task(db: Session, task_input: TaskToolInput, user_id: int):
-    """Create a new task."""
-    from datetime import datetime, timezone
+def _encode_cursor(payload: dict) -> str:
+    """Opaque, URL-safe cursor for a JSON payload."""
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> dict:
+    """Inverse of _encode_cursor. Raises ValueError if the cursor is malformed."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(payload, dict):
+        raise ValueError("Invalid cursor")
+    return payload
+
+
+def encode_task_cursor(after_id: int, filter_completed: Optional[bool]) -> str:
+    """Opaque cursor for the task page after after_id, tied to the filter it was issued for."""
+    return _encode_cursor({"after": after_id, "completed": filter_completed})
+
+
+def decode_task_cursor(cursor: str, filter_completed: Optional[bool]) -> Optional[int]:
+    """
+    The task id a cursor continues after; None for an empty cursor (first page).
+    Raises ValueError for a malformed cursor or one issued for another filter.
+    """
+    if not cursor:
+        return None
+    payload = _decode_cursor(cursor)
+    try:
+        after_id = int(payload["after"])
+        issued_for = payload["completed"]
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError("Invalid cursor") from e
+    if issued_for != filter_completed:
+        raise ValueError("Cursor was issued for a different status filter")
+    return after_id
+
+
+def _task_page(tasks: List[Task], limit: int, filter_completed: Optional[bool]) -> Tuple[List[Task], Optional[str]]:
+    """Split limit + 1 fetched rows into the page and the cursor for the next one."""
+    if len(tasks) <= limit:
+        return tasks, None
+    page = tasks[:limit]
+    return page, encode_task_cursor(page[-1].id, filter_completed)
+
+
+def get_tasks_page(db: Session, user_id: int, limit: int = 100, cursor: Optional[str] = None,
+                   filter_completed: Optional[bool] = None) -> Tuple[List[Task], Optional[str]]:
+    """
+    Keyset-paginated tasks: the page after cursor (the first page for an
+    empty cursor) and next_cursor, which is None on the last page. Unlike
+    offset paging, the cost of a page does not grow with its depth and
+    pages stay consistent while tasks are added or deleted.
+    Raises ValueError for an invalid cursor.
+    """
+    after_id = decode_task_cursor(cursor, filter_completed)
+    page_key = ("after", after_id)
+    cached = task_cache.get(user_id, filter_completed, page_key, limit + 1)
+    if cached is None:
+        version = task_cache.version(user_id)
+        statement = _tasks_statement(user_id, filter_completed)
+        if after_id is not None:
+            statement = statement.where(Task.id > after_id)
+        tasks = db.exec(statement.limit(limit + 1)).all()
+        cached = task_cache.put(user_id, version, filter_completed, page_key, limit + 1, tasks)
+    return _task_page(cached, limit, filter_completed)
+
+
+# Single-task writes are one ownership-checked statement each, with
+# RETURNING instead of a SELECT before and a refresh after. Returned rows
+# are expunged before the commit so reading them does not reload them.
+def _create_task_statement(task_input: TaskToolInput, user_id: int):
     now = datetime.now(timezone.utc)
-    task = Task(
+    return insert(Task).values(
         user_id=user_id,
         title=task_input.title,
         description=task_input.description,
@@ -48,56 +138,168 @@ def create_task(db: Session, task_input: TaskToolInput, user_id: int):
         due_date=task_input.due_date,
         created_at=now,
         updated_at=now
-    )
-    db.add(task)
+    ).returning(Task)
+
+
+def _update_task_statement(task_id: int, user_id: int, task_input: TaskToolInput):
+    """UPDATE of the fields set on task_input (None leaves a field unchanged)."""
+    values = {
+        field: getattr(task_input, field)
+        for field in ("title", "description", "completed", "priority", "starred", "tags", "due_date")
+        if getattr(task_input, field) is not None
+    }
+    values["updated_at"] = datetime.now(timezone.utc)
+    return update(Task).where(Task.id == task_id, Task.user_id == user_id).values(**values).returning(Task)
+
+
+def _toggle_task_statement(task_id: int, user_id: int):
+    return update(Task).where(Task.id == task_id, Task.user_id == user_id).values(
+        completed=not_(Task.completed), updated_at=datetime.now(timezone.utc)
+    ).returning(Task)
+
+
+def _delete_task_statement(task_id: int, user_id: int):
+    return delete(Task).where(Task.id == task_id, Task.user_id == user_id).returning(Task.id)
+
+
+def _write_task(db: Session, statement, user_id: int) -> Optional[Task]:
+    """Run a single-task INSERT/UPDATE ... RETURNING and commit; None if no row matched."""
+    task = db.exec(statement).scalar_one_or_none()
+    if task is not None:
+        db.expunge(task)
     db.commit()
-    db.refresh(task)
+    if task is not None:
+        after_commit(bump_task_version, user_id)
     return task
 
 
+def create_task(db: Session, task_input: TaskToolInput, user_id: int):
+    """Create a new task."""
+    return _write_task(db, _create_task_statement(task_input, user_id), user_id)
+
+
 def update_task(db: Session, task_id: int, task_input: TaskToolInput, user_id: int):
-    """Update an existing task."""
-    task = get_task(db, task_id, user_id)
-    if not task:
-        return None
+    """Update an existing task. Returns None if the user has no such task."""
+    return _write_task(db, _update_task_statement(task_id, user_id, task_input), user_id)
 
-    if task_input.title is not None:
-        task.title = task_input.title
-    if task_input.description is not None:
-        task.description = task_input.description
-    if task_input.completed is not None:
-        task.completed = task_input.completed
-    if task_input.priority is not None:
-        task.priority = task_input.priority
-    if task_input.starred is not None:
-        task.starred = task_input.starred
-    if task_input.tags is not None:
-        task.tags = task_input.tags
-    if task_input.due_date is not None:
-        task.due_date = task_input.due_date
-
-    task.updated_at = datetime.now(timezone.utc)
-    db.add(task)
-    db.commit()
-    db.refresh(task)
-    return task
+
+def toggle_task_completion(db: Session, task_id: int, user_id: int):
+    """Flip a task's completed flag. Returns None if the user has no such task."""
+    return _write_task(db, _toggle_task_statement(task_id, user_id), user_id)
 
 
 def delete_task(db: Session, task_id: int, user_id: int) -> bool:
-    """Delete a task."""
-    task = get_task(db, task_id, user_id)
-    if not task:
-        return False
+    """Delete a task. Returns False if the user has no such task."""
+    deleted = db.exec(_delete_task_statement(task_id, user_id)).first()
+    db.commit()
+    if deleted:
+        after_commit(bump_task_version, user_id)
+    return deleted is not None
+
+
+# Batch task operations - one statement and one commit per batch
+def create_tasks(db: Session, task_inputs: List[TaskToolInput], user_id: int):
+    """
+    Create several tasks with one executemany INSERT and one commit
+    (a single statement on Postgres; SQLite runs it row by row).
+    Returns (id, title) rows in input order.
+    """
+    if not task_inputs:
+        return []
+    now = datetime.now(timezone.utc)
+    rows = [
+        {
+            "user_id": user_id,
+            "title": task_input.title,
+            "description": task_input.description,
+            "completed": task_input.completed or False,
+            "priority": task_input.priority or "medium",
+            "starred": task_input.starred or False,
+            "tags": task_input.tags,
+            "due_date": task_input.due_date,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for task_input in task_inputs
+    ]
+    # Neither database promises RETURNING rows in VALUES order; executemany
+    # with sort_by_parameter_order has SQLAlchemy match them back to the rows
+    statement = insert(Task).returning(Task.id, Task.title, sort_by_parameter_order=True)
+    created = db.execute(statement, rows).all()
+    db.commit()
+    after_commit(bump_task_version, user_id)
+    return created
+
 
-    db.delete(task)
+def complete_tasks(db: Session, task_ids: List[int], user_id: int):
+    """
+    Mark several of a user's tasks as completed with a single UPDATE.
+    Returns (id, title) rows for the tasks that were found.
+    """
+    if not task_ids:
+        return []
+    statement = update(Task).where(
+        Task.id.in_(task_ids), Task.user_id == user_id
+    ).values(completed=True, updated_at=datetime.now(timezone.utc)).returning(Task.id, Task.title)
+    completed = db.exec(statement).all()
     db.commit()
-    return True
+    if completed:
+        after_commit(bump_task_version, user_id)
+    return completed
+
+
+def delete_tasks(db: Session, task_ids: List[int], user_id: int):
+    """
+    Delete several of a user's tasks with a single DELETE.
+    Returns (id, title) rows for the tasks that were found.
+    """
+    if not task_ids:
+        return []
+    statement = delete(Task).where(
+        Task.id.in_(task_ids), Task.user_id == user_id
+    ).returning(Task.id, Task.title)
+    deleted = db.exec(statement).all()
+    db.commit()
+    if deleted:
+        after_commit(bump_task_version, user_id)
+    return deleted
 
 
 # Conversation CRUD operations
+
+# Request-scoped identity map of conversations already loaded and
+# ownership-checked, keyed by (conversation_id, user_id). It lives in
+# Session.info, so it lasts as long as the request's session; ChatHandler
+# shares one map across the sessions of a chat turn's DB phases. Entries
+# are detached snapshots for ownership checks: counters and updated_at
+# are as of when they were loaded.
+OWNED_CONVERSATIONS = "owned_conversations"
+
+
+def _owned_conversations(db) -> Dict[Tuple[int, int], Conversation]:
+    return db.info.setdefault(OWNED_CONVERSATIONS, {})
+
+
+def _remember_conversation(db, conversation: Conversation) -> None:
+    """Detach conversation (so it stays readable after commits) and memoize it."""
+    if conversation in db:
+        db.expunge(conversation)
+    _owned_conversations(db)[(conversation.id, conversation.user_id)] = conversation
+
+
+def _forget_conversation(db, conversation_id: int, user_id: int) -> None:
+    _owned_conversations(db).pop((conversation_id, user_id), None)
+
+
+def _conversation_statement(conversation_id: int, user_id: int):
+    return select(Conversation).where(
+        Conversation.id == conversation_id,
+        Conversation.user_id == user_id
+    )
+
+
 def create_conversation(db: Session, user_id: int, title: Optional[str] = None) -> Conversation:
     """Create a new conversation for a user."""
-    from datetime import datetime, timezone
     now = datetime.now(timezone.utc)
     conversation = Conversation(
         user_id=user_id,
@@ -106,17 +308,33 @@ def create_conversation(db: Session, user_id: int, title: Optional[str] = None)
         updated_at=now
     )
     db.add(conversation)
+    # Every column is set here; keep them loaded instead of refreshing
+    db.flush()
+    _remember_conversation(db, conversation)
     db.commit()
-    db.refresh(conversation)
     return conversation
 
 
 def get_conversation(db: Session, conversation_id: int, user_id: int) -> Optional[Conversation]:
-    """Get a specific conversation by ID for a user."""
-    statement = select(Conversation).where(
-        Conversation.id == conversation_id,
-        Conversation.user_id == user_id
-    )
+    """
+    Get a specific conversation by ID for a user. Only the first call per
+    request selects it; see OWNED_CONVERSATIONS.
+    """
+    owned = _owned_conversations(db).get((conversation_id, user_id))
+    if owned is not None:
+        return owned
+    conversation = db.exec(_conversation_statement(conversation_id, user_id)).first()
+    if conversation is not None:
+        _remember_conversation(db, conversation)
+    return conversation
+
+
+def get_conversation_message_count(db: Session, conversation_id: int) -> Optional[int]:
+    """
+    The stored message count of a conversation (one primary-key lookup,
+    not memoized), or None if it does not exist.
+    """
+    statement = select(Conversation.message_count).where(Conversation.id == conversation_id)
     return db.exec(statement).first()
 
 
@@ -140,23 +358,47 @@ def update_conversation_title(
     title: str
 ) -> Optional[Conversation]:
     """Update conversation title."""
-    conversation = get_conversation(db, conversation_id, user_id)
-    if conversation:
-        conversation.title = title
-        db.add(conversation)
-        db.commit()
-        db.refresh(conversation)
+    statement = update(Conversation).where(
+        Conversation.id == conversation_id, Conversation.user_id == user_id
+    ).values(title=title).returning(Conversation)
+    conversation = db.exec(statement).scalar_one_or_none()
+    if conversation is not None:
+        _remember_conversation(db, conversation)
+    db.commit()
     return conversation
 
 
+def _delete_conversation_statements(conversation_id: int, user_id: int):
+    """
+    DELETEs for a conversation's messages, summary and the conversation
+    itself, in that order; the last returns the conversation's id if it
+    was the user's. There is no ORM cascade, so each table is explicit.
+    """
+    owned = select(Conversation.id).where(Conversation.id == conversation_id, Conversation.user_id == user_id)
+    return [
+        delete(Message).where(Message.conversation_id.in_(owned)),
+        delete(ConversationSummary).where(ConversationSummary.conversation_id.in_(owned)),
+        delete(Conversation).where(
+            Conversation.id == conversation_id, Conversation.user_id == user_id
+        ).returning(Conversation.id),
+    ]
+
+
 def delete_conversation(db: Session, conversation_id: int, user_id: int) -> bool:
-    """Delete a conversation and all its messages."""
-    conversation = get_conversation(db, conversation_id, user_id)
-    if conversation:
-        db.delete(conversation)
-        db.commit()
-        return True
-    return False
+    """
+    Delete a conversation with its messages and summary in one commit.
+    LLM usage rows are kept for accounting.
+    """
+    *children, conversation = _delete_conversation_statements(conversation_id, user_id)
+    for statement in children:
+        db.exec(statement.execution_options(synchronize_session=False))
+    deleted = db.exec(conversation.execution_options(synchronize_session=False)).first()
+    db.commit()
+    _forget_conversation(db, conversation_id, user_id)
+    if deleted is None:
+        return False
+    after_commit(history_cache.invalidate, conversation_id)
+    return True
 
 
 # Message CRUD operations
@@ -169,8 +411,10 @@ def create_message(
     tool_calls: Optional[List[dict]] = None,
     tool_results: Optional[List[dict]] = None
 ) -> Message:
-    """Create a new message in a conversation."""
-    from datetime import datetime, timezone
+    """
+    Create a new message in a conversation: one INSERT plus one UPDATE of
+    the conversation's counters, in a single commit.
+    """
     now = datetime.now(timezone.utc)
     message = Message(
         conversation_id=conversation_id,
@@ -182,26 +426,54 @@ def create_message(
         created_at=now
     )
     db.add(message)
+    db.flush()
+
+    # Bump the conversation's counters in the same transaction; a single
+    # UPDATE so concurrent writers never lose an increment
+    values = {
+        "updated_at": now,
+        "message_count": Conversation.message_count + 1,
+        "last_message_at": now,
+    }
+    preview = _message_preview(content)
+    if preview:
+        values["last_message_preview"] = preview
+    db.exec(
+        update(Conversation)
+        .where(Conversation.id == conversation_id, Conversation.user_id == user_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
 
-    # Update conversation's updated_at timestamp
-    conversation = get_conversation(db, conversation_id, user_id)
-    if conversation:
-        conversation.updated_at = now
-        db.add(conversation)
-
+    # All columns were set above; keep them loaded instead of refreshing
+    db.expunge(message)
     db.commit()
-    db.refresh(message)
+    after_commit(history_cache.append, message)
     return message
 
 
+def _message_preview(content: Optional[str]) -> Optional[str]:
+    """The message text with whitespace collapsed, cut to MESSAGE_PREVIEW_CHARS; None if empty."""
+    text = " ".join((content or "").split())
+    if not text:
+        return None
+    if len(text) > MESSAGE_PREVIEW_CHARS:
+        text = text[:MESSAGE_PREVIEW_CHARS - 1] + "…"
+    return text
+
+
 def get_conversation_messages(
     db: Session,
     conversation_id: int,
     user_id: int,
     skip: int = 0,
-    limit: int = 100
+    limit: Optional[int] = 100,
+    after_id: Optional[int] = None
 ) -> List[Message]:
-    """Get all messages in a conversation."""
+    """
+    Get all messages in a conversation. Pass limit=None for no limit, and
+    after_id to only get messages newer than that message.
+    """
     # First verify user has access to this conversation
     conversation = get_conversation(db, conversation_id, user_id)
     if not conversation:
@@ -209,11 +481,180 @@ def get_conversation_messages(
 
     statement = select(Message).where(
         Message.conversation_id == conversation_id
-    ).order_by(Message.created_at.asc()).offset(skip).limit(limit)
+    )
+    if after_id is not None:
+        statement = statement.where(Message.id > after_id)
+    statement = statement.order_by(Message.created_at.asc(), Message.id.asc()).offset(skip)
+    if limit is not None:
+        statement = statement.limit(limit)
 
     return db.exec(statement).all()
 
 
+
+def encode_message_cursor(message: Message) -> str:
+    """Opaque cursor at a message's (created_at, id) position."""
+    return _encode_cursor({"at": message.created_at.isoformat(), "id": message.id})
+
+
+def decode_message_cursor(cursor: str) -> Tuple[datetime, int]:
+    """(created_at, id) of a message cursor. Raises ValueError if it is malformed."""
+    payload = _decode_cursor(cursor)
+    try:
+        return datetime.fromisoformat(payload["at"]), int(payload["id"])
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def _messages_page_statement(conversation_id: int, user_id: int, limit: int,
+                             before: Optional[str], after: Optional[str]):
+    """
+    SELECT for one page of messages in (created_at, id) order, served by
+    ix_messages_conversation_created_id. Fetches limit + 1 rows so the caller
+    can tell whether more exist; "before" pages come back newest first.
+    """
+    position = tuple_(Message.created_at, Message.id)
+    statement = select(Message).where(
+        Message.conversation_id == conversation_id,
+        Message.user_id == user_id
+    )
+    if after is not None:
+        if after:
+            statement = statement.where(position > tuple_(*decode_message_cursor(after)))
+        return statement.order_by(Message.created_at.asc(), Message.id.asc()).limit(limit + 1)
+    if before:
+        statement = statement.where(position < tuple_(*decode_message_cursor(before)))
+    return statement.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1)
+
+
+def _messages_page(rows: List[Message], limit: int, before: Optional[str], after: Optional[str]):
+    """Oldest-first page plus (older_cursor, newer_cursor) from limit + 1 fetched rows."""
+    has_more = len(rows) > limit
+    page = list(rows[:limit])
+    if after is None:
+        page.reverse()
+    if not page:
+        return page, None, None
+    # Walking back (the default), more rows means older ones exist, and a
+    # before cursor means newer ones do; walking forward it is the reverse
+    has_older = has_more if after is None else bool(after)
+    has_newer = bool(before) if after is None else has_more
+    return (
+        page,
+        encode_message_cursor(page[0]) if has_older else None,
+        encode_message_cursor(page[-1]) if has_newer else None,
+    )
+
+
+def get_messages_page(
+    db: Session,
+    conversation_id: int,
+    user_id: int,
+    limit: int = 50,
+    before: Optional[str] = None,
+    after: Optional[str] = None
+) -> Tuple[List[Message], Optional[str], Optional[str]]:
+    """
+    One page of a conversation's messages, paged in SQL by (created_at, id).
+
+    By default returns the newest messages; before=<older_cursor> walks back
+    through history ("load older") and after=<newer_cursor> walks forward
+    (after="" starts at the oldest message). Returns (messages oldest first,
+    older_cursor, newer_cursor); a cursor is None when there is nothing more
+    in that direction. Only the page is loaded, whatever the conversation
+    size. Raises ValueError for an invalid cursor.
+    """
+    statement = _messages_page_statement(conversation_id, user_id, limit, before, after)
+    return _messages_page(db.exec(statement).all(), limit, before, after)
+
+# Conversation summary operations
+def get_conversation_summary(db: Session, conversation_id: int) -> Optional[ConversationSummary]:
+    """Get the rolling summary of a conversation, if one exists."""
+    statement = select(ConversationSummary).where(ConversationSummary.conversation_id == conversation_id)
+    return db.exec(statement).first()
+
+
+def save_conversation_summary(
+    db: Session,
+    conversation_id: int,
+    user_id: int,
+    content: str,
+    through_message_id: int,
+    message_count: int
+) -> ConversationSummary:
+    """Create or replace the rolling summary of a conversation."""
+    summary = get_conversation_summary(db, conversation_id)
+    if summary is None:
+        summary = ConversationSummary(conversation_id=conversation_id, user_id=user_id, content=content,
+                                      through_message_id=through_message_id)
+    summary.content = content
+    summary.through_message_id = through_message_id
+    summary.message_count = message_count
+    summary.updated_at = datetime.now(timezone.utc)
+    db.add(summary)
+    db.commit()
+    db.refresh(summary)
+    after_commit(history_cache.invalidate, conversation_id)
+    return summary
+
+
+# LLM usage operations
+def _usage_summary_statement(user_id: int, since: datetime, group_by: str, limit: int):
+    day = func.date(LLMUsage.created_at)
+    key = day if group_by == "day" else LLMUsage.conversation_id
+    statement = select(
+        key,
+        func.count(LLMUsage.id),
+        func.coalesce(func.sum(LLMUsage.prompt_tokens), 0),
+        func.coalesce(func.sum(LLMUsage.output_tokens), 0),
+        func.coalesce(func.sum(LLMUsage.total_tokens), 0),
+        func.avg(LLMUsage.latency_ms),
+        func.max(LLMUsage.latency_ms),
+        func.count(LLMUsage.error_class),
+    ).where(
+        LLMUsage.user_id == user_id,
+        LLMUsage.created_at >= since
+    ).group_by(key)
+    if group_by == "day":
+        statement = statement.order_by(day.desc())
+    else:
+        statement = statement.order_by(func.sum(LLMUsage.total_tokens).desc())
+    return statement.limit(limit)
+
+
+def _usage_summary_rows(results, group_by: str) -> List[dict]:
+    rows = []
+    for value, calls, prompt, output, total, avg_latency, max_latency, errors in results:
+        rows.append({
+            "day": str(value) if group_by == "day" else None,
+            "conversation_id": value if group_by == "conversation" else None,
+            "calls": calls,
+            "prompt_tokens": prompt,
+            "output_tokens": output,
+            "total_tokens": total,
+            "avg_latency_ms": round(avg_latency or 0.0, 1),
+            "max_latency_ms": round(max_latency or 0.0, 1),
+            "errors": errors,
+        })
+    return rows
+
+
+def get_usage_summary(
+    db: Session,
+    user_id: int,
+    since: datetime,
+    group_by: str = "day",
+    limit: int = 100
+) -> List[dict]:
+    """
+    Aggregate a user's LLM usage since a point in time.
+    group_by="day" returns one row per day (newest first); "conversation"
+    returns one row per conversation, most total tokens first.
+    """
+    statement = _usage_summary_statement(user_id, since, group_by, limit)
+    return _usage_summary_rows(db.exec(statement).all(), group_by)
+
+
 def get_user(db: Session, user_id: int):
     """Get a user by ID."""
     statement = select(User).where(User.id == user_id)
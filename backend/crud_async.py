@@ -0,0 +1,227 @@
+"""
+Phase III Async CRUD Operations
+Async counterparts of the crud.py functions used by the REST endpoints,
+for use with AsyncSession when settings.DB_ASYNC is enabled.
+
+They share the task list cache and history cache with crud.py, so both
+session types see the same invalidation.
+"""
+
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Tuple
+
+from sqlmodel import Session, select
+
+import crud
+from database import Task
+from models import Conversation, Message, TaskToolInput
+from history_cache import history_cache
+from task_cache import task_cache, bump_task_version
+from sqlite_writer import sqlite_writer
+
+
+# Task operations
+async def get_task(db: "AsyncSession", task_id: int, user_id: int):
+    """Get a specific task by ID for a user."""
+    statement = select(Task).where(Task.id == task_id, Task.user_id == user_id)
+    return (await db.exec(statement)).first()
+
+
+async def get_tasks(db: "AsyncSession", user_id: int, skip: int = 0, limit: int = 100,
+                    filter_completed: Optional[bool] = None):
+    """
+    Get all tasks for a user with optional filtering.
+    Served from the task cache when the user's tasks have not changed.
+    """
+    cached = task_cache.get(user_id, filter_completed, skip, limit)
+    if cached is not None:
+        return cached
+
+    version = task_cache.version(user_id)
+    statement = crud._tasks_statement(user_id, filter_completed).offset(skip).limit(limit)
+    tasks = (await db.exec(statement)).all()
+    return task_cache.put(user_id, version, filter_completed, skip, limit, tasks)
+
+
+async def get_tasks_page(db: "AsyncSession", user_id: int, limit: int = 100, cursor: Optional[str] = None,
+                         filter_completed: Optional[bool] = None) -> Tuple[List[Task], Optional[str]]:
+    """Keyset-paginated tasks and next_cursor; see crud.get_tasks_page."""
+    after_id = crud.decode_task_cursor(cursor, filter_completed)
+    page_key = ("after", after_id)
+    cached = task_cache.get(user_id, filter_completed, page_key, limit + 1)
+    if cached is None:
+        version = task_cache.version(user_id)
+        statement = crud._tasks_statement(user_id, filter_completed)
+        if after_id is not None:
+            statement = statement.where(Task.id > after_id)
+        tasks = (await db.exec(statement.limit(limit + 1))).all()
+        cached = task_cache.put(user_id, version, filter_completed, page_key, limit + 1, tasks)
+    return crud._task_page(cached, limit, filter_completed)
+
+
+async def _write_task(db: "AsyncSession", statement, user_id: int) -> Optional[Task]:
+    """Run a single-task INSERT/UPDATE ... RETURNING and commit; see crud._write_task."""
+    task = (await db.exec(statement)).scalar_one_or_none()
+    await db.commit()
+    if task is not None:
+        bump_task_version(user_id)
+    return task
+
+
+async def create_task(db: "AsyncSession", task_input: TaskToolInput, user_id: int):
+    """Create a new task."""
+    return await _write_task(db, crud._create_task_statement(task_input, user_id), user_id)
+
+
+async def update_task(db: "AsyncSession", task_id: int, task_input: TaskToolInput, user_id: int):
+    """Update an existing task. Returns None if the user has no such task."""
+    return await _write_task(db, crud._update_task_statement(task_id, user_id, task_input), user_id)
+
+
+async def toggle_task_completion(db: "AsyncSession", task_id: int, user_id: int):
+    """Flip a task's completed flag. Returns None if the user has no such task."""
+    return await _write_task(db, crud._toggle_task_statement(task_id, user_id), user_id)
+
+
+async def delete_task(db: "AsyncSession", task_id: int, user_id: int) -> bool:
+    """Delete a task. Returns False if the user has no such task."""
+    deleted = (await db.exec(crud._delete_task_statement(task_id, user_id))).first()
+    await db.commit()
+    if deleted:
+        bump_task_version(user_id)
+    return deleted is not None
+
+
+# Conversation operations
+async def get_conversation(db: "AsyncSession", conversation_id: int, user_id: int) -> Optional[Conversation]:
+    """Get a specific conversation by ID for a user, memoized per request; see crud.get_conversation."""
+    owned = crud._owned_conversations(db).get((conversation_id, user_id))
+    if owned is not None:
+        return owned
+    conversation = (await db.exec(crud._conversation_statement(conversation_id, user_id))).first()
+    if conversation is not None:
+        crud._remember_conversation(db, conversation)
+    return conversation
+
+
+async def get_user_conversations(
+    db: "AsyncSession",
+    user_id: int,
+    skip: int = 0,
+    limit: int = 50
+) -> List[Conversation]:
+    """Get all conversations for a user, ordered by most recent."""
+    statement = select(Conversation).where(
+        Conversation.user_id == user_id
+    ).order_by(Conversation.updated_at.desc()).offset(skip).limit(limit)
+    return (await db.exec(statement)).all()
+
+
+async def delete_conversation(db: "AsyncSession", conversation_id: int, user_id: int) -> bool:
+    """
+    Delete a conversation with its messages and summary in one commit.
+    LLM usage rows are kept for accounting.
+    """
+    *children, conversation = crud._delete_conversation_statements(conversation_id, user_id)
+    for statement in children:
+        await db.exec(statement.execution_options(synchronize_session=False))
+    deleted = (await db.exec(conversation.execution_options(synchronize_session=False))).first()
+    await db.commit()
+    crud._forget_conversation(db, conversation_id, user_id)
+    if deleted is None:
+        return False
+    history_cache.invalidate(conversation_id)
+    return True
+
+
+# Message operations
+async def get_conversation_messages(
+    db: "AsyncSession",
+    conversation_id: int,
+    user_id: int,
+    skip: int = 0,
+    limit: Optional[int] = 100,
+    after_id: Optional[int] = None
+) -> List[Message]:
+    """
+    Get all messages in a conversation. Pass limit=None for no limit, and
+    after_id to only get messages newer than that message.
+    """
+    conversation = await get_conversation(db, conversation_id, user_id)
+    if not conversation:
+        return []
+
+    statement = select(Message).where(
+        Message.conversation_id == conversation_id
+    )
+    if after_id is not None:
+        statement = statement.where(Message.id > after_id)
+    statement = statement.order_by(Message.created_at.asc(), Message.id.asc()).offset(skip)
+    if limit is not None:
+        statement = statement.limit(limit)
+
+    return (await db.exec(statement)).all()
+
+
+
+async def get_messages_page(
+    db: "AsyncSession",
+    conversation_id: int,
+    user_id: int,
+    limit: int = 50,
+    before: Optional[str] = None,
+    after: Optional[str] = None
+) -> Tuple[List[Message], Optional[str], Optional[str]]:
+    """One SQL-paged page of messages and its cursors; see crud.get_messages_page."""
+    statement = crud._messages_page_statement(conversation_id, user_id, limit, before, after)
+    return crud._messages_page((await db.exec(statement)).all(), limit, before, after)
+
+# LLM usage operations
+async def get_usage_summary(db: "AsyncSession", user_id: int, since: datetime, group_by: str = "day",
+                            limit: int = 100) -> List[dict]:
+    """Aggregated LLM usage; see crud.get_usage_summary."""
+    statement = crud._usage_summary_statement(user_id, since, group_by, limit)
+    return crud._usage_summary_rows((await db.exec(statement)).all(), group_by)
+
+
+_ASYNC_VERSIONS = {
+    crud.get_task: get_task,
+    crud.get_tasks: get_tasks,
+    crud.get_tasks_page: get_tasks_page,
+    crud.create_task: create_task,
+    crud.update_task: update_task,
+    crud.toggle_task_completion: toggle_task_completion,
+    crud.delete_task: delete_task,
+    crud.get_conversation: get_conversation,
+    crud.get_user_conversations: get_user_conversations,
+    crud.delete_conversation: delete_conversation,
+    crud.get_conversation_messages: get_conversation_messages,
+    crud.get_messages_page: get_messages_page,
+    crud.get_usage_summary: get_usage_summary,
+}
+
+# Sync-session writes sent through the SQLite write queue when it is enabled
+_QUEUED_WRITES = {
+    crud.create_task,
+    crud.update_task,
+    crud.toggle_task_completion,
+    crud.delete_task,
+    crud.delete_conversation,
+}
+
+
+async def run_crud(func: Callable, db: Any, *args, **kwargs):
+    """
+    Call a crud.py function with whichever session get_request_db provided:
+    the sync function for a Session, its async counterpart otherwise.
+    Writes on SQLite go through the write queue (see sqlite_writer.py),
+    sharing the request's conversation ownership map.
+    """
+    if isinstance(db, Session):
+        if func in _QUEUED_WRITES and sqlite_writer.accepts(db):
+            owned = crud._owned_conversations(db)
+            return await sqlite_writer.run_async(
+                func, *args, session_info={crud.OWNED_CONVERSATIONS: owned}, **kwargs
+            )
+        return func(db, *args, **kwargs)
+    return await _ASYNC_VERSIONS[func](db, *args, **kwargs)
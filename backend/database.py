@@ -4,7 +4,18 @@ Uses Phase 2 database setup with additional tables for conversations.
 """
 
 from datetime import datetime, timezone
+from sqlalchemy import Index, event
 from sqlmodel import SQLModel, Session, create_engine
+from metrics import metrics
+
+# Async driver support is optional; only needed with DB_ASYNC=true
+try:
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlmodel.ext.asyncio.session import AsyncSession
+    ASYNC_DB_AVAILABLE = True
+except ImportError:
+    ASYNC_DB_AVAILABLE = False
+    AsyncSession = None
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -23,6 +34,49 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 1440
     DEBUG: bool = False
     OPENAI_API_KEY: str = "your-openai-api-key"
+    HISTORY_CACHE_SIZE: int = 256  # Max conversations with cached agent history
+    HISTORY_CACHE_TTL_SECONDS: float = 300.0  # Max age of cached agent history
+    TOOL_CALL_CONCURRENCY: int = 4  # Max tool calls run at once within one agent turn
+    FAST_PATH_ENABLED: bool = True  # Answer unambiguous task commands without the LLM
+    FAST_PATH_CONFIDENCE: float = 0.9  # Minimum intent confidence for the fast path
+    TEMPLATED_TOOL_REPLIES: bool = True  # Confirm successful mutating tools without a second LLM call
+    TASK_CACHE_SIZE: int = 1024  # Max cached task lists (all users)
+    TASK_CACHE_TTL_SECONDS: float = 30.0  # Max age of a cached task list
+    LLM_MAX_IN_FLIGHT: int = 8  # Chat turns allowed to call Gemini at once
+    LLM_MAX_QUEUE: int = 32  # Chat turns allowed to wait for a slot
+    LLM_QUEUE_TIMEOUT_SECONDS: float = 10.0  # Max wait for a slot before answering 503
+    LLM_RETRY_AFTER_SECONDS: int = 5  # Retry-After sent with 503 responses
+    LLM_MAX_RETRIES: int = 2  # Retries for transient Gemini errors (429, 5xx, timeouts)
+    LLM_RETRY_BASE_DELAY_SECONDS: float = 0.5  # Backoff base, doubled per retry with full jitter
+    LLM_RETRY_MAX_DELAY_SECONDS: float = 4.0  # Backoff cap
+    LLM_ATTEMPT_TIMEOUT_SECONDS: float = 30.0  # Timeout for a single Gemini attempt
+    LLM_BREAKER_FAILURE_THRESHOLD: int = 5  # Consecutive failed calls before the breaker opens
+    LLM_BREAKER_RESET_SECONDS: float = 30.0  # Time the breaker stays open before a probe
+    GEMINI_MODEL_CACHE_FILE: str = "/tmp/gemini_model_cache.json"  # Detected model, reused across restarts
+    GEMINI_MODEL_CACHE_TTL_SECONDS: int = 86400  # Re-run list_models after this long
+    HISTORY_TOKEN_BUDGET: int = 8000  # Estimated tokens of history sent per turn (0 = unlimited)
+    HISTORY_KEEP_RECENT_TURNS: int = 4  # Most recent turns always sent untrimmed
+    SUMMARY_TRIGGER_MESSAGES: int = 40  # Unsummarized messages that trigger a rolling summary (0 = off)
+    SUMMARY_KEEP_RECENT_MESSAGES: int = 12  # Newest messages always kept out of the summary
+    USAGE_FLUSH_INTERVAL_SECONDS: float = 5.0  # How often buffered LLM usage rows are written
+    USAGE_BATCH_SIZE: int = 200  # Flush early once this many rows are buffered
+    USAGE_MAX_BUFFER: int = 10000  # Oldest rows are dropped beyond this if the database is unavailable
+    MCP_SERVER_URL: Optional[str] = None  # e.g. http://mcp:8001/mcp; run tools on a remote MCP server
+    MCP_CLIENT_TIMEOUT_SECONDS: float = 10.0  # Per tool call to the remote MCP server
+    MCP_CLIENT_MAX_CONNECTIONS: int = 50  # Keep-alive pool size for the remote MCP server
+    DB_ASYNC: bool = False  # Serve REST endpoints with async sessions (asyncpg; ignored for SQLite)
+    DB_MIGRATE_ON_STARTUP: bool = True  # Apply pending schema migrations in the app lifespan
+    SQLITE_JOURNAL_MODE: str = "WAL"  # WAL lets readers run while a write is in progress
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # With WAL, fsync at checkpoints instead of on every commit
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # Wait this long for the write lock before "database is locked"
+    SQLITE_CACHE_SIZE_KB: int = 32768  # Page cache per connection
+    SQLITE_MMAP_SIZE: int = 268435456  # Bytes of the file memory-mapped for reads (0 = off)
+    SQLITE_TEMP_STORE: str = "MEMORY"  # Keep temp tables and sort files in memory
+    SQLITE_POOL_SIZE: int = 8  # Pooled connections; in WAL mode readers use them concurrently
+    SQLITE_MAX_OVERFLOW: int = 8  # Extra connections beyond SQLITE_POOL_SIZE under bursts
+    SQLITE_WRITE_QUEUE: bool = True  # Group-commit task, chat, usage and summary writes on one writer (signup and migrations write directly)
+    SQLITE_WRITE_BATCH_SIZE: int = 64  # Max queued writes committed together
+    SQLITE_WRITE_BATCH_WAIT_MS: float = 0.0  # Extra wait for a batch to fill (0 = commit whatever is queued)
 
     class Config:
         env_file = ".env"
@@ -47,6 +101,10 @@ class User(SQLModel, table=True):
 class Task(SQLModel, table=True):
     """Task model for task management."""
     __tablename__ = "tasks"
+    __table_args__ = (
+        Index("ix_tasks_user_completed_id", "user_id", "completed", "id"),
+        Index("ix_tasks_user_id_id", "user_id", "id"),
+    )
     id: Optional[int] = Field(default=None, primary_key=True, index=True)
     user_id: int = Field(foreign_key="users.id", index=True)
     title: str = Field(default="", max_length=255)
@@ -60,10 +118,52 @@ class Task(SQLModel, table=True):
     updated_at: Optional[datetime] = Field(default=None)
 
 # Export for use in other modules
-__all__ = ["settings", "engine", "User", "Task", "get_db", "create_db_and_tables"]
+__all__ = ["settings", "engine", "User", "Task", "get_db", "get_async_db", "get_request_db", "async_sessions_enabled", "create_db_and_tables"]
+
+def is_sqlite_file(url: str) -> bool:
+    """True for a file-backed SQLite URL (not :memory:)."""
+    if not url.startswith("sqlite") or ":memory:" in url:
+        return False
+    _, separator, path = url.partition(":///")
+    return bool(separator and path)
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record=None):
+    """
+    Per-connection SQLite settings (see the SQLITE_* settings). journal_mode
+    is stored in the database file; the others last for the connection.
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.execute(f"PRAGMA cache_size={-int(settings.SQLITE_CACHE_SIZE_KB)}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+        cursor.execute(f"PRAGMA temp_store={settings.SQLITE_TEMP_STORE}")
+    finally:
+        cursor.close()
+
+
+def sqlite_engine_options() -> dict:
+    """create_engine arguments for a file-backed SQLite DATABASE_URL."""
+    return {
+        "connect_args": {
+            "check_same_thread": False,
+            # sqlite3's own lock wait, matching PRAGMA busy_timeout
+            "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000,
+        },
+        "pool_size": settings.SQLITE_POOL_SIZE,
+        "max_overflow": settings.SQLITE_MAX_OVERFLOW,
+        "echo": settings.DEBUG,
+    }
+
 
 # Create engine
-if settings.DATABASE_URL.startswith("sqlite"):
+if is_sqlite_file(settings.DATABASE_URL):
+    engine = create_engine(settings.DATABASE_URL, **sqlite_engine_options())
+    event.listen(engine, "connect", apply_sqlite_pragmas)
+elif settings.DATABASE_URL.startswith("sqlite"):
     engine = create_engine(
         settings.DATABASE_URL,
         connect_args={
@@ -82,6 +182,15 @@ else:
     )
 
 
+def pool_checked_out() -> int:
+    """Connections currently checked out of the sync engine's pool."""
+    checkedout = getattr(engine.pool, "checkedout", None)
+    return checkedout() if checkedout else 0
+
+
+metrics.register_gauge("db_pool.checked_out", pool_checked_out)
+
+
 def get_db():
     """Database session dependency."""
     with Session(engine) as session:
@@ -91,22 +200,81 @@ def get_db():
             session.close()
 
 
+def _async_database_url(url: str) -> str:
+    """Map a sync Postgres DATABASE_URL to the asyncpg driver."""
+    if url.startswith("postgresql+psycopg2:"):
+        return url.replace("postgresql+psycopg2:", "postgresql+asyncpg:", 1)
+    if url.startswith("postgresql:"):
+        return url.replace("postgresql:", "postgresql+asyncpg:", 1)
+    if url.startswith("postgres:"):
+        return url.replace("postgres:", "postgresql+asyncpg:", 1)
+    return url
+
+
+_async_engine = None
+
+
+def get_async_engine():
+    """
+    Create (once) and return the async engine for DATABASE_URL. Postgres
+    only; see async_sessions_enabled().
+    """
+    global _async_engine
+    if _async_engine is None:
+        if not ASYNC_DB_AVAILABLE:
+            raise RuntimeError(
+                "DB_ASYNC requires SQLAlchemy asyncio support: "
+                "pip install 'sqlalchemy[asyncio]' asyncpg"
+            )
+        _async_engine = create_async_engine(
+            _async_database_url(settings.DATABASE_URL),
+            pool_pre_ping=True,
+            pool_recycle=300,
+            pool_size=20,
+            max_overflow=30,
+            echo=settings.DEBUG
+        )
+    return _async_engine
+
+
+async def get_async_db():
+    """Async database session dependency."""
+    # expire_on_commit=False: attribute access after commit must not lazy-load
+    async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
+        yield session
+
+
+def async_sessions_enabled() -> bool:
+    """
+    True when REST endpoints should use AsyncSession.
+
+    Not for SQLite: it has a single write lock, and an async transaction
+    holding it across an await would block the sync sessions that the chat
+    path still opens on the event loop thread.
+    """
+    return settings.DB_ASYNC and not settings.DATABASE_URL.startswith("sqlite")
+
+
+async def get_request_db():
+    """
+    Session dependency for the REST endpoints: an AsyncSession when
+    async_sessions_enabled(), otherwise the regular sync Session.
+    Use crud_async.run_crud to call CRUD functions with either.
+    """
+    if async_sessions_enabled():
+        async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
+            yield session
+    else:
+        with Session(engine) as session:
+            yield session
+
+
 def create_db_and_tables():
-    """Create all database tables."""
-    # Import Phase 3 models to register them
-    # We only register the local models (Conversation, Message) for phase3
-    # The User and Task models from phase2 are not re-registered here
-    # to avoid conflicts
-    from models import Conversation, Message  # noqa: F401
-    try:
-        # Drop all tables first to ensure clean schema
-        SQLModel.metadata.drop_all(bind=engine)
-        # Then create all tables with the new schema
-        SQLModel.metadata.create_all(bind=engine)
-    except Exception as e:
-        # If tables already exist, continue (this can happen with existing databases)
-        # Re-attempt creation without dropping, just in case of race condition or existing DB
-        try:
-            SQLModel.metadata.create_all(bind=engine)
-        except Exception:
-            pass # Ignore if creation also fails, it means tables truly exist
\ No newline at end of file
+    """
+    Bring the schema up to date by applying pending migrations (see
+    migrations.py). Existing tables and data are kept.
+    """
+    if not settings.DB_MIGRATE_ON_STARTUP:
+        return
+    from migrations import upgrade
+    upgrade(engine)
@@ -0,0 +1,215 @@
+"""
+Phase III Conversation History Cache
+Keeps the already-formatted GenAI history for recently active conversations.
+
+Each chat turn used to reload and re-parse the whole conversation from the
+database. The cache is filled once per conversation, then kept up to date by
+appending messages as they are persisted (see crud.create_message), so the
+cost of a turn no longer grows with the length of the conversation.
+
+The cache is per process. It is bounded by an LRU on the number of
+conversations, entries expire after HISTORY_CACHE_TTL_SECONDS, and it is
+invalidated when a conversation is deleted. Only this process's writes
+are appended, so with several workers or replicas an entry can miss
+messages written elsewhere: each entry records the conversation's
+message_count, kept in step by append(), and callers pass the stored
+Conversation.message_count to get(), which drops the entry on a mismatch.
+Without that check the cache is only valid for a single worker.
+
+A load races with messages committed by other turns between its SELECT
+and load(): their append() finds no entry yet. Callers therefore call
+begin_load() before reading; any append or invalidate for the
+conversation in the meantime marks the load stale, and a stale load is
+returned to its caller but not cached.
+"""
+
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from database import settings
+from metrics import metrics
+from models import ConversationSummary, Message, decode_tool_json
+
+logger = logging.getLogger(__name__)
+
+
+def message_to_history(msg: Message) -> List[Dict[str, Any]]:
+    """
+    Convert a stored Message row into GenAI history entries.
+
+    Returns entries in the same shape run_agent sends to the model,
+    so cached history can be passed through without re-formatting.
+    """
+    history = []
+    parts = []
+    if msg.content:
+        parts.append({"text": msg.content})
+    if msg.tool_calls:
+        try:
+            tool_calls = decode_tool_json(msg.tool_calls)
+            for tc in tool_calls:
+                parts.append({"function_call": {"name": tc["name"], "args": tc["arguments"]}})
+            history.append({"role": "model", "parts": parts})
+            parts = []
+        except (json.JSONDecodeError, TypeError) as e:
+            logger.warning(f"Malformed tool_calls in message {msg.id}: {e}")
+            if msg.content:
+                history.append({"role": "model", "parts": [{"text": msg.content}]})
+            return history
+    if msg.tool_results:
+        try:
+            tool_results = decode_tool_json(msg.tool_results)
+            for tr in tool_results:
+                parts.append({"function_response": {"name": tr["id"], "response": {"content": tr["result"]}}})
+            history.append({"role": "function", "parts": parts})
+            parts = []
+        except (json.JSONDecodeError, TypeError) as e:
+            logger.warning(f"Malformed tool_results in message {msg.id}: {e}")
+            if msg.content:
+                history.append({"role": "function", "parts": [{"text": msg.content}]})
+            return history
+    if msg.role == "user":
+        history.append({"role": "user", "parts": parts})
+    elif msg.role == "assistant" and not msg.tool_calls:
+        history.append({"role": "model", "parts": parts})
+
+    # run_agent never sends entries without parts, so drop them here too
+    return [entry for entry in history if entry["parts"]]
+
+
+def summary_to_history(summary: ConversationSummary) -> List[Dict[str, Any]]:
+    """
+    GenAI history entries standing in for the summarized part of a
+    conversation. A model acknowledgement follows so roles keep alternating.
+    """
+    return [
+        {"role": "user", "parts": [{"text": f"Summary of our earlier conversation:\n{summary.content}"}]},
+        {"role": "model", "parts": [{"text": "Understood, I'll keep that in mind."}]},
+    ]
+
+
+class HistoryCache:
+    """
+    LRU + TTL cache of formatted GenAI history, keyed by conversation ID.
+    Entries are (expiry, message count, history).
+    """
+
+    def __init__(self, max_conversations: int = 256, ttl_seconds: float = 300.0):
+        self.max_conversations = max_conversations
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[int, Tuple[float, Optional[int], List[Dict[str, Any]]]]" = OrderedDict()
+        # Loads in progress: conversation ID -> {load token: stale}
+        self._loads: Dict[int, Dict[int, bool]] = {}
+        self._load_tokens = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def get(self, conversation_id: int, message_count: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Return a copy of the cached history, or None on a miss. With the
+        conversation's stored message_count, an entry that does not cover
+        exactly that many messages (another process wrote some) is dropped.
+        """
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                return None
+            expires_at, cached_count, history = entry
+            if expires_at < time.monotonic():
+                del self._entries[conversation_id]
+                return None
+            if message_count is not None and cached_count is not None and cached_count != message_count:
+                del self._entries[conversation_id]
+                metrics.increment("history_cache.stale_hits")
+                return None
+            self._entries.move_to_end(conversation_id)
+            return list(history)
+
+    def begin_load(self, conversation_id: int) -> int:
+        """
+        Call before reading a conversation's messages for load(). Returns the
+        token to pass to load() and end_load().
+        """
+        with self._lock:
+            token = next(self._load_tokens)
+            self._loads.setdefault(conversation_id, {})[token] = False
+            return token
+
+    def end_load(self, conversation_id: int, token: int) -> bool:
+        """Forget a load (no-op if load() already did). Returns True if it went stale."""
+        with self._lock:
+            return self._end_load(conversation_id, token)
+
+    def _end_load(self, conversation_id: int, token: int) -> bool:
+        loads = self._loads.get(conversation_id)
+        if loads is None or token not in loads:
+            return True
+        stale = loads.pop(token)
+        if not loads:
+            del self._loads[conversation_id]
+        return stale
+
+    def _mark_loads_stale(self, conversation_id: int) -> None:
+        loads = self._loads.get(conversation_id)
+        if loads:
+            for token in loads:
+                loads[token] = True
+
+    def load(
+        self,
+        conversation_id: int,
+        messages: List[Message],
+        summary: Optional[ConversationSummary] = None,
+        token: Optional[int] = None,
+        message_count: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Build the history for a conversation from its messages and cache it.
+        With a summary, messages should be the ones after the summarized range.
+        With a token from begin_load(), the history is not cached if the
+        conversation changed since then. message_count is the conversation's
+        stored count, read before the messages.
+        """
+        history = summary_to_history(summary) if summary else []
+        for msg in messages:
+            history.extend(message_to_history(msg))
+        with self._lock:
+            if token is not None and self._end_load(conversation_id, token):
+                metrics.increment("history_cache.stale_loads")
+                return list(history)
+            self._entries[conversation_id] = (time.monotonic() + self.ttl_seconds, message_count, history)
+            self._entries.move_to_end(conversation_id)
+            while len(self._entries) > self.max_conversations:
+                self._entries.popitem(last=False)
+        return list(history)
+
+    def append(self, message: Message) -> None:
+        """Append a newly persisted message if its conversation is cached."""
+        with self._lock:
+            self._mark_loads_stale(message.conversation_id)
+            entry = self._entries.get(message.conversation_id)
+            if entry is None:
+                # Not cached: the next load reads it from the database
+                return
+            expires_at, message_count, history = entry
+            history.extend(message_to_history(message))
+            if message_count is not None:
+                self._entries[message.conversation_id] = (expires_at, message_count + 1, history)
+
+    def invalidate(self, conversation_id: int) -> None:
+        """Drop a conversation from the cache."""
+        with self._lock:
+            self._mark_loads_stale(conversation_id)
+            self._entries.pop(conversation_id, None)
+
+    def clear(self) -> None:
+        """Drop all cached conversations."""
+        with self._lock:
+            self._entries.clear()
+
+
+history_cache = HistoryCache(settings.HISTORY_CACHE_SIZE, settings.HISTORY_CACHE_TTL_SECONDS)
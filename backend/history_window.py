@@ -0,0 +1,135 @@
+"""
+Phase III History Window
+Fits the GenAI history sent with each turn into a token budget.
+
+Without a limit every turn re-sends the whole conversation, so prompt size,
+latency and cost grow with the conversation. fit_history trims in two steps:
+
+1. Elide old tool payloads (function_response bodies), oldest turn first.
+2. Drop whole turns, oldest first.
+
+The most recent turns are always kept as they are. Trimming works on whole
+turns (a user message and every model/function entry that follows it), so a
+function_call is never separated from its function_response. The agent's
+instructions are not part of the history and are never trimmed.
+
+Token counts are estimates (about four characters per token), which is
+close enough for budgeting without a round trip to count_tokens.
+"""
+
+import json
+import logging
+from typing import Any, Dict, List, Tuple
+
+from database import settings
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4
+ELIDED_PLACEHOLDER = "[earlier tool output omitted]"
+
+
+def estimate_tokens(part: Dict[str, Any]) -> int:
+    """Rough token estimate for one history part."""
+    if "text" in part:
+        size = len(part["text"] or "")
+    else:
+        size = len(json.dumps(part, default=str, ensure_ascii=False))
+    return max(1, size // CHARS_PER_TOKEN)
+
+
+def _entry_tokens(entry: Dict[str, Any]) -> int:
+    return sum(estimate_tokens(part) for part in entry.get("parts", []))
+
+
+def _split_turns(history: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Group entries into turns, each starting at a user entry."""
+    turns = []
+    for entry in history:
+        if entry.get("role") == "user" or not turns:
+            turns.append([])
+        turns[-1].append(entry)
+    return turns
+
+
+def _elide_tool_payloads(turn: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Return a copy of the turn with function_response bodies replaced by a
+    placeholder, and the number of parts elided. Entries are copied, never
+    modified, since they may be shared with the history cache.
+    """
+    elided = 0
+    new_turn = []
+    for entry in turn:
+        parts = []
+        for part in entry.get("parts", []):
+            if "function_response" in part:
+                name = part["function_response"].get("name")
+                parts.append({"function_response": {"name": name, "response": {"content": ELIDED_PLACEHOLDER}}})
+                elided += 1
+            else:
+                parts.append(part)
+        new_turn.append({**entry, "parts": parts})
+    return new_turn, elided
+
+
+def fit_history(
+    history: List[Dict[str, Any]],
+    budget: int,
+    keep_recent_turns: int,
+) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    Trim history to fit the token budget.
+
+    Returns the history to send and stats: original_tokens, kept_tokens,
+    trimmed_tokens, elided_parts and dropped_turns. A budget <= 0 disables
+    trimming. The recent turns are kept even if they alone exceed the budget.
+    """
+    turns = _split_turns(history)
+    turn_tokens = [sum(_entry_tokens(entry) for entry in turn) for turn in turns]
+    original = sum(turn_tokens)
+    stats = {"original_tokens": original, "kept_tokens": original, "trimmed_tokens": 0,
+             "elided_parts": 0, "dropped_turns": 0}
+    if budget <= 0 or original <= budget:
+        return history, stats
+
+    old_count = max(0, len(turns) - keep_recent_turns)
+    total = original
+
+    # Step 1: elide tool payloads in old turns, oldest first
+    for i in range(old_count):
+        if total <= budget:
+            break
+        turns[i], elided = _elide_tool_payloads(turns[i])
+        if elided:
+            new_tokens = sum(_entry_tokens(entry) for entry in turns[i])
+            total -= turn_tokens[i] - new_tokens
+            turn_tokens[i] = new_tokens
+            stats["elided_parts"] += elided
+
+    # Step 2: drop old turns, oldest first
+    first_kept = 0
+    while first_kept < old_count and total > budget:
+        total -= turn_tokens[first_kept]
+        first_kept += 1
+    stats["dropped_turns"] = first_kept
+
+    trimmed = [entry for turn in turns[first_kept:] for entry in turn]
+    stats["kept_tokens"] = total
+    stats["trimmed_tokens"] = original - total
+    return trimmed, stats
+
+
+def window_history(history: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """fit_history with the configured budget, recording per-request metrics."""
+    trimmed, stats = fit_history(history, settings.HISTORY_TOKEN_BUDGET, settings.HISTORY_KEEP_RECENT_TURNS)
+    metrics.observe("history.prompt_tokens", stats["kept_tokens"])
+    metrics.observe("history.trimmed_tokens", stats["trimmed_tokens"])
+    if stats["trimmed_tokens"]:
+        metrics.increment("history.trimmed_requests")
+        logger.info(
+            f"History trimmed from ~{stats['original_tokens']} to ~{stats['kept_tokens']} tokens "
+            f"({stats['elided_parts']} tool payload(s) elided, {stats['dropped_turns']} turn(s) dropped)"
+        )
+    return trimmed
@@ -0,0 +1,151 @@
+"""
+Phase III Fast-Path Intent Router
+Answers unambiguous task commands without calling the LLM.
+
+A small compiled grammar recognizes commands such as "add task buy milk",
+"list pending tasks", "complete task 3", "delete task 4", "rename task 2 to X"
+and "set priority of task 5 to high". Each rule carries a confidence; only
+matches at or above settings.FAST_PATH_CONFIDENCE are executed directly via
+the MCP tools, everything else goes to run_agent.
+"""
+
+import re
+from typing import Any, Dict, List, Optional
+
+from database import settings
+from metrics import metrics
+
+_TASK_ID = r"task\s+#?(?P<task_id>\d+)"
+_PRIORITY = r"(?P<priority>low|medium|high)"
+
+# (pattern, tool name, confidence) - the first matching rule wins
+_RULES = [
+    (r"(?:please\s+)?(?:add|create)\s+(?:a\s+)?(?:new\s+)?task\s*:?\s+(?P<title>.+?)", "add_task", 0.95),
+    (r"(?:please\s+)?(?:add|create)\s+(?:a\s+)?" + _PRIORITY + r"\s+priority\s+task\s*:?\s+(?P<title>.+?)", "add_task", 0.95),
+    # "add milk, eggs and bread" may be several tasks - leave it to the LLM
+    (r"(?:please\s+)?add\s+(?P<title>.+?)", "add_task", 0.6),
+    (r"(?:list|show)(?:\s+me)?(?:\s+all)?(?:\s+(?:my|the))?(?:\s+(?P<status>pending|completed|open|done))?\s+tasks", "list_tasks", 0.95),
+    (r"(?:my\s+)?(?P<status>pending|completed)?\s*tasks", "list_tasks", 0.9),
+    (r"(?:complete|finish|done)\s+" + _TASK_ID, "complete_task", 0.95),
+    (r"mark\s+" + _TASK_ID + r"\s+as\s+(?:done|complete|completed|finished)", "complete_task", 0.95),
+    (r"(?:delete|remove)\s+" + _TASK_ID, "delete_task", 0.95),
+    # Priority rules before rename, so "update task 2 to high" is not a rename to "high"
+    (r"(?:set\s+)?(?:the\s+)?priority\s+(?:of\s+|for\s+)?" + _TASK_ID + r"\s+(?:to\s+)?" + _PRIORITY, "update_task", 0.95),
+    (r"(?:make|mark|set|update|change)\s+" + _TASK_ID + r"\s+(?:priority\s+)?(?:to\s+|as\s+)?" + _PRIORITY + r"(?:\s+priority)?",
+     "update_task", 0.9),
+    (r"(?:rename|update)\s+" + _TASK_ID + r"\s+(?:title\s+)?to\s+(?P<title>.+?)", "update_task", 0.9),
+]
+
+_COMPILED_RULES = [
+    (re.compile(r"^\s*" + pattern + r"\s*[.!]*\s*$", re.IGNORECASE), tool, confidence)
+    for pattern, tool, confidence in _RULES
+]
+
+_STATUS_ALIASES = {"open": "pending", "done": "completed"}
+
+
+def match_intent(message: str) -> Optional[Dict[str, Any]]:
+    """
+    Match a message against the grammar.
+
+    Returns {"name", "arguments", "confidence"} for the first matching rule,
+    or None if nothing matches.
+    """
+    for pattern, tool, confidence in _COMPILED_RULES:
+        match = pattern.match(message)
+        if not match:
+            continue
+        groups = {k: v for k, v in match.groupdict().items() if v is not None}
+        arguments: Dict[str, Any] = {}
+        if "task_id" in groups:
+            arguments["task_id"] = int(groups["task_id"])
+        if "title" in groups:
+            arguments["title"] = groups["title"].strip()
+        if "priority" in groups:
+            arguments["priority"] = groups["priority"].lower()
+        if tool == "list_tasks":
+            status = groups.get("status", "all").lower()
+            arguments["status"] = _STATUS_ALIASES.get(status, status)
+        return {"name": tool, "arguments": arguments, "confidence": confidence}
+    return None
+
+
+def route(message: str) -> Optional[Dict[str, Any]]:
+    """
+    Return a confident tool call for the message, or None to use the LLM.
+    Records fast-path hits and misses in the metrics registry.
+    """
+    if not settings.FAST_PATH_ENABLED:
+        return None
+    intent = match_intent(message)
+    if intent and intent["confidence"] >= settings.FAST_PATH_CONFIDENCE:
+        metrics.increment("fast_path.hits")
+        metrics.increment(f"fast_path.hits.{intent['name']}")
+        return intent
+    metrics.increment("fast_path.misses")
+    return None
+
+
+def fast_path_hit_rate() -> float:
+    """Share of routed messages answered without the LLM."""
+    hits = metrics.get("fast_path.hits")
+    total = hits + metrics.get("fast_path.misses")
+    return round(hits / total, 4) if total else 0.0
+
+
+metrics.register_gauge("fast_path.hit_rate", fast_path_hit_rate)
+
+
+_PRIORITY_EMOJI = {"high": "🔴", "medium": "🟡", "low": "🔵"}
+
+
+def render_tool_reply(name: str, result: Dict[str, Any]) -> str:
+    """Build a user-facing reply from a tool's structured result."""
+    if not isinstance(result, dict) or not result.get("success"):
+        error = result.get("error") if isinstance(result, dict) else None
+        return f"Sorry, I couldn't do that: {error or 'the task tool failed'}."
+
+    title = result.get("title")
+    task_id = result.get("task_id")
+    if name == "add_task":
+        return f"Task added: '{title}' (ID: {task_id})."
+    if name == "complete_task":
+        return f"Task {task_id} ('{title}') marked as complete."
+    if name == "delete_task":
+        return f"Task {task_id} ('{title}') has been deleted."
+    if name == "update_task":
+        return f"Task {task_id} ('{title}') has been updated."
+    if name == "list_tasks":
+        return render_task_list(result.get("tasks", []))
+    if name in _BATCH_VERBS:
+        return render_batch_reply(name, result.get("results", []))
+    return "I've processed your request."
+
+
+_BATCH_VERBS = {"add_tasks": "Added", "complete_tasks": "Completed", "delete_tasks": "Deleted"}
+
+
+def render_batch_reply(name: str, results: List[Dict[str, Any]]) -> str:
+    """Summarize the per-item results of a batch tool."""
+    done = [f"'{r.get('title')}' (ID: {r.get('task_id')})" for r in results if "error" not in r]
+    failed = [r for r in results if "error" in r]
+    parts = []
+    if done:
+        noun = "task" if len(done) == 1 else "tasks"
+        parts.append(f"{_BATCH_VERBS[name]} {len(done)} {noun}: {', '.join(done)}.")
+    for r in failed:
+        parts.append(f"Couldn't handle {r.get('title') or r.get('task_id') or 'an item'}: {r['error']}.")
+    return " ".join(parts) or "There was nothing to do."
+
+
+def render_task_list(tasks: List[Dict[str, Any]]) -> str:
+    """Format a list_tasks result the way the agent is instructed to."""
+    if not tasks:
+        return "You have no tasks."
+    lines = []
+    for task in tasks:
+        emoji = _PRIORITY_EMOJI.get(task.get("priority"), "")
+        status = "Completed" if task.get("completed") else "Pending"
+        prefix = f"{emoji} " if emoji else ""
+        lines.append(f"- {prefix}{task.get('title')} (ID: {task.get('id')}, Status: {status})")
+    return "Here are your tasks:\n" + "\n".join(lines)
@@ -0,0 +1,137 @@
+"""
+Phase III LLM Admission Control
+Limits how many chat turns talk to Gemini at once.
+
+Up to settings.LLM_MAX_IN_FLIGHT turns run concurrently. Further turns wait
+in a FIFO queue of at most settings.LLM_MAX_QUEUE entries for up to
+settings.LLM_QUEUE_TIMEOUT_SECONDS. When the queue is full, or the wait runs
+out, LLMOverloadedError is raised and the API answers 503 with Retry-After
+instead of piling more requests onto the upstream quota.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from database import settings
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LLMOverloadedError(Exception):
+    """Raised when a chat turn cannot be admitted to the LLM in time."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """In-flight limit with a bounded, deadline-aware wait queue."""
+
+    def __init__(self, max_in_flight: int, max_queue: int, queue_timeout: float, retry_after: int):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._in_flight = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> None:
+        """Take a slot, waiting in the queue if needed."""
+        started = time.monotonic()
+        with self._lock:
+            if self._in_flight < self.max_in_flight and not self._waiters:
+                self._in_flight += 1
+                metrics.observe("llm_gate.wait_seconds", 0.0)
+                return
+            if len(self._waiters) >= self.max_queue:
+                metrics.increment("llm_gate.rejected")
+                logger.warning(f"LLM queue full ({len(self._waiters)} waiting); rejecting chat turn.")
+                raise LLMOverloadedError("LLM queue is full", self.retry_after)
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                queued = waiter in self._waiters
+                if queued:
+                    self._waiters.remove(waiter)
+            if queued:
+                waiter.cancel()
+                metrics.increment("llm_gate.timed_out")
+                logger.warning(f"Chat turn waited {self.queue_timeout}s for an LLM slot; rejecting.")
+                raise LLMOverloadedError("Timed out waiting for the LLM", self.retry_after)
+            # The slot was handed over just as the deadline passed; keep it
+        except asyncio.CancelledError:
+            with self._lock:
+                queued = waiter in self._waiters
+                if queued:
+                    self._waiters.remove(waiter)
+            if not queued:
+                # The slot was already handed to us; give it back
+                self.release()
+            raise
+        metrics.observe("llm_gate.wait_seconds", time.monotonic() - started)
+
+    def try_acquire(self) -> bool:
+        """
+        Take a slot only if one is free and no turn is queued; never waits.
+        For background work, which must not take a place in the queue.
+        """
+        with self._lock:
+            if self._in_flight < self.max_in_flight and not self._waiters:
+                self._in_flight += 1
+                return True
+            return False
+
+    def release(self) -> None:
+        """Return a slot, handing it straight to the oldest waiter if any."""
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if not waiter.done():
+                    # The slot moves to the waiter; in_flight stays the same
+                    waiter.get_loop().call_soon_threadsafe(_resolve, waiter)
+                    return
+            self._in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold a slot for the duration of the block."""
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+
+def _resolve(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+llm_gate = AdmissionController(
+    max_in_flight=settings.LLM_MAX_IN_FLIGHT,
+    max_queue=settings.LLM_MAX_QUEUE,
+    queue_timeout=settings.LLM_QUEUE_TIMEOUT_SECONDS,
+    retry_after=settings.LLM_RETRY_AFTER_SECONDS,
+)
+
+metrics.register_gauge("llm_gate.in_flight", lambda: llm_gate.in_flight)
+metrics.register_gauge("llm_gate.queue_depth", lambda: llm_gate.queue_depth)
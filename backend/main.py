@@ -1,14 +1,17 @@
 from contextlib import asynccontextmanager
-from typing import List, Optional
-from datetime import datetime
+from typing import List, Optional, Union
+from datetime import datetime, timedelta, timezone
+import asyncio
 import json
 import os
 import sys
 
 
 
-from fastapi import FastAPI, Depends, HTTPException, status, Query
+from fastapi import BackgroundTasks, FastAPI, Depends, HTTPException, status, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from sqlmodel import Session
@@ -16,25 +19,36 @@ from jose import jwt, JWTError
 from datetime import datetime
 from typing import Optional
 
-from database import get_db, create_db_and_tables, settings
+from database import engine, get_request_db, create_db_and_tables, settings
 from models import (
     Conversation,
     Message,
     ChatRequest,
     ChatResponse,
     ConversationResponse,
+    MessagePage,
     MessageResponse,
-    TaskToolInput
+    TaskToolInput,
+    UsageSummaryResponse,
+    decode_tool_json
 )
 
 from schemas import (
     Task,
     TaskCreate,
+    TaskPage,
     TaskUpdate
 )
 
 # Import the new AI-powered ChatHandler
 from chat_handler import ChatHandler
+from agent import gemini_breaker, get_model_name, is_agent_ready, warm_up_agent
+from llm_gate import LLMOverloadedError
+from metrics import metrics
+from summarizer import maybe_summarize_conversation
+from usage_ledger import usage_ledger
+from sqlite_writer import sqlite_writer
+from mcp_client import remote_tools
 
 from auth import (
     get_current_user_from_token,
@@ -42,7 +56,22 @@ from auth import (
     get_password_hash,
     create_access_token
 )
-from crud import get_conversation, delete_conversation, update_conversation_title
+from crud import (
+    get_conversation,
+    get_conversation_messages,
+    get_user_conversations,
+    delete_conversation,
+    update_conversation_title,
+    get_tasks,
+    get_tasks_page,
+    get_messages_page,
+    create_task,
+    update_task,
+    toggle_task_completion,
+    delete_task,
+    get_usage_summary,
+)
+from crud_async import run_crud
 
 # Import Phase III simplified auth router (works without Phase II dependency)
 from auth_router_simple import router as auth_router
@@ -62,11 +91,23 @@ CORS_ORIGINS = [
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan handler - runs on startup and shutdown."""
-    # Startup: Create database tables
+    # Startup: Apply pending schema migrations
     create_db_and_tables()
+    # Resolve and build the Gemini model in the background; /ready reports
+    # false until this finishes
+    warm_up_task = asyncio.create_task(warm_up_agent())
+    # Batch-write LLM usage rows in the background
+    usage_ledger.start()
+    # Group-commit writes on SQLite through a single writer thread
+    if sqlite_writer.enabled:
+        sqlite_writer.start()
     yield
     # Shutdown: Cleanup if needed
-    pass
+    warm_up_task.cancel()
+    await usage_ledger.stop()
+    await asyncio.to_thread(sqlite_writer.stop)
+    if remote_tools is not None:
+        await remote_tools.aclose()
 
 
 app = FastAPI(
@@ -150,13 +191,30 @@ async def root():
 @app.get("/api/health")
 async def api_health_check():
     """Health check endpoint."""
-    return {"status": "healthy"}
+    return {"status": "healthy", "llm_circuit": gemini_breaker.snapshot()}
 
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint (alternative path)."""
-    return {"status": "healthy"}
+    return {"status": "healthy", "llm_circuit": gemini_breaker.snapshot()}
+
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 503 until the AI agent has finished warming up."""
+    if not is_agent_ready():
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"ready": False}
+        )
+    return {"ready": True, "model": get_model_name()}
+
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """In-process counters, timings and gauges (e.g. fast-path hit rate)."""
+    return metrics.snapshot()
 
 
 # Chat endpoints
@@ -165,8 +223,8 @@ async def health_check():
 async def chat(
     user_id: int,  # Path parameter as per Phase 3 spec
     request: ChatRequest,
-    auth_user_id: int = Depends(get_current_user_id),  # Verified from JWT
-    db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks,
+    auth_user_id: int = Depends(get_current_user_id)  # Verified from JWT
 ):
     """
     Main chat endpoint for AI-powered task management.
@@ -183,7 +241,9 @@ async def chat(
     Args:
         user_id: User ID from URL path (must match auth_user_id)
         request: Chat request with message and optional conversation_id
-        db: Database session
+
+    No request-scoped session: ChatHandler opens a short one per DB phase,
+    so no pooled connection is held while the model runs.
 
     Returns:
         ChatResponse with AI response, conversation_id, and message_id
@@ -205,7 +265,7 @@ async def chat(
             detail="Message cannot be empty"
         )
 
-    handler = ChatHandler(db, user_id)
+    handler = ChatHandler(None, user_id)
 
     try:
         response_content, conversation_id, message_id = await handler.process_message(
@@ -214,14 +274,19 @@ async def chat(
         )
 
         # Parse tool info from message for response
-        message = db.get(Message, message_id)
+        with Session(engine) as db:
+            message = db.get(Message, message_id)
         tool_calls = []
         if message and message.tool_calls:
             try:
-                tool_calls = json.loads(message.tool_calls)
+                tool_calls = decode_tool_json(message.tool_calls)
             except (json.JSONDecodeError, TypeError):
                 tool_calls = []
 
+        if conversation_id > 0:
+            # Compact long conversations after the response is sent
+            background_tasks.add_task(maybe_summarize_conversation, conversation_id, user_id)
+
         return ChatResponse(
             response=response_content,
             conversation_id=conversation_id,
@@ -229,6 +294,12 @@ async def chat(
             tool_calls=tool_calls
         )
 
+    except LLMOverloadedError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"AI service is busy: {str(e)}. Please retry shortly.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -236,20 +307,101 @@ async def chat(
         )
 
 
+@app.post("/api/{user_id:int}/chat/stream")
+async def chat_stream(
+    user_id: int,
+    request: ChatRequest,
+    auth_user_id: int = Depends(get_current_user_id)
+):
+    """
+    Streaming chat endpoint (Server-Sent Events).
+
+    Same contract as POST /api/{user_id}/chat, but the reply is streamed as
+    it is generated. Events:
+        delta               - {"text": ...} partial response text
+        tool_call_started   - {"name": ..., "arguments": ...}
+        tool_call_finished  - {"name": ..., "result": ...}
+        done                - {"conversation_id": ..., "message_id": ..., "content": ...}
+        error               - same shape as done, with message_id -1
+
+    The final response is persisted before the done event is sent.
+    """
+    if user_id != auth_user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User ID mismatch: you can only access your own data"
+        )
+
+    if not request.message or not request.message.strip():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Message cannot be empty"
+        )
+
+    # The handler opens a short session per DB phase, none across the stream
+    handler = ChatHandler(None, user_id)
+    events = handler.process_message_stream(
+        message=request.message.strip(),
+        conversation_id=request.conversation_id
+    )
+    try:
+        # Admission happens before the first event, so overload is still a 503
+        first_event = await events.__anext__()
+    except LLMOverloadedError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"AI service is busy: {str(e)}. Please retry shortly.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+    finished_conversation = {}
+
+    async def event_stream():
+        try:
+            event = first_event
+            while True:
+                event_type = event.pop("event")
+                if event_type == "done":
+                    finished_conversation["id"] = event["conversation_id"]
+                yield f"event: {event_type}\ndata: {json.dumps(event)}\n\n"
+                try:
+                    event = await events.__anext__()
+                except StopAsyncIteration:
+                    break
+        finally:
+            await events.aclose()
+
+    async def summarize_after_stream():
+        if "id" in finished_conversation:
+            await maybe_summarize_conversation(finished_conversation["id"], user_id)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(summarize_after_stream)
+    )
+
+
 # User-specific task endpoints (path parameter version for frontend)
 
-@app.get("/api/{user_id:int}/tasks", response_model=List[Task])
+@app.get("/api/{user_id:int}/tasks", response_model=Union[List[Task], TaskPage])
 async def get_user_tasks(
     user_id: int,
     status: str = Query("all", pattern="^(all|pending|completed)$"),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, max_length=200),
     auth_user_id: int = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_request_db)
 ):
     """
     List tasks for a specific user.
     User must be authenticated and can only access their own tasks.
+
+    Without cursor, returns a plain list paged by skip/limit. With cursor
+    (empty for the first page), returns {"tasks", "next_cursor"}; pass
+    next_cursor back to get the following page, until it is null.
     """
     # Verify the path parameter user_id matches authenticated user
     if user_id != auth_user_id:
@@ -258,14 +410,22 @@ async def get_user_tasks(
             detail="User ID mismatch: you can only access your own data"
         )
 
-    from crud import get_tasks
     filter_completed = None
     if status == "pending":
         filter_completed = False
     elif status == "completed":
         filter_completed = True
 
-    tasks = get_tasks(db, user_id, skip=skip, limit=limit, filter_completed=filter_completed)
+    if cursor is not None:
+        try:
+            tasks, next_cursor = await run_crud(get_tasks_page, db, user_id, limit=limit, cursor=cursor,
+                                                filter_completed=filter_completed)
+        except ValueError as e:
+            # `status` is the query parameter here, not fastapi.status
+            raise HTTPException(status_code=400, detail=str(e))
+        return TaskPage(tasks=tasks, next_cursor=next_cursor)
+
+    tasks = await run_crud(get_tasks, db, user_id, skip=skip, limit=limit, filter_completed=filter_completed)
 
     return tasks
 
@@ -275,7 +435,7 @@ async def create_user_task(
     user_id: int,
     task_request: TaskCreate,
     auth_user_id: int = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_request_db)
 ):
     """
     Create a new task for a specific user.
@@ -300,8 +460,6 @@ async def create_user_task(
     if priority not in valid_priorities:
         priority = "medium"
 
-    from crud import create_task
-
     task_input = TaskToolInput(
         title=task_request.title,
         description=task_request.description if hasattr(task_request, 'description') else "",
@@ -309,7 +467,7 @@ async def create_user_task(
         priority=priority
     )
 
-    task = create_task(db, task_input, user_id)
+    task = await run_crud(create_task, db, task_input, user_id)
 
     return task
 
@@ -320,7 +478,7 @@ async def update_user_task(
     task_id: int,
     task_request: TaskUpdate,
     auth_user_id: int = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_request_db)
 ):
     """
     Update a task for a specific user.
@@ -333,23 +491,18 @@ async def update_user_task(
             detail="User ID mismatch: you can only access your own data"
         )
 
-    from crud import update_task, get_task
+    # Convert TaskUpdateRequest to TaskToolInput
+    update_data = task_request.model_dump(exclude_unset=True)
+    task_input = TaskToolInput(**update_data)
 
-    # Verify task exists and belongs to user
-    task = get_task(db, task_id, user_id)
+    # One ownership-checked UPDATE (None if the task doesn't exist or belongs to someone else)
+    task = await run_crud(update_task, db, task_id, task_input, user_id)
     if not task:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Task not found"
         )
 
-    # Convert TaskUpdateRequest to TaskToolInput
-    update_data = task_request.model_dump(exclude_unset=True)
-    task_input = TaskToolInput(**update_data)
-
-
-    task = update_task(db, task_id, task_input, user_id)
-
     return task
 
 
@@ -358,7 +511,7 @@ async def delete_user_task(
     user_id: int,
     task_id: int,
     auth_user_id: int = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_request_db)
 ):
     """
     Delete a task for a specific user.
@@ -371,18 +524,13 @@ async def delete_user_task(
             detail="User ID mismatch: you can only access your own data"
         )
 
-    from crud import delete_task, get_task
-
-    # Verify task exists and belongs to user
-    task = get_task(db, task_id, user_id)
-    if not task:
+    # One ownership-checked DELETE (False if the task doesn't exist or belongs to someone else)
+    if not await run_crud(delete_task, db, task_id, user_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Task not found"
         )
 
-    delete_task(db, task_id)
-
     return {"status": "deleted", "task_id": task_id}
 
 
@@ -391,7 +539,7 @@ async def toggle_user_task_complete(
     user_id: int,
     task_id: int,
     auth_user_id: int = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_request_db)
 ):
     """
     Toggle completion status of a task for a specific user.
@@ -404,28 +552,45 @@ async def toggle_user_task_complete(
             detail="User ID mismatch: you can only access your own data"
         )
 
-    from crud import get_task
-    from sqlmodel import select
-
-    # Verify task exists and belongs to user
-    task = get_task(db, task_id, user_id)
+    # Toggle completion (None if the task doesn't exist or belongs to someone else)
+    task = await run_crud(toggle_task_completion, db, task_id, user_id)
     if not task:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Task not found"
         )
 
-    # Toggle completion
-    task.completed = not task.completed
-    db.add(task)
-    db.commit()
-    db.refresh(task)
-
     return task
 
 
 
 
+# LLM usage
+
+@app.get("/api/{user_id:int}/usage", response_model=List[UsageSummaryResponse])
+async def get_llm_usage(
+    user_id: int,
+    days: int = Query(30, ge=1, le=365),
+    group_by: str = Query("day", pattern="^(day|conversation)$"),
+    limit: int = Query(100, ge=1, le=1000),
+    auth_user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_request_db)
+):
+    """
+    Aggregated model usage (calls, tokens, latency, errors) for the
+    authenticated user over the last `days` days, per day or per
+    conversation (heaviest first).
+    """
+    if user_id != auth_user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User ID mismatch: you can only access your own data"
+        )
+
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    return await run_crud(get_usage_summary, db, user_id, since, group_by, limit)
+
+
 # Frontend-compatible conversation endpoints (path parameter matching frontend expectations)
 
 @app.get("/api/{user_id:int}/conversations", response_model=List[ConversationResponse])
@@ -434,7 +599,7 @@ async def list_conversations_by_user(
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
     auth_user_id: int = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_request_db)
 ):
     """
     List all conversations for the authenticated user (path parameter version).
@@ -449,37 +614,43 @@ async def list_conversations_by_user(
             detail="User ID mismatch: you can only access your own data"
         )
 
-    handler = ChatHandler(db, auth_user_id)
-    conversations = handler.get_conversations(skip=skip, limit=limit)
+    conversations = await run_crud(get_user_conversations, db, auth_user_id, skip, limit)
 
-    result = []
-    for conv in conversations:
-        messages = handler.get_conversation_messages(conv.id)
-        result.append(ConversationResponse(
+    # Counts and previews are stored on the conversation: one query in total
+    return [
+        ConversationResponse(
             id=conv.id,
             user_id=conv.user_id,
             title=conv.title,
             created_at=conv.created_at,
             updated_at=conv.updated_at,
-            message_count=len(messages)
-        ))
-
-    return result
+            message_count=conv.message_count,
+            last_message_preview=conv.last_message_preview,
+            last_message_at=conv.last_message_at
+        )
+        for conv in conversations
+    ]
 
 
-@app.get("/api/{user_id:int}/conversations/{conversation_id}", response_model=List[MessageResponse])
+@app.get("/api/{user_id:int}/conversations/{conversation_id}", response_model=Union[List[MessageResponse], MessagePage])
 async def get_conversation_messages_by_user(
     user_id: int,
     conversation_id: int,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=500),
+    before: Optional[str] = Query(None, max_length=200),
+    after: Optional[str] = Query(None, max_length=200),
     auth_user_id: int = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_request_db)
 ):
     """
     Get all messages in a conversation (path parameter version).
     This endpoint matches frontend expectations: /api/{user_id}/conversations/{id}
 
+    Without before/after, returns a plain list paged by skip/limit. With
+    before (empty for the newest page) or after (empty for the oldest
+    page), returns a MessagePage paged by (created_at, id) cursors.
+
     The user_id path parameter must match the authenticated user.
     """
     # Verify the path parameter user_id matches authenticated user
@@ -488,31 +659,47 @@ async def get_conversation_messages_by_user(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="User ID mismatch: you can only access your own data"
         )
+    if before is not None and after is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Pass either before or after, not both"
+        )
 
-    handler = ChatHandler(db, auth_user_id)
-    conversation = get_conversation(db, conversation_id, auth_user_id)
+    conversation = await run_crud(get_conversation, db, conversation_id, auth_user_id)
     if not conversation:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Conversation not found"
         )
 
-    messages = handler.get_conversation_messages(conversation_id)
-    messages = messages[skip:skip + limit]
+    if before is not None or after is not None:
+        try:
+            messages, older_cursor, newer_cursor = await run_crud(
+                get_messages_page, db, conversation_id, auth_user_id, limit=limit, before=before, after=after
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        return MessagePage(
+            messages=[_message_response(msg) for msg in messages],
+            older_cursor=older_cursor,
+            newer_cursor=newer_cursor
+        )
+
+    messages = await run_crud(get_conversation_messages, db, conversation_id, auth_user_id, skip=skip, limit=limit)
+    return [_message_response(msg) for msg in messages]
 
-    return [
-        MessageResponse(
-            id=msg.id,
-            conversation_id=msg.conversation_id,
-            user_id=msg.user_id,
-            role=msg.role,
-            content=msg.content,
-            tool_calls=msg.tool_calls if msg.tool_calls else None,
-            tool_results=msg.tool_results if msg.tool_results else None,
-            created_at=msg.created_at
-        )
-        for msg in messages
-    ]
+
+def _message_response(msg: Message) -> MessageResponse:
+    return MessageResponse(
+        id=msg.id,
+        conversation_id=msg.conversation_id,
+        user_id=msg.user_id,
+        role=msg.role,
+        content=msg.content,
+        tool_calls=decode_tool_json(msg.tool_calls),
+        tool_results=decode_tool_json(msg.tool_results),
+        created_at=msg.created_at
+    )
 
 
 @app.delete("/api/{user_id:int}/conversations/{conversation_id}")
@@ -520,7 +707,7 @@ async def delete_conversation_by_user(
     user_id: int,
     conversation_id: int,
     auth_user_id: int = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_request_db)
 ):
     """
     Delete a conversation and all its messages (path parameter version).
@@ -532,7 +719,7 @@ async def delete_conversation_by_user(
             detail="User ID mismatch: you can only access your own data"
         )
 
-    success = delete_conversation(db, conversation_id, auth_user_id)
+    success = await run_crud(delete_conversation, db, conversation_id, auth_user_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
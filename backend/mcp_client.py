@@ -0,0 +1,107 @@
+"""
+Phase III Remote MCP Tool Client
+Calls the task tools on a separately deployed MCP server
+(python mcp_server.py --transport http) instead of in-process.
+
+Enabled by settings.MCP_SERVER_URL. Requests go over one pooled keep-alive
+HTTP client. The server runs in stateless mode, so each tool call is a
+single JSON-RPC POST with no initialize handshake. Every call carries a
+short-lived access token for the user it runs as.
+"""
+
+import asyncio
+import itertools
+import logging
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from auth import create_access_token
+from database import settings
+
+try:
+    from mcp.types import LATEST_PROTOCOL_VERSION, TextContent
+    MCP_AVAILABLE = True
+except ImportError:
+    MCP_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Lifetime of the per-call token sent to the tool service
+TOOL_TOKEN_TTL = timedelta(minutes=5)
+
+
+class RemoteToolError(Exception):
+    """Raised when the tool service cannot be reached or returns a JSON-RPC error."""
+
+
+class RemoteToolClient:
+    """Pooled client for an MCP server's streamable HTTP endpoint."""
+
+    def __init__(self, url: str, timeout: float = 10.0, max_connections: int = 50):
+        if not MCP_AVAILABLE:
+            raise RuntimeError("MCP_SERVER_URL requires the mcp package: pip install mcp")
+        self.url = url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ids = itertools.count(1)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # httpx clients are bound to the event loop they were created on
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+            self._loop = loop
+        return self._client
+
+    async def call_tool(self, name: str, arguments: Dict[str, Any], user_id: int) -> List["TextContent"]:
+        """Run a tool as user_id on the remote server and return its content."""
+        token = create_access_token({"sub": str(user_id)}, expires_delta=TOOL_TOKEN_TTL)
+        payload = {
+            "jsonrpc": "2.0",
+            "id": next(self._ids),
+            "method": "tools/call",
+            "params": {"name": name, "arguments": arguments},
+        }
+        try:
+            response = await self._get_client().post(
+                self.url,
+                json=payload,
+                headers={
+                    "Authorization": f"Bearer {token}",
+                    "Accept": "application/json, text/event-stream",
+                    "MCP-Protocol-Version": LATEST_PROTOCOL_VERSION,
+                },
+            )
+            response.raise_for_status()
+            body = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            raise RemoteToolError(f"Tool service request failed: {e}") from e
+
+        if "error" in body:
+            raise RemoteToolError(f"Tool service error: {body['error'].get('message')}")
+        return [TextContent.model_validate(item) for item in body["result"].get("content", [])]
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+remote_tools: Optional[RemoteToolClient] = (
+    RemoteToolClient(
+        settings.MCP_SERVER_URL,
+        timeout=settings.MCP_CLIENT_TIMEOUT_SECONDS,
+        max_connections=settings.MCP_CLIENT_MAX_CONNECTIONS,
+    )
+    if settings.MCP_SERVER_URL else None
+)
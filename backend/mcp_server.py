@@ -2,12 +2,19 @@
 Phase III MCP Server
 Official MCP (Model Context Protocol) SDK implementation.
 
-Exposes 5 task management tools for the AI agent:
-1. add_task(title: str, description: str = None)
+Exposes 8 task management tools for the AI agent:
+1. add_task(title: str, description: str = None, priority: str = "medium")
 2. list_tasks(status: str = "all")
 3. complete_task(tool_id: int)
 4. delete_task(task_id: int)
-5. update_task(task_id: int, title: str = None, description: str = None)
+5. update_task(task_id: int, title: str = None, description: str = None, priority: str = None)
+6. add_tasks(tasks: list of {title, description, priority})
+7. complete_tasks(task_ids: list of int)
+8. delete_tasks(task_ids: list of int)
+
+The batch tools (6-8) run as one statement and one commit, and report a
+result per item. Schemas and handlers live in tool_registry; this module
+only adapts them to the MCP protocol.
 
 Each tool is user-specific and only accesses tasks for the authenticated user.
 """
@@ -16,6 +23,9 @@ import asyncio
 import json
 import logging
 import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
 from typing import Any, Dict, List, Optional
 
 # MCP SDK imports
@@ -38,16 +48,9 @@ except ImportError:
         type: str
         text: str
 
-# Database and model imports
+# Database and tool registry imports
 from database import get_db
-from crud import (
-    create_task,
-    get_tasks,
-    update_task,
-    delete_task,
-    get_task
-)
-from models import TaskToolInput
+from tool_registry import TOOLS, run_tool
 
 logger = logging.getLogger(__name__)
 
@@ -56,23 +59,50 @@ logger = logging.getLogger(__name__)
 app = Server("todo-mcp-server")
 
 
-# Global context for user_id (set during request processing)
-# This is a simple approach; in production, use proper context passing
-_mcp_user_id: Optional[int] = None
+@dataclass
+class ToolContext:
+    """
+    Who a tool call runs for, and optionally the session to run it in.
+    Without a session, execute_tool opens (and closes) one for the call.
+    """
+    user_id: int
+    db: Any = None
+
+
+# Per-request tool context. A ContextVar is private to each asyncio task
+# (and copied into asyncio.to_thread workers), so concurrent requests never
+# see each other's user.
+_tool_context: ContextVar[Optional[ToolContext]] = ContextVar("mcp_tool_context", default=None)
+
+
+@contextmanager
+def tool_context(user_id: int, db=None):
+    """Run the MCP call_tool entry point as user_id for the duration of the block."""
+    token = _tool_context.set(ToolContext(user_id=user_id, db=db))
+    try:
+        yield
+    finally:
+        _tool_context.reset(token)
 
 
 def set_mcp_user_id(user_id: int):
-    """Set the current user ID for MCP tool calls."""
-    global _mcp_user_id
-    _mcp_user_id = user_id
+    """Set the user for MCP tool calls made from the current task/context."""
+    _tool_context.set(ToolContext(user_id=user_id))
 
 
 def get_mcp_user_id() -> Optional[int]:
-    """Get the current user ID for MCP tool calls."""
-    return _mcp_user_id
+    """Get the user for MCP tool calls made from the current task/context."""
+    context = _tool_context.get()
+    return context.user_id if context else None
+
+
+# MCP Tool definitions, built once from the shared registry
+MCP_TOOLS: List[Tool] = [
+    Tool(name=spec.name, description=spec.description, inputSchema=spec.input_schema)
+    for spec in TOOLS.values()
+]
 
 
-# MCP Tool Definitions
 @app.list_tools()
 async def list_tools() -> List[Tool]:
     """
@@ -81,91 +111,7 @@ async def list_tools() -> List[Tool]:
     Returns:
         List of Tool definitions with input schemas
     """
-    return [
-        Tool(
-            name="add_task",
-            description="Create a new task for the user. Use when the user wants to add a new todo item.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "title": {
-                        "type": "string",
-                        "description": "Task title (required, 1-255 characters)"
-                    },
-                    "description": {
-                        "type": "string",
-                        "description": "Task description (optional, max 1000 characters)"
-                    }
-                },
-                "required": ["title"]
-            }
-        ),
-        Tool(
-            name="list_tasks",
-            description="Retrieve tasks from the list. Use when user asks to see, show, or list tasks.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "status": {
-                        "type": "string",
-                        "enum": ["all", "pending", "completed"],
-                        "description": "Filter tasks by status (defaults to 'all')"
-                    }
-                },
-                "required": []
-            }
-        ),
-        Tool(
-            name="complete_task",
-            description="Mark a task as complete. Use when user indicates a task is done.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "task_id": {
-                        "type": "integer",
-                        "description": "The task ID to mark as completed"
-                    }
-                },
-                "required": ["task_id"]
-            }
-        ),
-        Tool(
-            name="delete_task",
-            description="Remove a task from the list. Use when user wants to delete/remove/cancel a task.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "task_id": {
-                        "type": "integer",
-                        "description": "The task ID to delete"
-                    }
-                },
-                "required": ["task_id"]
-            }
-        ),
-        Tool(
-            name="update_task",
-            description="Modify task title or description. Use when user wants to change/update/rename a task.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "task_id": {
-                        "type": "integer",
-                        "description": "The task ID to update"
-                    },
-                    "title": {
-                        "type": "string",
-                        "description": "New task title (optional)"
-                    },
-                    "description": {
-                        "type": "string",
-                        "description": "New task description (optional)"
-                    }
-                },
-                "required": ["task_id"]
-            }
-        )
-    ]
+    return MCP_TOOLS
 
 
 @app.call_tool()
@@ -180,250 +126,130 @@ async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
     Returns:
         List of TextContent responses
     """
-    # Get user_id from context
-    user_id = get_mcp_user_id()
-    if user_id is None:
-        return [TextContent(
-            type="text",
-            text=json.dumps({
-                "success": False,
-                "error": "Authentication required. Please provide a valid JWT token."
-            })
-        )]
-
-    # Create a new database session for this request
-    generator = get_db()
-    db = next(generator)
+    return await dispatch_tool(name, arguments, _tool_context.get())
+
+
+async def dispatch_tool(name: str, arguments: Dict[str, Any], context: Optional[ToolContext]) -> List[TextContent]:
+    """
+    Run a tool and wrap its result as MCP content. This is the only place
+    tool results are serialized for the MCP transport. The tool's blocking
+    database work runs in a worker thread, off the event loop.
+    """
+    result = await asyncio.to_thread(execute_tool, name, arguments, context)
+    return [TextContent(type="text", text=json.dumps(result))]
+
+
+def execute_tool(name: str, arguments: Dict[str, Any], context: Optional[ToolContext]) -> Dict[str, Any]:
+    """
+    Run a tool for the user in the given context and return its result dict.
+    In-process callers (the chat handler, the fast path) use this directly
+    and never serialize the result.
+    """
+    if context is None or context.user_id is None:
+        return {
+            "success": False,
+            "error": "Authentication required. Please provide a valid JWT token."
+        }
+
+    # Use the caller's session, or create a new one for this call
+    owns_session = context.db is None
+    db = next(get_db()) if owns_session else context.db
 
     try:
-        if name == "add_task":
-            return await handle_add_task(db, user_id, arguments)
-        elif name == "list_tasks":
-            return await handle_list_tasks(db, user_id, arguments)
-        elif name == "complete_task":
-            return await handle_complete_task(db, user_id, arguments)
-        elif name == "delete_task":
-            return await handle_delete_task(db, user_id, arguments)
-        elif name == "update_task":
-            return await handle_update_task(db, user_id, arguments)
-        else:
-            return [TextContent(
-                type="text",
-                text=json.dumps({
-                    "success": False,
-                    "error": f"Unknown tool: {name}"
-                })
-            )]
+        return run_tool(db, context.user_id, name, arguments)
     except Exception as e:
         logger.error(f"Tool call error: {e}")
-        return [TextContent(
-            type="text",
-            text=json.dumps({
-                "success": False,
-                "error": str(e)
-            })
-        )]
+        if not owns_session:
+            # Leave the caller's session usable
+            db.rollback()
+        return {"success": False, "error": str(e)}
     finally:
-        db.close()
-
-
-async def handle_add_task(db, user_id: int, args: Dict[str, Any]) -> List[TextContent]:
-    """Handle add_task tool call."""
-
-    title = args.get("title")
-    if not title:
-        return [TextContent(
-            type="text",
-            text=json.dumps({"success": False, "error": "Title is required"})
-        )]
-
-    if len(title) > 255:
-        return [TextContent(
-            type="text",
-            text=json.dumps({"success": False, "error": "Title must be 255 characters or less"})
-        )]
-
-    description = args.get("description")
-    if description and len(description) > 1000:
-        return [TextContent(
-            type="text",
-            text=json.dumps({"success": False, "error": "Description must be 1000 characters or less"})
-        )]
-
-    task_input = TaskToolInput(
-        title=title,
-        description=description,
-        completed=False
-    )
+        if owns_session:
+            db.close()
 
-    task = create_task(db, task_input, user_id)
-
-    return [TextContent(
-        type="text",
-        text=json.dumps({
-            "success": True,
-            "task_id": task.id,
-            "status": "created",
-            "title": task.title
-        })
-    )]
-
-
-async def handle_list_tasks(db, user_id: int, args: Dict[str, Any]) -> List[TextContent]:
-    """Handle list_tasks tool call."""
-    status_filter = args.get("status", "all")
-
-    if status_filter == "pending":
-        filter_completed = False
-    elif status_filter == "completed":
-        filter_completed = True
-    else:
-        filter_completed = None
-
-    tasks = get_tasks(db, user_id, skip=0, limit=100, filter_completed=filter_completed)
-
-    task_list = []
-    for task in tasks:
-        task_list.append({
-            "id": task.id,
-            "title": task.title,
-            "description": task.description,
-            "completed": task.completed
-        })
-
-    return [TextContent(
-        type="text",
-        text=json.dumps({
-            "success": True,
-            "tasks": task_list,
-            "count": len(task_list)
-        })
-    )]
-
-
-async def handle_complete_task(db, user_id: int, args: Dict[str, Any]) -> List[TextContent]:
-    """Handle complete_task tool call."""
-
-    task_id = args.get("task_id")
-    if task_id is None:
-        return [TextContent(
-            type="text",
-            text=json.dumps({"success": False, "error": "task_id is required"})
-        )]
-
-    existing_task = get_task(db, task_id, user_id)
-    if not existing_task:
-        return [TextContent(
-            type="text",
-            text=json.dumps({"success": False, "error": f"Task with ID {task_id} not found"})
-        )]
-
-    task_input = TaskToolInput(completed=True)
-    task = update_task(db, task_id, task_input, user_id)
-
-    return [TextContent(
-        type="text",
-        text=json.dumps({
-            "success": True,
-            "task_id": task.id,
-            "status": "completed",
-            "title": task.title
-        })
-    )]
-
-
-async def handle_delete_task(db, user_id: int, args: Dict[str, Any]) -> List[TextContent]:
-    """Handle delete_task tool call."""
-    task_id = args.get("task_id")
-    if task_id is None:
-        return [TextContent(
-            type="text",
-            text=json.dumps({"success": False, "error": "task_id is required"})
-        )]
-
-    existing_task = get_task(db, task_id, user_id)
-    if not existing_task:
-        return [TextContent(
-            type="text",
-            text=json.dumps({"success": False, "error": f"Task with ID {task_id} not found"})
-        )]
-
-    task_title = existing_task.title
-    success = delete_task(db, task_id, user_id)
-
-    if not success:
-        return [TextContent(
-            type="text",
-            text=json.dumps({"success": False, "error": f"Failed to delete task {task_id}"})
-        )]
-
-    return [TextContent(
-        type="text",
-        text=json.dumps({
-            "success": True,
-            "task_id": task_id,
-            "status": "deleted",
-            "title": task_title
-        })
-    )]
-
-
-async def handle_update_task(db, user_id: int, args: Dict[str, Any]) -> List[TextContent]:
-    """Handle update_task tool call."""
-
-    task_id = args.get("task_id")
-    if task_id is None:
-        return [TextContent(
-            type="text",
-            text=json.dumps({"success": False, "error": "task_id is required"})
-        )]
-
-    existing_task = get_task(db, task_id, user_id)
-    if not existing_task:
-        return [TextContent(
-            type="text",
-            text=json.dumps({"success": False, "error": f"Task with ID {task_id} not found"})
-        )]
-
-    title = args.get("title")
-    if title and len(title) > 255:
-        return [TextContent(
-            type="text",
-            text=json.dumps({"success": False, "error": "Title must be 255 characters or less"})
-        )]
-
-    description = args.get("description")
-    if description and len(description) > 1000:
-        return [TextContent(
-            type="text",
-            text=json.dumps({"success": False, "error": "Description must be 1000 characters or less"})
-        )]
-
-    task_input = TaskToolInput(
-        title=title,
-        description=description
-    )
 
-    task = update_task(db, task_id, task_input, user_id)
+class _AuthenticatedMCPEndpoint:
+    """
+    ASGI endpoint for the streamable HTTP transport. Each request must carry
+    a user's access token (Authorization: Bearer ...); its tool calls run
+    as that user.
+    """
 
-    return [TextContent(
-        type="text",
-        text=json.dumps({
-            "success": True,
-            "task_id": task.id,
-            "status": "updated",
-            "title": task.title
-        })
-    )]
+    def __init__(self, session_manager):
+        self.session_manager = session_manager
+
+    async def __call__(self, scope, receive, send):
+        from fastapi import HTTPException
+        from starlette.responses import JSONResponse
+        from auth import get_current_user_from_token
+
+        headers = dict(scope.get("headers") or [])
+        authorization = headers.get(b"authorization", b"").decode()
+        scheme, _, token = authorization.partition(" ")
+        try:
+            if scheme.lower() != "bearer" or not token:
+                raise HTTPException(status_code=401, detail="Missing bearer token")
+            user_id = get_current_user_from_token(token)
+        except HTTPException as e:
+            response = JSONResponse({"detail": e.detail}, status_code=e.status_code,
+                                    headers={"WWW-Authenticate": "Bearer"})
+            await response(scope, receive, send)
+            return
+
+        # The server task for this request is started from here, so it
+        # inherits this context
+        with tool_context(user_id):
+            await self.session_manager.handle_request(scope, receive, send)
+
+
+def create_http_app():
+    """
+    ASGI app serving the MCP server over streamable HTTP at /mcp.
 
+    Stateless with JSON responses: every POST is a self-contained JSON-RPC
+    call, so any replica can serve any request and the tool tier can be
+    scaled independently of the chat tier.
+    """
+    from contextlib import asynccontextmanager
+    from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse
+    from starlette.routing import Route
+
+    session_manager = StreamableHTTPSessionManager(app=app, stateless=True, json_response=True)
+
+    async def health(request):
+        return JSONResponse({"status": "healthy", "server": app.name})
+
+    @asynccontextmanager
+    async def lifespan(_):
+        async with session_manager.run():
+            yield
+
+    return Starlette(
+        routes=[
+            Route("/mcp", endpoint=_AuthenticatedMCPEndpoint(session_manager), methods=["GET", "POST", "DELETE"]),
+            Route("/health", endpoint=health),
+        ],
+        lifespan=lifespan,
+    )
 
-def run_mcp_server():
+
+def run_mcp_server(transport: str = "stdio", host: str = "0.0.0.0", port: int = 8001):
     """
-    Run the MCP server using stdio transport.
+    Run the MCP server.
     This is the entry point for the MCP server.
+
+    transport="stdio" serves a single client over stdin/stdout;
+    transport="http" serves create_http_app() with uvicorn.
     """
     logging.basicConfig(level=logging.INFO)
 
+    if transport == "http":
+        import uvicorn
+        uvicorn.run(create_http_app(), host=host, port=port)
+        return
+
     async def main():
         async with stdio_server() as (read_stream, write_stream):
             await app.run(
@@ -436,4 +262,11 @@ def run_mcp_server():
 
 
 if __name__ == "__main__":
-    run_mcp_server()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Todo MCP server")
+    parser.add_argument("--transport", choices=["stdio", "http"], default="stdio")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("MCP_PORT", "8001")))
+    args = parser.parse_args()
+    run_mcp_server(args.transport, args.host, args.port)
@@ -0,0 +1,62 @@
+"""
+Phase III In-Process Metrics
+Lightweight counters, timings and gauges exposed through GET /api/metrics.
+
+Values are per process and reset on restart; they are meant for quick
+operational visibility, not long-term storage.
+"""
+
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict
+
+
+class Metrics:
+    """Thread-safe registry of counters, timings and gauges."""
+
+    def __init__(self):
+        self._counters: Dict[str, float] = defaultdict(int)
+        self._timings: Dict[str, Dict[str, float]] = {}
+        self._gauges: Dict[str, Callable[[], Any]] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: float = 1) -> None:
+        """Add value to a counter."""
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, name: str, value: float) -> None:
+        """Record one observation (e.g. a duration in seconds)."""
+        with self._lock:
+            timing = self._timings.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+            timing["count"] += 1
+            timing["total"] += value
+            timing["max"] = max(timing["max"], value)
+
+    def register_gauge(self, name: str, func: Callable[[], Any]) -> None:
+        """Register a function whose value is read at snapshot time."""
+        with self._lock:
+            self._gauges[name] = func
+
+    def get(self, name: str) -> float:
+        """Current value of a counter."""
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return all current values."""
+        with self._lock:
+            counters = dict(self._counters)
+            timings = {
+                name: {**timing, "avg": timing["total"] / timing["count"] if timing["count"] else 0.0}
+                for name, timing in self._timings.items()
+            }
+            gauges = dict(self._gauges)
+        return {
+            "counters": counters,
+            "timings": timings,
+            "gauges": {name: func() for name, func in gauges.items()},
+        }
+
+
+metrics = Metrics()
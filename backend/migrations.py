@@ -0,0 +1,413 @@
+"""
+Phase III Schema Migrations
+Versioned, forward-only schema changes, replacing drop_all/create_all on startup.
+
+Applied versions are recorded in the schema_migrations table. Each
+migration runs once, in version order, inside its own transaction, unless
+it is marked non-transactional (online index builds: Postgres cannot run
+CREATE INDEX CONCURRENTLY in a transaction). Migrations are written to be
+idempotent, so a database created by an older release (tables present,
+no schema_migrations) is adopted without changes.
+
+Usage:
+    python migrations.py upgrade [--to VERSION]
+    python migrations.py current
+    python migrations.py history
+
+The API applies pending migrations at startup unless
+settings.DB_MIGRATE_ON_STARTUP is false; with several replicas, run
+`python migrations.py upgrade` as a release step instead.
+"""
+
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Sequence
+
+from sqlalchemy import (
+    Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table, Text, inspect, text
+)
+from sqlalchemy.engine import Connection, Engine
+
+from database import engine as default_engine
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key for the Postgres advisory lock held while migrating
+MIGRATION_LOCK_KEY = 72_410_318
+# How long a process waits for another's SQLite migration to finish
+MIGRATION_LOCK_TIMEOUT_MS = 600_000
+
+
+@dataclass(frozen=True)
+class Migration:
+    """One forward schema change."""
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+    transactional: bool = True
+
+
+def create_index_online(connection: Connection, name: str, table: str, columns: Sequence[str]) -> None:
+    """
+    Create an index without blocking writes to the table.
+
+    Postgres builds it CONCURRENTLY; a build that failed earlier leaves an
+    invalid index behind, which is dropped and rebuilt. SQLite has no
+    online builds and just creates it. Must run outside a transaction.
+    """
+    column_list = ", ".join(columns)
+    if connection.dialect.name == "postgresql":
+        invalid = connection.execute(text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ), {"name": name}).first()
+        if invalid:
+            logger.warning(f"Dropping invalid index {name} left by an interrupted build")
+            connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        connection.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({column_list})"))
+    else:
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({column_list})"))
+
+
+def drop_index_online(connection: Connection, name: str) -> None:
+    """Drop an index if it exists, without blocking writes on Postgres. Must run outside a transaction."""
+    concurrently = " CONCURRENTLY" if connection.dialect.name == "postgresql" else ""
+    connection.execute(text(f"DROP INDEX{concurrently} IF EXISTS {name}"))
+
+
+def add_column_if_missing(connection: Connection, table: str, column: str, ddl: str) -> None:
+    """ALTER TABLE ... ADD COLUMN unless the column exists (e.g. created by initial_schema)."""
+    existing = {col["name"] for col in inspect(connection).get_columns(table)}
+    if column not in existing:
+        connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def _initial_schema_tables() -> MetaData:
+    """
+    The tables as they were when migrations were introduced. Frozen here
+    rather than taken from the models, so later model changes never change
+    what this migration creates; those belong in new migrations.
+    """
+    metadata = MetaData()
+    Table(
+        "users", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("email", String(255), nullable=False),
+        Column("hashed_password", String(255), nullable=False),
+        Column("name", String(255), nullable=False),
+        Index("ix_users_id", "id"),
+        Index("ix_users_email", "email", unique=True),
+    )
+    Table(
+        "tasks", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+        Column("title", String(255), nullable=False),
+        Column("description", String(1000)),
+        Column("completed", Boolean, nullable=False),
+        Column("priority", String(50), nullable=False),
+        Column("starred", Boolean, nullable=False),
+        Column("tags", String(500)),
+        Column("due_date", DateTime),
+        Column("created_at", DateTime),
+        Column("updated_at", DateTime),
+        Index("ix_tasks_id", "id"),
+        Index("ix_tasks_user_id", "user_id"),
+    )
+    Table(
+        "conversations", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+        Column("title", String(255), nullable=False),
+        Column("created_at", DateTime(timezone=True)),
+        Column("updated_at", DateTime(timezone=True)),
+        Index("ix_conversations_id", "id"),
+        Index("ix_conversations_user_id", "user_id"),
+    )
+    Table(
+        "messages", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("conversation_id", Integer, ForeignKey("conversations.id"), nullable=False),
+        Column("user_id", Integer, nullable=False),
+        Column("role", String(20), nullable=False),
+        Column("content", Text),
+        Column("tool_calls", Text),
+        Column("tool_results", Text),
+        Column("created_at", DateTime(timezone=True)),
+        Index("ix_messages_id", "id"),
+        Index("ix_messages_conversation_id", "conversation_id"),
+        Index("ix_messages_user_id", "user_id"),
+    )
+    Table(
+        "conversation_summaries", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("conversation_id", Integer, ForeignKey("conversations.id"), nullable=False),
+        Column("user_id", Integer, nullable=False),
+        Column("content", Text),
+        Column("through_message_id", Integer, nullable=False),
+        Column("message_count", Integer, nullable=False),
+        Column("updated_at", DateTime(timezone=True)),
+        Index("ix_conversation_summaries_conversation_id", "conversation_id", unique=True),
+        Index("ix_conversation_summaries_user_id", "user_id"),
+    )
+    Table(
+        "llm_usage", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("user_id", Integer, nullable=False),
+        Column("conversation_id", Integer),
+        Column("call_type", String(20), nullable=False),
+        Column("model", String(100)),
+        Column("prompt_tokens", Integer, nullable=False),
+        Column("output_tokens", Integer, nullable=False),
+        Column("total_tokens", Integer, nullable=False),
+        Column("latency_ms", Float, nullable=False),
+        Column("tool_calls", Integer, nullable=False),
+        Column("error_class", String(100)),
+        Column("created_at", DateTime(timezone=True)),
+        Index("ix_llm_usage_user_id", "user_id"),
+        Index("ix_llm_usage_conversation_id", "conversation_id"),
+        Index("ix_llm_usage_created_at", "created_at"),
+    )
+    return metadata
+
+
+def _initial_schema(connection: Connection) -> None:
+    """Every table, created only where missing (existing databases are adopted as is)."""
+    _initial_schema_tables().create_all(bind=connection, checkfirst=True)
+
+
+def _hot_path_indexes(connection: Connection) -> None:
+    """Composite indexes for task listing, conversation history and the conversation list."""
+    create_index_online(connection, "ix_tasks_user_completed_id", "tasks", ["user_id", "completed", "id"])
+    create_index_online(connection, "ix_messages_conversation_created", "messages", ["conversation_id", "created_at"])
+    create_index_online(connection, "ix_conversations_user_updated", "conversations", ["user_id", "updated_at"])
+
+
+def _conversation_message_counters(connection: Connection) -> None:
+    """Conversation.message_count / last_message_*, backfilled from existing messages."""
+    add_column_if_missing(connection, "conversations", "message_count", "INTEGER NOT NULL DEFAULT 0")
+    add_column_if_missing(connection, "conversations", "last_message_preview", "VARCHAR(200)")
+    add_column_if_missing(connection, "conversations", "last_message_at", "TIMESTAMP WITH TIME ZONE")
+    connection.execute(text(
+        "UPDATE conversations SET "
+        "message_count = (SELECT COUNT(*) FROM messages m WHERE m.conversation_id = conversations.id), "
+        "last_message_at = (SELECT MAX(m.created_at) FROM messages m WHERE m.conversation_id = conversations.id)"
+    ))
+    _backfill_message_previews(connection)
+
+
+def _message_preview_v3(content: Optional[str]) -> Optional[str]:
+    """
+    Frozen copy of crud._message_preview as of migration 3 (whitespace
+    collapsed, cut to 200 characters with an ellipsis). Kept here so later
+    changes to the live helper never change what this migration writes.
+    """
+    text_ = " ".join((content or "").split())
+    if not text_:
+        return None
+    if len(text_) > 200:
+        text_ = text_[:199] + "…"
+    return text_
+
+
+def _backfill_message_previews(connection: Connection) -> None:
+    """
+    Conversation.last_message_preview from each conversation's newest
+    message with text, formatted as create_message formats new ones, in
+    one pass over the messages. Only changed rows are written.
+    """
+    current = dict(connection.execute(text("SELECT id, last_message_preview FROM conversations")).all())
+    previews = {}
+    rows = connection.execute(text(
+        "SELECT conversation_id, content FROM messages WHERE content <> '' ORDER BY conversation_id, id DESC"
+    ).execution_options(stream_results=True, yield_per=1000))
+    for conversation_id, content in rows:
+        if conversation_id not in previews:
+            preview = _message_preview_v3(content)
+            if preview:
+                previews[conversation_id] = preview
+    changed = [
+        {"id": conversation_id, "preview": preview}
+        for conversation_id, preview in previews.items()
+        if conversation_id in current and current[conversation_id] != preview
+    ]
+    if changed:
+        connection.execute(text("UPDATE conversations SET last_message_preview = :preview WHERE id = :id"), changed)
+
+
+def _task_keyset_index(connection: Connection) -> None:
+    """(user_id, id) for unfiltered keyset task pages; filtered ones use ix_tasks_user_completed_id."""
+    create_index_online(connection, "ix_tasks_user_id_id", "tasks", ["user_id", "id"])
+
+
+def _message_cursor_index(connection: Connection) -> None:
+    """
+    messages(conversation_id, created_at, id) for cursor-paged history; it
+    covers every query ix_messages_conversation_created served, so that one goes.
+    """
+    create_index_online(connection, "ix_messages_conversation_created_id", "messages",
+                        ["conversation_id", "created_at", "id"])
+    drop_index_online(connection, "ix_messages_conversation_created")
+
+
+# Append new migrations here; never edit or renumber one that has shipped
+MIGRATIONS: List[Migration] = [
+    Migration(1, "initial_schema", _initial_schema),
+    Migration(2, "hot_path_indexes", _hot_path_indexes, transactional=False),
+    Migration(3, "conversation_message_counters", _conversation_message_counters),
+    Migration(4, "task_keyset_index", _task_keyset_index, transactional=False),
+    Migration(5, "message_cursor_index", _message_cursor_index, transactional=False),
+]
+
+
+def _ensure_version_table(connection: Connection) -> None:
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "name VARCHAR(255) NOT NULL, "
+        "applied_at TIMESTAMP NOT NULL)"
+    ))
+
+
+def _applied_versions(connection: Connection) -> List[int]:
+    if not inspect(connection).has_table("schema_migrations"):
+        return []
+    return [row[0] for row in connection.execute(text("SELECT version FROM schema_migrations ORDER BY version"))]
+
+
+def _record(connection: Connection, migration: Migration) -> None:
+    connection.execute(
+        text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:version, :name, :applied_at)"),
+        {"version": migration.version, "name": migration.name, "applied_at": datetime.now(timezone.utc)}
+    )
+
+
+@contextmanager
+def _migration_lock(engine: Engine):
+    """
+    Serialize migration runs across processes with a Postgres advisory
+    lock. SQLite has none; _upgrade_sqlite takes the write lock instead.
+    """
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as lock_connection:
+        lock_connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        try:
+            yield
+        finally:
+            lock_connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+
+def current_version(engine: Engine = default_engine) -> int:
+    """Highest applied migration version (0 for an unmigrated database)."""
+    with engine.connect() as connection:
+        applied = _applied_versions(connection)
+    return applied[-1] if applied else 0
+
+
+def pending_migrations(engine: Engine = default_engine, target: Optional[int] = None) -> List[Migration]:
+    """Migrations not yet applied, up to target (default: all)."""
+    with engine.connect() as connection:
+        return _pending(_applied_versions(connection), target)
+
+
+def _pending(applied: Sequence[int], target: Optional[int]) -> List[Migration]:
+    return [
+        migration for migration in MIGRATIONS
+        if migration.version not in applied and (target is None or migration.version <= target)
+    ]
+
+
+def _upgrade_sqlite(engine: Engine, target: Optional[int]) -> List[int]:
+    """
+    SQLite has no advisory locks, so each migration runs in a BEGIN
+    IMMEDIATE transaction that takes the database's write lock before the
+    applied versions are re-read. A second process starting at the same
+    time waits for it and then sees the migration as applied. SQLite has no
+    online index builds either, so non-transactional migrations run in the
+    transaction too.
+    """
+    applied_now = []
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        busy_timeout = connection.exec_driver_sql("PRAGMA busy_timeout").scalar()
+        connection.exec_driver_sql(f"PRAGMA busy_timeout = {MIGRATION_LOCK_TIMEOUT_MS}")
+        try:
+            while True:
+                connection.exec_driver_sql("BEGIN IMMEDIATE")
+                try:
+                    _ensure_version_table(connection)
+                    pending = _pending(_applied_versions(connection), target)
+                    if pending:
+                        migration = pending[0]
+                        logger.info(f"Applying migration {migration.version}: {migration.name}")
+                        migration.upgrade(connection)
+                        _record(connection, migration)
+                except BaseException:
+                    connection.exec_driver_sql("ROLLBACK")
+                    raise
+                connection.exec_driver_sql("COMMIT")
+                if not pending:
+                    return applied_now
+                applied_now.append(migration.version)
+        finally:
+            connection.exec_driver_sql(f"PRAGMA busy_timeout = {int(busy_timeout)}")
+
+
+def upgrade(engine: Engine = default_engine, target: Optional[int] = None) -> List[int]:
+    """Apply pending migrations in order and return the versions applied."""
+    if engine.dialect.name == "sqlite":
+        applied_now = _upgrade_sqlite(engine, target)
+    else:
+        applied_now = []
+        with _migration_lock(engine):
+            with engine.begin() as connection:
+                _ensure_version_table(connection)
+            # Re-read under the lock: another process may have just migrated
+            for migration in pending_migrations(engine, target):
+                logger.info(f"Applying migration {migration.version}: {migration.name}")
+                if migration.transactional:
+                    with engine.begin() as connection:
+                        migration.upgrade(connection)
+                        _record(connection, migration)
+                else:
+                    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                        migration.upgrade(connection)
+                    with engine.begin() as connection:
+                        _record(connection, migration)
+                applied_now.append(migration.version)
+    if applied_now:
+        logger.info(f"Database schema now at version {applied_now[-1]}")
+    return applied_now
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Todo database schema migrations")
+    commands = parser.add_subparsers(dest="command", required=True)
+    upgrade_parser = commands.add_parser("upgrade", help="apply pending migrations")
+    upgrade_parser.add_argument("--to", type=int, default=None, help="stop after this version")
+    commands.add_parser("current", help="print the applied schema version")
+    commands.add_parser("history", help="list migrations and whether they are applied")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.command == "upgrade":
+        applied = upgrade(target=args.to)
+        print(f"Applied {applied}" if applied else "Already up to date")
+        print(f"Schema version: {current_version()}")
+    elif args.command == "current":
+        print(current_version())
+    else:
+        pending = {migration.version for migration in pending_migrations()}
+        for migration in MIGRATIONS:
+            state = "pending" if migration.version in pending else "applied"
+            print(f"{migration.version:>4}  {migration.name:<30} {state}")
+
+
+if __name__ == "__main__":
+    main()
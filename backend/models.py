@@ -7,12 +7,17 @@ These models are already defined in Phase 2 and registered in the database.
 Only import them when needed in individual modules (crud.py, main.py, etc).
 """
 
+import json
+
 from sqlmodel import SQLModel, Field, Relationship
 from typing import Optional, List
 from datetime import datetime
-from sqlalchemy import Column, DateTime, Text
+from sqlalchemy import Column, DateTime, Index, Text
 from sqlalchemy.sql import func
 
+# Length of Conversation.last_message_preview
+MESSAGE_PREVIEW_CHARS = 200
+
 
 class Conversation(SQLModel, table=True):
     """
@@ -20,12 +25,17 @@ class Conversation(SQLModel, table=True):
     Each conversation belongs to a user and contains multiple messages.
     """
     __tablename__ = "conversations"
+    __table_args__ = (Index("ix_conversations_user_updated", "user_id", "updated_at"),)
 
     id: Optional[int] = Field(default=None, primary_key=True, index=True)
     user_id: int = Field(index=True, foreign_key="users.id")
     title: str = Field(default="New Conversation", max_length=255)
     created_at: datetime = Field(default_factory=datetime.utcnow, sa_column=Column(DateTime(timezone=True), default=func.now()))
     updated_at: datetime = Field(default_factory=datetime.utcnow, sa_column=Column(DateTime(timezone=True), default=func.now(), onupdate=func.now()))
+    # Maintained by crud.create_message so listings need no message queries
+    message_count: int = Field(default=0)
+    last_message_preview: Optional[str] = Field(default=None, max_length=MESSAGE_PREVIEW_CHARS)
+    last_message_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime(timezone=True)))
 
 
 class Message(SQLModel, table=True):
@@ -35,6 +45,7 @@ class Message(SQLModel, table=True):
     Tool calls and results are stored as JSON strings.
     """
     __tablename__ = "messages"
+    __table_args__ = (Index("ix_messages_conversation_created_id", "conversation_id", "created_at", "id"),)
 
     id: Optional[int] = Field(default=None, primary_key=True, index=True)
     conversation_id: int = Field(index=True, foreign_key="conversations.id")
@@ -46,6 +57,65 @@ class Message(SQLModel, table=True):
     created_at: datetime = Field(default_factory=datetime.utcnow, sa_column=Column(DateTime(timezone=True), default=func.now()))
 
 
+
+def decode_tool_json(value: Optional[str]) -> Optional[List[dict]]:
+    """
+    Parse a Message.tool_calls / tool_results column.
+    Older rows were JSON-encoded twice (a JSON string holding the JSON
+    array); those are unwrapped as well. Raises ValueError if malformed.
+    """
+    if not value:
+        return None
+    decoded = json.loads(value)
+    if isinstance(decoded, str):
+        decoded = json.loads(decoded)
+    return decoded
+
+
+class ConversationSummary(SQLModel, table=True):
+    """
+    Rolling summary of the older part of a conversation (one per conversation).
+    Covers every message with id <= through_message_id; the agent sees this
+    summary followed by the messages after it.
+
+    Kept out of the messages table on purpose: a summary row there would be
+    counted in Conversation.message_count and the last-message preview,
+    returned by the messages endpoint and its cursor pages, and would need
+    filtering everywhere. through_message_id and message_count are the
+    range marker; each new summary replaces the row.
+    """
+    __tablename__ = "conversation_summaries"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    conversation_id: int = Field(index=True, unique=True, foreign_key="conversations.id")
+    user_id: int = Field(index=True)
+    content: str = Field(sa_column=Column(Text))
+    through_message_id: int  # Last message folded into the summary
+    message_count: int = Field(default=0)  # Messages covered so far
+    updated_at: datetime = Field(default_factory=datetime.utcnow, sa_column=Column(DateTime(timezone=True), default=func.now(), onupdate=func.now()))
+
+
+class LLMUsage(SQLModel, table=True):
+    """
+    One row per model call, for cost and latency accounting.
+    Written in batches by usage_ledger.UsageLedger.
+    """
+    __tablename__ = "llm_usage"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(index=True)
+    conversation_id: Optional[int] = Field(default=None, index=True)
+    call_type: str = Field(max_length=20)  # "chat", "stream", "summary"
+    model: Optional[str] = Field(default=None, max_length=100)
+    prompt_tokens: int = Field(default=0)
+    output_tokens: int = Field(default=0)
+    total_tokens: int = Field(default=0)
+    latency_ms: float = Field(default=0.0)
+    tool_calls: int = Field(default=0)
+    error_class: Optional[str] = Field(default=None, max_length=100)  # Exception class name, None on success
+    created_at: datetime = Field(default_factory=datetime.utcnow, sa_column=Column(DateTime(timezone=True), default=func.now(), index=True))
+
+
 # TaskToolInput schema for MCP tools
 class TaskToolInput(SQLModel):
     """Input schema for task operations from MCP."""
@@ -83,6 +153,8 @@ class ConversationResponse(SQLModel):
     created_at: Optional[datetime]
     updated_at: Optional[datetime]
     message_count: int = 0
+    last_message_preview: Optional[str] = None
+    last_message_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -101,3 +173,27 @@ class MessageResponse(SQLModel):
 
     class Config:
         from_attributes = True
+
+
+class MessagePage(SQLModel):
+    """
+    A page of messages, oldest first. Pass older_cursor as `before` to load
+    older messages and newer_cursor as `after` for newer ones; each is None
+    when there is nothing more in that direction.
+    """
+    messages: List[MessageResponse]
+    older_cursor: Optional[str] = None
+    newer_cursor: Optional[str] = None
+
+
+class UsageSummaryResponse(SQLModel):
+    """Schema for aggregated LLM usage (per day or per conversation)."""
+    day: Optional[str] = None
+    conversation_id: Optional[int] = None
+    calls: int
+    prompt_tokens: int
+    output_tokens: int
+    total_tokens: int
+    avg_latency_ms: float
+    max_latency_ms: float
+    errors: int
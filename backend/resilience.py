@@ -0,0 +1,171 @@
+"""
+Phase III Upstream Resilience
+Bounded retries with jittered backoff, per-attempt timeouts and a circuit
+breaker for calls to the Gemini API.
+
+While the breaker is open, calls fail immediately with CircuitOpenError
+instead of waiting on a degraded upstream, and the chat handler answers
+from the deterministic (regex) path.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable
+
+from google.api_core import exceptions as google_exceptions
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is short-circuited by an open breaker."""
+
+
+class CircuitBreaker:
+    """
+    Classic three-state breaker.
+
+    closed    - calls go through; consecutive failures are counted
+    open      - calls are rejected until reset_timeout has passed
+    half_open - one probe call is let through; success closes the
+                breaker, failure opens it again
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls would be rejected without trying the upstream."""
+        return self.state == self.OPEN
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+            # Half open: allow a single probe
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"Circuit '{self.name}' closed.")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(f"Circuit '{self.name}' opened after {self._failures} failure(s).")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def release_probe(self) -> None:
+        """Forget an unfinished half-open probe (e.g. the caller was cancelled)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def snapshot(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self._failures}
+
+
+_TRANSIENT_GOOGLE_ERRORS = (
+    google_exceptions.TooManyRequests,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.InternalServerError,
+    google_exceptions.BadGateway,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.GatewayTimeout,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.RetryError,
+)
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Errors worth retrying: timeouts, connection drops, 429 and 5xx."""
+    return isinstance(error, (asyncio.TimeoutError, ConnectionError) + _TRANSIENT_GOOGLE_ERRORS)
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Full-jitter exponential backoff for the given retry attempt (0-based)."""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+async def call_with_resilience(
+    make_call: Callable[[], Awaitable[Any]],
+    breaker: CircuitBreaker,
+    max_retries: int,
+    base_delay: float,
+    max_delay: float,
+    attempt_timeout: float,
+) -> Any:
+    """
+    Await make_call() with retries, backoff, a per-attempt timeout and the
+    breaker. make_call must start a fresh attempt each time it is called.
+
+    Raises CircuitOpenError without calling upstream if the breaker is open,
+    otherwise the last error once retries are exhausted.
+    """
+    if not breaker.allow_request():
+        raise CircuitOpenError(f"Circuit '{breaker.name}' is open")
+
+    attempt = 0
+    while True:
+        try:
+            result = await asyncio.wait_for(make_call(), timeout=attempt_timeout)
+        except asyncio.CancelledError:
+            breaker.release_probe()
+            raise
+        except Exception as e:
+            if not is_transient_error(e):
+                # The upstream answered; the request itself was the problem
+                breaker.record_success()
+                raise
+            if attempt >= max_retries:
+                breaker.record_failure()
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            logger.warning(f"Transient error from '{breaker.name}' ({type(e).__name__}: {e}); "
+                           f"retry {attempt + 1}/{max_retries} in {delay:.2f}s")
+            attempt += 1
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                breaker.release_probe()
+                raise
+            continue
+        breaker.record_success()
+        return result
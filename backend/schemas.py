@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 # Shared properties for a task
@@ -28,4 +28,10 @@ class Task(TaskBase):
     updated_at: Optional[datetime] = None
 
     # This is the correct Pydantic v2 setting
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+# A page of tasks from keyset (cursor) pagination
+# next_cursor is None on the last page
+class TaskPage(BaseModel):
+    tasks: List[Task]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,231 @@
+"""
+Phase III SQLite Write Queue
+Serializes writes on a file-backed SQLite database through one writer
+thread that group-commits them.
+
+SQLite allows a single writer at a time, and every commit waits for the
+disk. Writers that race each other mostly wait on the lock (or fail with
+"database is locked"). Instead, callers hand a write to the queue and
+wait for its result. The writer takes whatever is queued, up to
+settings.SQLITE_WRITE_BATCH_SIZE writes, and runs them in one
+BEGIN IMMEDIATE ... COMMIT. If any write in a batch fails, the batch is
+rolled back and replayed one write per transaction, so only the failing
+write reports an error. Readers keep using the regular pool and, in WAL
+mode, run alongside the writer.
+
+A write is a crud-style function taking a Session first. Its own
+db.commit() does not end the batch's transaction; the data is durable
+once the batch commits, which is when the caller gets the result. Cache
+updates that must not run before that (task list versions, cached
+history) are wrapped in after_commit().
+"""
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+from database import apply_sqlite_pragmas, engine as default_engine, is_sqlite_file, settings, sqlite_engine_options
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Callbacks deferred by after_commit() while the writer thread runs a write
+_batch_state = threading.local()
+
+
+def after_commit(func: Callable, *args) -> None:
+    """
+    Run func(*args) once the current write is durable: right away normally,
+    or after the group commit when called from a write on the writer
+    thread. Dropped if that write or its batch fails.
+    """
+    deferred = getattr(_batch_state, "deferred", None)
+    if deferred is None:
+        func(*args)
+    else:
+        deferred.append((func, args))
+
+
+@dataclass
+class _Write:
+    func: Callable
+    args: tuple
+    kwargs: dict
+    session_info: Optional[dict] = None
+    future: Future = field(default_factory=Future)
+    deferred: List[tuple] = field(default_factory=list)
+    result: Any = None
+    error: Optional[BaseException] = None
+
+
+class SQLiteWriteQueue:
+    """Single writer thread that group-commits queued writes."""
+
+    def __init__(self, url: str, enabled: bool, batch_size: int, batch_wait_seconds: float):
+        self.url = url
+        self.enabled = enabled and is_sqlite_file(url)
+        self.batch_size = max(1, batch_size)
+        self.batch_wait_seconds = batch_wait_seconds
+        self._queue: "queue.Queue[Optional[_Write]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._engine: Optional[Engine] = None
+        self._lock = threading.Lock()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _create_engine(self) -> Engine:
+        """
+        The writer's own single connection. pysqlite's implicit BEGIN is
+        turned off so the batch can start with BEGIN IMMEDIATE, taking the
+        write lock up front.
+        """
+        options = sqlite_engine_options()
+        options.update(pool_size=1, max_overflow=0)
+        writer_engine = create_engine(self.url, **options)
+
+        @event.listens_for(writer_engine, "connect")
+        def _connect(dbapi_connection, connection_record):
+            apply_sqlite_pragmas(dbapi_connection, connection_record)
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(writer_engine, "begin")
+        def _begin(connection):
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+        return writer_engine
+
+    def start(self) -> None:
+        """Start the writer thread (also done on the first write)."""
+        with self._lock:
+            if self._thread is None:
+                self._engine = self._engine or self._create_engine()
+                self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        """Commit what is queued and stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def submit(self, func: Callable, *args, session_info: Optional[dict] = None, **kwargs) -> Future:
+        """
+        Queue func(session, *args, **kwargs); the future resolves after its
+        batch commits. session_info seeds the write's Session.info, e.g. to
+        share the caller's crud.OWNED_CONVERSATIONS map.
+        """
+        self.start()
+        write = _Write(func, args, kwargs, session_info)
+        self._queue.put(write)
+        return write.future
+
+    def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Queue a write and wait for its result."""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("A queued write cannot queue another write")
+        return self.submit(func, *args, **kwargs).result()
+
+    async def run_async(self, func: Callable, *args, **kwargs) -> Any:
+        """Queue a write and await its result without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(func, *args, **kwargs))
+
+    def _next_batch(self, first: _Write) -> tuple:
+        """first plus whatever else is queued (up to batch_size); True if stop was requested."""
+        batch = [first]
+        deadline = time.monotonic() + self.batch_wait_seconds
+        while len(batch) < self.batch_size:
+            try:
+                remaining = deadline - time.monotonic()
+                write = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if write is None:
+                return batch, True
+            batch.append(write)
+        return batch, False
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            write = self._queue.get()
+            if write is None:
+                break
+            batch, stopping = self._next_batch(write)
+            self._commit(batch)
+
+    def _commit(self, batch: List[_Write]) -> None:
+        """Run a batch as one transaction, then resolve its futures."""
+        started = time.monotonic()
+        try:
+            self._execute(batch)
+        except Exception as e:
+            if len(batch) > 1:
+                # Replay one write per transaction to isolate the failure
+                metrics.increment("sqlite_writer.batch_retries")
+                for write in batch:
+                    self._commit([write])
+                return
+            batch[0].error, batch[0].deferred = e, []
+
+        metrics.increment("sqlite_writer.batches")
+        metrics.increment("sqlite_writer.writes", len(batch))
+        metrics.observe("sqlite_writer.batch_size", len(batch))
+        metrics.observe("sqlite_writer.commit_seconds", time.monotonic() - started)
+
+        for write in batch:
+            for func, args in write.deferred:
+                try:
+                    func(*args)
+                except Exception as e:
+                    logger.error(f"after_commit callback {func.__name__} failed: {e}", exc_info=True)
+            if write.error is not None:
+                write.future.set_exception(write.error)
+            else:
+                write.future.set_result(write.result)
+
+    def _execute(self, batch: List[_Write]) -> None:
+        """
+        All writes in one BEGIN IMMEDIATE ... COMMIT; raises if any fails.
+        Sessions join the transaction "rollback_only": a write's commit()
+        leaves it open, and expire_on_commit=False keeps its results readable.
+        """
+        with self._engine.connect() as connection:
+            with connection.begin() as transaction:
+                for write in batch:
+                    write.deferred = []
+                    _batch_state.deferred = write.deferred
+                    try:
+                        with Session(bind=connection, join_transaction_mode="rollback_only",
+                                     expire_on_commit=False, info=write.session_info) as session:
+                            write.result = write.func(session, *write.args, **write.kwargs)
+                    finally:
+                        _batch_state.deferred = None
+                    if not transaction.is_active:
+                        raise RuntimeError(f"{write.func.__name__} rolled back its transaction")
+
+    def accepts(self, db: Any) -> bool:
+        """True if writes for this session should be queued (a sync session on the main engine)."""
+        return self.enabled and isinstance(db, Session) and db.get_bind() is default_engine
+
+
+sqlite_writer = SQLiteWriteQueue(
+    url=settings.DATABASE_URL,
+    enabled=settings.SQLITE_WRITE_QUEUE,
+    batch_size=settings.SQLITE_WRITE_BATCH_SIZE,
+    batch_wait_seconds=settings.SQLITE_WRITE_BATCH_WAIT_MS / 1000,
+)
+
+metrics.register_gauge("sqlite_writer.queue_depth", lambda: sqlite_writer.queue_depth)
@@ -0,0 +1,158 @@
+"""
+Phase III Rolling Conversation Summaries
+Folds the older part of long conversations into one stored summary.
+
+Once a conversation has more than settings.SUMMARY_TRIGGER_MESSAGES messages
+after its current summary, everything except the newest
+settings.SUMMARY_KEEP_RECENT_MESSAGES is summarized together with the
+previous summary and saved as its ConversationSummary. History for the
+agent is then the summary plus the messages after it (see
+ChatHandler._get_agent_history).
+
+maybe_summarize_conversation runs as a background task after the chat
+response has been sent. It opens its own sessions and does not hold one
+while waiting on the model, and only calls the model when an LLM slot is
+free right away (see AdmissionController.try_acquire).
+"""
+
+import json
+import logging
+import threading
+from typing import List, Optional
+
+from sqlmodel import Session
+
+from agent import generate_text
+from crud import (
+    get_conversation_message_count,
+    get_conversation_messages,
+    get_conversation_summary,
+    save_conversation_summary,
+)
+from database import engine, settings
+from llm_gate import llm_gate
+from metrics import metrics
+from models import Message, decode_tool_json
+from sqlite_writer import sqlite_writer
+
+logger = logging.getLogger(__name__)
+
+# Longest tool result kept in the transcript given to the summarizer
+MAX_TOOL_RESULT_CHARS = 300
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and a todo list assistant.
+Update the summary with the new messages below. Keep facts that matter for later turns: tasks that were
+added, changed, completed or deleted (with their IDs), the user's preferences, and open questions.
+Write plain sentences, at most 200 words, and do not invent details.
+
+Current summary:
+{previous}
+
+New messages:
+{transcript}
+
+Updated summary:"""
+
+_in_progress = set()
+_in_progress_lock = threading.Lock()
+
+
+def _split_point(messages: List[Message], keep_recent: int) -> int:
+    """
+    Index of the first message to keep verbatim. The kept tail starts at a
+    user message, so a tool call is never separated from its results.
+    """
+    index = len(messages) - keep_recent
+    while index > 0 and messages[index].role != "user":
+        index -= 1
+    return max(index, 0)
+
+
+def _render_transcript(messages: List[Message]) -> str:
+    lines = []
+    for msg in messages:
+        if msg.role == "user":
+            lines.append(f"User: {msg.content}")
+        elif msg.role == "assistant":
+            if msg.content:
+                lines.append(f"Assistant: {msg.content}")
+            if msg.tool_calls:
+                lines.append(f"Assistant called tools: {msg.tool_calls}")
+        elif msg.role == "tool" and msg.tool_results:
+            try:
+                results = decode_tool_json(msg.tool_results)
+                for result in results:
+                    lines.append(f"Tool {result.get('name', result.get('id'))} returned: "
+                                 f"{str(result.get('result'))[:MAX_TOOL_RESULT_CHARS]}")
+            except (json.JSONDecodeError, TypeError, AttributeError):
+                lines.append(f"Tool results: {msg.tool_results[:MAX_TOOL_RESULT_CHARS]}")
+    return "\n".join(lines)
+
+
+async def maybe_summarize_conversation(conversation_id: int, user_id: int) -> bool:
+    """
+    Summarize the conversation if it has crossed the threshold.
+    Returns True if a new summary was saved. Never raises.
+    """
+    if settings.SUMMARY_TRIGGER_MESSAGES <= 0:
+        return False
+    with _in_progress_lock:
+        if conversation_id in _in_progress:
+            return False
+        _in_progress.add(conversation_id)
+    try:
+        return await _summarize(conversation_id, user_id)
+    except Exception as e:
+        logger.error(f"Summarizing conversation {conversation_id} failed: {e}", exc_info=True)
+        return False
+    finally:
+        with _in_progress_lock:
+            _in_progress.discard(conversation_id)
+
+
+async def _summarize(conversation_id: int, user_id: int) -> bool:
+    with Session(engine) as db:
+        summary = get_conversation_summary(db, conversation_id)
+        # Compare the stored counters first; messages are only loaded once
+        # the unsummarized ones cross the threshold
+        message_count = get_conversation_message_count(db, conversation_id) or 0
+        if message_count - (summary.message_count if summary else 0) <= settings.SUMMARY_TRIGGER_MESSAGES:
+            return False
+        messages = get_conversation_messages(
+            db, conversation_id, user_id, limit=None,
+            after_id=summary.through_message_id if summary else None
+        )
+        if len(messages) <= settings.SUMMARY_TRIGGER_MESSAGES:
+            return False
+        older = messages[:_split_point(messages, settings.SUMMARY_KEEP_RECENT_MESSAGES)]
+        if not older:
+            return False
+        previous = summary.content if summary else None
+        covered = (summary.message_count if summary else 0) + len(older)
+        prompt = SUMMARY_PROMPT.format(previous=previous or "(none yet)", transcript=_render_transcript(older))
+        through_message_id = older[-1].id
+
+    # Background work never queues ahead of chat turns: with no free slot
+    # it is skipped, and the next turn tries again
+    if not llm_gate.try_acquire():
+        metrics.increment("summaries.deferred")
+        return False
+    try:
+        content: Optional[str] = await generate_text(prompt, user_id, conversation_id)
+    finally:
+        llm_gate.release()
+    if not content:
+        metrics.increment("summaries.failed")
+        return False
+
+    if sqlite_writer.enabled:
+        await sqlite_writer.run_async(
+            save_conversation_summary, conversation_id, user_id, content, through_message_id, covered
+        )
+    else:
+        with Session(engine) as db:
+            save_conversation_summary(db, conversation_id, user_id, content, through_message_id, covered)
+    metrics.increment("summaries.saved")
+    logger.info(f"Summarized {len(older)} message(s) of conversation {conversation_id} "
+                f"({covered} covered in total).")
+    return True
@@ -0,0 +1,89 @@
+"""
+Phase III Task List Cache
+Read-through cache for crud.get_tasks and crud.get_tasks_page, shared by the
+REST and MCP paths.
+
+Entries are keyed by (user_id, task version, filter, page, limit), where page
+is the offset, or ("after", id) for keyset pages. Every task write bumps the
+user's version (see bump_task_version), which makes all older entries for
+that user unreachable; they then age out through the LRU bound and TTL.
+Versions are per process.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from database import settings, Task
+from metrics import metrics
+
+
+class TaskListCache:
+    """LRU + TTL cache of task lists with per-user version invalidation."""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._versions: Dict[int, int] = {}
+        self._entries: "OrderedDict[Tuple, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def version(self, user_id: int) -> int:
+        """Current task version for a user."""
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    def bump(self, user_id: int) -> int:
+        """Invalidate a user's cached task lists. Returns the new version."""
+        with self._lock:
+            version = self._versions.get(user_id, 0) + 1
+            self._versions[user_id] = version
+            return version
+
+    def get(self, user_id: int, filter_completed: Optional[bool], page: Hashable, limit: int) -> Optional[List[Task]]:
+        """Return fresh copies of a cached task list, or None on a miss."""
+        with self._lock:
+            key = (user_id, self._versions.get(user_id, 0), filter_completed, page, limit)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                metrics.increment("task_cache.misses")
+                return None
+            self._entries.move_to_end(key)
+        metrics.increment("task_cache.hits")
+        return [Task(**row) for row in entry[1]]
+
+    def put(self, user_id: int, version: int, filter_completed: Optional[bool], page: Hashable, limit: int,
+            tasks: List[Task]) -> List[Task]:
+        """
+        Cache a task list read at the given version and return detached copies.
+
+        Cached rows are plain dicts, so they never tie the cache to the
+        session that loaded them.
+        """
+        rows = [task.model_dump() for task in tasks]
+        with self._lock:
+            # A write since the read makes this entry unreachable; don't store it
+            if version == self._versions.get(user_id, 0):
+                key = (user_id, version, filter_completed, page, limit)
+                self._entries[key] = (time.monotonic() + self.ttl_seconds, rows)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return [Task(**row) for row in rows]
+
+    def clear(self) -> None:
+        """Drop all cached entries."""
+        with self._lock:
+            self._entries.clear()
+
+
+task_cache = TaskListCache(settings.TASK_CACHE_SIZE, settings.TASK_CACHE_TTL_SECONDS)
+
+
+def bump_task_version(user_id: int) -> int:
+    """Call after any committed write to a user's tasks."""
+    return task_cache.bump(user_id)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Load test: database pool usage while chat turns wait on the model.
+
+Runs batches of concurrent agent-path chat turns against a stand-in model
+that takes MODEL_SECONDS per call, and records the peak number of pooled
+connections checked out during each batch. Every turn runs in short DB
+phases, so the peak must stay flat as concurrency rises instead of
+growing with the number of turns waiting on the model. Connections of the
+SQLite write queue, which carries the turns' writes, are counted too.
+
+Uses a throwaway, migrated SQLite database (see testing_db.py).
+"""
+import asyncio
+import threading
+
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+import chat_handler
+from chat_handler import ChatHandler
+from database import Task
+from llm_gate import llm_gate
+from models import Conversation
+from testing_db import throwaway_database
+
+CONCURRENCY_LEVELS = (5, 25, 100)
+MODEL_SECONDS = 0.2
+# Connections a phase may use at once across both engines: the phase
+# session, a tool call's own session and the write queue's connection
+MAX_PEAK_CONNECTIONS = 3
+FIRST_USER_ID = 1
+
+
+class PoolPeak:
+    """Tracks the most connections checked out of the watched pools at once."""
+
+    def __init__(self):
+        self.checked_out = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def watch(self, engine):
+        event.listen(engine, "checkout", self.on_checkout)
+        event.listen(engine, "checkin", self.on_checkin)
+
+    def on_checkout(self, *args):
+        with self._lock:
+            self.checked_out += 1
+            self.peak = max(self.peak, self.checked_out)
+
+    def on_checkin(self, *args):
+        with self._lock:
+            self.checked_out -= 1
+
+    def reset(self):
+        with self._lock:
+            self.peak = self.checked_out
+
+
+async def slow_model(user_id, user_input, history=None, preformatted=False, conversation_id=None):
+    """Stands in for Gemini: a slow call that sometimes asks for a tool."""
+    await asyncio.sleep(MODEL_SECONDS)
+    if user_id % 2:
+        return {"content": "", "tool_calls": [{"name": "add_task", "arguments": {"title": f"load-{user_id}"}}]}
+    return {"content": "Sure.", "tool_calls": [], "error": None}
+
+
+async def chat_batch(first_user_id: int, concurrency: int):
+    async def one_turn(user_id: int):
+        # Not a fast-path command, so every turn waits on the model
+        return await ChatHandler(None, user_id).process_message("could you help me plan my week")
+    return await asyncio.gather(*(one_turn(first_user_id + i) for i in range(concurrency)))
+
+
+def test_pool_usage_flat_as_chat_concurrency_rises():
+    user_ids = range(FIRST_USER_ID, FIRST_USER_ID + sum(CONCURRENCY_LEVELS))
+    with throwaway_database(user_ids) as (engine, writer):
+        # Writes go through the queue's own engine; count its connection too
+        writer.start()
+        pool = PoolPeak()
+        pool.watch(engine)
+        pool.watch(writer._engine)
+        original_model, original_limit = chat_handler.run_agent, llm_gate.max_in_flight
+        chat_handler.run_agent = slow_model
+        llm_gate.max_in_flight = max(CONCURRENCY_LEVELS)
+        try:
+            peaks = {}
+            first_user_id = FIRST_USER_ID
+            for concurrency in CONCURRENCY_LEVELS:
+                pool.reset()
+                replies = asyncio.run(chat_batch(first_user_id, concurrency))
+                assert all(message_id > 0 for _, _, message_id in replies), replies
+                peaks[concurrency] = pool.peak
+                first_user_id += concurrency
+        finally:
+            chat_handler.run_agent, llm_gate.max_in_flight = original_model, original_limit
+
+        with Session(engine) as db:
+            assert len(db.exec(select(Conversation)).all()) == sum(CONCURRENCY_LEVELS)
+            # Odd user IDs asked for add_task (see slow_model)
+            assert len(db.exec(select(Task)).all()) == sum(1 for user_id in user_ids if user_id % 2)
+
+    print(f"Peak pooled connections by concurrent chat turns: {peaks}")
+    assert max(peaks.values()) <= MAX_PEAK_CONNECTIONS, peaks
+
+
+if __name__ == "__main__":
+    test_pool_usage_flat_as_chat_concurrency_rises()
+    print("✅ Pool usage stays flat while chat turns wait on the model")
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Tests for the conversation history cache (history_cache.py).
+
+Checks that a load racing with a message committed by another turn (after
+the load's SELECT, before load() stores the list) is not cached without
+that message, while an undisturbed load is cached; and that entries are
+dropped when the stored message count shows another process wrote to the
+conversation, or when they expire.
+"""
+import time
+
+from history_cache import HistoryCache
+from models import Message
+
+CONVERSATION_ID = 1
+
+
+def message(message_id: int, content: str) -> Message:
+    return Message(id=message_id, conversation_id=CONVERSATION_ID, user_id=1, role="user", content=content)
+
+
+def test_load_racing_an_append_is_not_cached():
+    cache = HistoryCache()
+    token = cache.begin_load(CONVERSATION_ID)
+    selected = [message(1, "first")]
+    # Another turn commits a message after the SELECT; its append finds no entry
+    cache.append(message(2, "second"))
+    history = cache.load(CONVERSATION_ID, selected, token=token)
+
+    assert [entry["parts"][0]["text"] for entry in history] == ["first"]
+    assert cache.get(CONVERSATION_ID) is None
+    assert cache.end_load(CONVERSATION_ID, token) is True
+    assert cache._loads == {}
+
+
+def test_undisturbed_load_is_cached_and_appended_to():
+    cache = HistoryCache()
+    token = cache.begin_load(CONVERSATION_ID)
+    cache.load(CONVERSATION_ID, [message(1, "first")], token=token)
+    cache.end_load(CONVERSATION_ID, token)
+    cache.append(message(2, "second"))
+
+    assert [entry["parts"][0]["text"] for entry in cache.get(CONVERSATION_ID)] == ["first", "second"]
+    assert cache._loads == {}
+
+
+def test_entry_missing_another_process_message_is_dropped():
+    cache = HistoryCache()
+    cache.load(CONVERSATION_ID, [message(1, "first")], message_count=1)
+    cache.append(message(2, "second"))
+
+    assert len(cache.get(CONVERSATION_ID, message_count=2)) == 2
+    # Another worker committed a third message this process never appended
+    assert cache.get(CONVERSATION_ID, message_count=3) is None
+    assert cache.get(CONVERSATION_ID) is None
+
+
+def test_expired_entry_is_a_miss():
+    cache = HistoryCache(ttl_seconds=0.01)
+    cache.load(CONVERSATION_ID, [message(1, "first")], message_count=1)
+    time.sleep(0.02)
+
+    assert cache.get(CONVERSATION_ID, message_count=1) is None
+
+
+if __name__ == "__main__":
+    test_load_racing_an_append_is_not_cached()
+    test_undisturbed_load_is_cached_and_appended_to()
+    test_entry_missing_another_process_message_is_dropped()
+    test_expired_entry_is_a_miss()
+    print("✅ History loads that race a new message are not cached; stale and expired entries are dropped")
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Tests for the fast-path intent router (intent_router.py).
+
+Checks the tool call each command in the grammar maps to, that priority
+updates are not read as renames, and that route() only returns matches at
+or above settings.FAST_PATH_CONFIDENCE (and nothing when the fast path is
+off).
+"""
+from database import settings
+from intent_router import match_intent, route
+
+GRAMMAR = [
+    ("add task buy milk", "add_task", {"title": "buy milk"}),
+    ("Please create a new task: call mom.", "add_task", {"title": "call mom"}),
+    ("add a high priority task pay rent", "add_task", {"title": "pay rent", "priority": "high"}),
+    ("list pending tasks", "list_tasks", {"status": "pending"}),
+    ("show me all my tasks", "list_tasks", {"status": "all"}),
+    ("show open tasks", "list_tasks", {"status": "pending"}),
+    ("completed tasks", "list_tasks", {"status": "completed"}),
+    ("complete task 3", "complete_task", {"task_id": 3}),
+    ("mark task #7 as done", "complete_task", {"task_id": 7}),
+    ("delete task 4", "delete_task", {"task_id": 4}),
+    ("rename task 2 to Buy oat milk", "update_task", {"task_id": 2, "title": "Buy oat milk"}),
+    ("update task 2 title to groceries", "update_task", {"task_id": 2, "title": "groceries"}),
+    ("set priority of task 5 to high", "update_task", {"task_id": 5, "priority": "high"}),
+    ("make task 6 low priority", "update_task", {"task_id": 6, "priority": "low"}),
+    ("update task 2 to high", "update_task", {"task_id": 2, "priority": "high"}),
+    ("change task 8 priority to medium", "update_task", {"task_id": 8, "priority": "medium"}),
+]
+
+
+def test_grammar():
+    for message, name, arguments in GRAMMAR:
+        intent = match_intent(message)
+        assert intent is not None, message
+        assert (intent["name"], intent["arguments"]) == (name, arguments), (message, intent)
+    assert match_intent("what should I do first today?") is None
+
+
+def test_route_applies_the_confidence_threshold():
+    original = settings.FAST_PATH_ENABLED, settings.FAST_PATH_CONFIDENCE
+    try:
+        settings.FAST_PATH_ENABLED, settings.FAST_PATH_CONFIDENCE = True, 0.9
+        assert route("delete task 4")["name"] == "delete_task"
+        # A bare "add ..." may be several tasks (0.6): left to the LLM
+        assert match_intent("add milk, eggs and bread")["confidence"] < 0.9
+        assert route("add milk, eggs and bread") is None
+
+        settings.FAST_PATH_CONFIDENCE = 0.5
+        assert route("add milk, eggs and bread")["name"] == "add_task"
+
+        settings.FAST_PATH_ENABLED = False
+        assert route("delete task 4") is None
+    finally:
+        settings.FAST_PATH_ENABLED, settings.FAST_PATH_CONFIDENCE = original
+
+
+if __name__ == "__main__":
+    test_grammar()
+    test_route_applies_the_confidence_threshold()
+    print("✅ Intent grammar routes commands to the right tools above the confidence threshold")
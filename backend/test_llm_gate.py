@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Tests for LLM admission control (llm_gate.py).
+
+Checks that background work (try_acquire) only takes a slot that is free
+right away: it never waits, and never takes a slot a queued chat turn is
+waiting for.
+"""
+import asyncio
+
+from llm_gate import AdmissionController
+
+
+async def background_never_queues_ahead_of_chat_turns():
+    gate = AdmissionController(max_in_flight=1, max_queue=10, queue_timeout=5, retry_after=1)
+    assert gate.try_acquire()
+    assert not gate.try_acquire()
+    assert gate.queue_depth == 0
+
+    chat_turn = asyncio.create_task(gate.acquire())
+    await asyncio.sleep(0)
+    assert gate.queue_depth == 1
+    gate.release()
+    # The freed slot went to the waiting turn, not to background work
+    assert not gate.try_acquire()
+    await chat_turn
+    assert gate.in_flight == 1
+
+    gate.release()
+    assert gate.try_acquire()
+    gate.release()
+    assert gate.in_flight == 0
+
+
+def test_background_never_queues_ahead_of_chat_turns():
+    asyncio.run(background_never_queues_ahead_of_chat_turns())
+
+
+if __name__ == "__main__":
+    test_background_never_queues_ahead_of_chat_turns()
+    print("✅ Background LLM work never takes a chat turn's place")
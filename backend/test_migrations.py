@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Tests for the schema migrations (migrations.py).
+
+- a fresh database migrated to the latest version has the columns and
+  indexes the models declare
+- several processes upgrading the same SQLite file at once apply every
+  migration exactly once
+- conversation previews backfilled by migrations match the ones
+  create_message writes
+
+Uses throwaway SQLite files.
+"""
+import os
+import tempfile
+import threading
+
+from sqlalchemy import create_engine, inspect, text
+from sqlmodel import SQLModel
+
+import crud
+import migrations
+import models  # registers the Phase III tables
+
+UPGRADERS = 4
+
+
+def schema_shape(engine):
+    """Table -> (column names, index names and columns), ignoring schema_migrations."""
+    inspector = inspect(engine)
+    return {
+        table: (
+            sorted(column["name"] for column in inspector.get_columns(table)),
+            sorted((index["name"], tuple(index["column_names"])) for index in inspector.get_indexes(table)),
+        )
+        for table in inspector.get_table_names() if table != "schema_migrations"
+    }
+
+
+def test_migrated_schema_matches_models():
+    with tempfile.TemporaryDirectory() as tmp:
+        migrated = create_engine(f"sqlite:///{os.path.join(tmp, 'migrated.db')}")
+        declared = create_engine(f"sqlite:///{os.path.join(tmp, 'declared.db')}")
+        assert migrations.upgrade(migrated) == [migration.version for migration in migrations.MIGRATIONS]
+        assert migrations.upgrade(migrated) == []
+        SQLModel.metadata.create_all(declared)
+        try:
+            assert schema_shape(migrated) == schema_shape(declared)
+        finally:
+            migrated.dispose()
+            declared.dispose()
+
+
+def test_concurrent_sqlite_upgrades_apply_each_migration_once():
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'concurrent.db')}"
+        start = threading.Barrier(UPGRADERS)
+        applied, errors = [], []
+
+        def upgrader():
+            # An engine per upgrader, as separate processes would have
+            engine = create_engine(url)
+            try:
+                start.wait()
+                applied.extend(migrations.upgrade(engine))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                engine.dispose()
+
+        threads = [threading.Thread(target=upgrader) for _ in range(UPGRADERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        assert sorted(applied) == [migration.version for migration in migrations.MIGRATIONS]
+        engine = create_engine(url)
+        with engine.connect() as connection:
+            versions = connection.execute(text("SELECT version FROM schema_migrations ORDER BY version")).scalars().all()
+        engine.dispose()
+        assert versions == [migration.version for migration in migrations.MIGRATIONS]
+
+
+def test_backfilled_previews_match_create_message():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'previews.db')}")
+        migrations.upgrade(engine, target=2)
+        content = "Buy milk\n\n  and   eggs " + "x" * 300
+        with engine.begin() as connection:
+            connection.execute(text("INSERT INTO users (id, email, hashed_password, name) VALUES (1, 'p@example.com', 'x', 'p')"))
+            connection.execute(text("INSERT INTO conversations (id, user_id, title) VALUES (1, 1, 'c')"))
+            connection.execute(text(
+                "INSERT INTO messages (conversation_id, user_id, role, content) VALUES (1, 1, 'user', :content), "
+                "(1, 1, 'assistant', '')"
+            ), {"content": content})
+        migrations.upgrade(engine)
+        with engine.connect() as connection:
+            preview = connection.execute(text("SELECT last_message_preview FROM conversations WHERE id = 1")).scalar()
+        engine.dispose()
+        assert preview == crud._message_preview(content)
+        assert preview.startswith("Buy milk and eggs x") and len(preview) == models.MESSAGE_PREVIEW_CHARS
+
+
+if __name__ == "__main__":
+    test_migrated_schema_matches_models()
+    test_concurrent_sqlite_upgrades_apply_each_migration_once()
+    test_backfilled_previews_match_create_message()
+    print("✅ Migrations build the declared schema, run once under concurrent upgrades and backfill previews")
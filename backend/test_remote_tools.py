@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Test for chat turns whose tools run on a remote MCP server.
+
+The remote server writes to the shared database from another process, so
+its task cache versions are not this process's. A stand-in client writes
+the task directly (as that process would) and the test checks that the
+task list read right after the chat turn includes it instead of serving
+the list cached before the turn.
+
+Uses a throwaway SQLite file.
+"""
+import asyncio
+import json
+import os
+import tempfile
+from types import SimpleNamespace
+
+from sqlalchemy import text
+from sqlmodel import SQLModel, Session, create_engine
+
+import chat_handler
+import crud
+import models  # noqa: F401  # registers the Phase III tables
+from chat_handler import ChatHandler
+from database import User
+
+# High ID so the shared task cache holds nothing else for this user
+USER_ID = 920_000
+
+
+class FakeRemoteTools:
+    """Stands in for RemoteToolClient: add_task writes without touching this process's cache."""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    async def call_tool(self, name, arguments, user_id):
+        assert name == "add_task", name
+        with self.engine.begin() as connection:
+            task_id = connection.execute(
+                text("INSERT INTO tasks (title, description, completed, priority, starred, user_id, created_at, updated_at) "
+                     "VALUES (:title, '', 0, 'medium', 0, :user_id, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"),
+                {"title": arguments["title"], "user_id": user_id},
+            ).lastrowid
+        result = {"success": True, "task_id": task_id, "title": arguments["title"], "status": "created"}
+        return [SimpleNamespace(type="text", text=json.dumps(result))]
+
+
+def test_task_list_fresh_after_remote_add():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'remote.db')}")
+        SQLModel.metadata.create_all(engine)
+        original = chat_handler.remote_tools
+        chat_handler.remote_tools = FakeRemoteTools(engine)
+        try:
+            with Session(engine) as db:
+                db.add(User(id=USER_ID, email="remote@example.com", hashed_password="x", name="remote"))
+                db.commit()
+                # Cache the (empty) list, as a GET /api/{user_id}/tasks before the turn would
+                assert crud.get_tasks(db, USER_ID) == []
+
+                reply, _, _ = asyncio.run(ChatHandler(db, USER_ID).process_message("add task remote bread"))
+                assert reply.startswith("Task added"), reply
+
+                assert [task.title for task in crud.get_tasks(db, USER_ID)] == ["remote bread"]
+        finally:
+            chat_handler.remote_tools = original
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    test_task_list_fresh_after_remote_add()
+    print("✅ Task lists are fresh right after a remote tool writes")
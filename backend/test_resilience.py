@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Tests for upstream resilience (resilience.py).
+
+- the circuit breaker moves closed -> open -> half open, lets exactly one
+  probe through, and closes or reopens on the probe's outcome
+- is_transient_error retries timeouts, connection drops, 429 and 5xx only
+- backoff_delay stays within [0, min(max_delay, base * 2^attempt)]
+- call_with_resilience retries transient errors, gives up after
+  max_retries and fails fast while the breaker is open
+"""
+import asyncio
+import time
+
+from google.api_core import exceptions as google_exceptions
+
+from resilience import CircuitBreaker, CircuitOpenError, backoff_delay, call_with_resilience, is_transient_error
+
+RESET_TIMEOUT = 0.05
+
+
+def test_breaker_states():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=RESET_TIMEOUT)
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and breaker.is_open
+    assert not breaker.allow_request()
+
+    time.sleep(RESET_TIMEOUT * 1.5)
+    assert breaker.state == CircuitBreaker.HALF_OPEN and not breaker.is_open
+    assert breaker.allow_request()
+    # Only one probe at a time
+    assert not breaker.allow_request()
+
+    # A failed probe reopens at once, without counting up to the threshold
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow_request()
+
+    time.sleep(RESET_TIMEOUT * 1.5)
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.snapshot() == {"state": CircuitBreaker.CLOSED, "consecutive_failures": 0}
+
+
+def test_released_probe_can_be_retried():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=RESET_TIMEOUT)
+    breaker.record_failure()
+    time.sleep(RESET_TIMEOUT * 1.5)
+    assert breaker.allow_request()
+    breaker.release_probe()
+    assert breaker.allow_request()
+
+
+def test_transient_error_classification():
+    for error in [
+        asyncio.TimeoutError(),
+        ConnectionResetError(),
+        google_exceptions.TooManyRequests("slow down"),
+        google_exceptions.ResourceExhausted("quota"),
+        google_exceptions.ServiceUnavailable("down"),
+        google_exceptions.InternalServerError("oops"),
+    ]:
+        assert is_transient_error(error), error
+    for error in [
+        google_exceptions.InvalidArgument("bad request"),
+        google_exceptions.PermissionDenied("no key"),
+        ValueError("bug"),
+    ]:
+        assert not is_transient_error(error), error
+
+
+def test_backoff_jitter_bounds():
+    for attempt in range(6):
+        cap = min(1.0, 0.1 * 2 ** attempt)
+        delays = [backoff_delay(attempt, 0.1, 1.0) for _ in range(200)]
+        assert all(0 <= delay <= cap for delay in delays), (attempt, max(delays))
+        # Full jitter: delays spread over the range rather than sitting at the cap
+        assert min(delays) < cap / 2 < max(delays)
+
+
+class Upstream:
+    """Fails with the given errors in turn, then answers."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def call(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def call(upstream, breaker, max_retries=2):
+    return asyncio.run(call_with_resilience(
+        upstream.call, breaker, max_retries=max_retries, base_delay=0.001, max_delay=0.01, attempt_timeout=1,
+    ))
+
+
+def test_call_with_resilience():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=60)
+
+    upstream = Upstream(google_exceptions.ServiceUnavailable("down"), asyncio.TimeoutError())
+    assert call(upstream, breaker) == "ok" and upstream.calls == 3
+
+    # Not retried, and the upstream answering keeps the breaker closed
+    upstream = Upstream(google_exceptions.InvalidArgument("bad request"))
+    try:
+        call(upstream, breaker)
+        assert False, "InvalidArgument was swallowed"
+    except google_exceptions.InvalidArgument:
+        pass
+    assert upstream.calls == 1 and breaker.state == CircuitBreaker.CLOSED
+
+    upstream = Upstream(*[ConnectionError()] * 3)
+    try:
+        call(upstream, breaker)
+        assert False, "retries were not exhausted"
+    except ConnectionError:
+        pass
+    assert upstream.calls == 3 and breaker.state == CircuitBreaker.OPEN
+
+    upstream = Upstream()
+    try:
+        call(upstream, breaker)
+        assert False, "open breaker let a call through"
+    except CircuitOpenError:
+        pass
+    assert upstream.calls == 0
+
+
+if __name__ == "__main__":
+    test_breaker_states()
+    test_released_probe_can_be_retried()
+    test_transient_error_classification()
+    test_backoff_jitter_bounds()
+    test_call_with_resilience()
+    print("✅ Breaker transitions, retry classification and backoff jitter behave as specified")
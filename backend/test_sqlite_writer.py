@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Tests for the SQLite write queue (sqlite_writer.py).
+
+Queues several writes behind a slow one so they are group-committed
+together, with one of them failing, and checks that:
+- the failing write gets its own error and the others still commit
+- after_commit callbacks run only for committed writes
+- readers are not blocked while the writer holds the write lock (WAL)
+- a fast-path chat turn's tool write runs on the writer thread, not on
+  the event loop
+
+Uses a throwaway SQLite file.
+"""
+import asyncio
+import os
+import tempfile
+import threading
+
+from sqlalchemy import event, text
+from sqlmodel import SQLModel, Session, create_engine, select
+
+import chat_handler
+import crud
+import models  # noqa: F401  # registers the Phase III tables
+from chat_handler import ChatHandler
+from database import Task, User
+from models import TaskToolInput
+from sqlite_writer import SQLiteWriteQueue, after_commit
+
+USER_ID = 1
+
+
+def test_group_commit_isolates_failures_and_defers_callbacks():
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'writer.db')}"
+        engine = create_engine(url)
+        SQLModel.metadata.create_all(engine)
+        writer = SQLiteWriteQueue(url, enabled=True, batch_size=64, batch_wait_seconds=0)
+        in_first_write, release_first_write = threading.Event(), threading.Event()
+        committed = []
+
+        def slow_write(db):
+            in_first_write.set()
+            release_first_write.wait(5)
+            return crud.create_task(db, TaskToolInput(title="first"), USER_ID)
+
+        def write_task(db, title):
+            task = crud.create_task(db, TaskToolInput(title=title), USER_ID)
+            after_commit(committed.append, title)
+            return task
+
+        def failing_write(db):
+            crud.create_task(db, TaskToolInput(title="rolled back"), USER_ID)
+            after_commit(committed.append, "rolled back")
+            raise ValueError("boom")
+
+        try:
+            first = writer.submit(slow_write)
+            assert in_first_write.wait(5)
+
+            # The writer holds the write lock; WAL readers still get through
+            with Session(create_engine(url)) as reader:
+                assert reader.exec(text("PRAGMA journal_mode")).scalar() == "wal"
+                assert reader.exec(select(Task)).all() == []
+
+            queued = [writer.submit(write_task, f"task {i}") for i in range(3)]
+            failing = writer.submit(failing_write)
+            queued.append(writer.submit(write_task, "task 3"))
+            release_first_write.set()
+
+            assert first.result(5).title == "first"
+            assert [future.result(5).title for future in queued] == [f"task {i}" for i in range(4)]
+            try:
+                failing.result(5)
+                raise AssertionError("the failing write should raise")
+            except ValueError as e:
+                assert str(e) == "boom"
+        finally:
+            writer.stop()
+
+        assert committed == [f"task {i}" for i in range(4)]
+        with Session(engine) as db:
+            titles = sorted(task.title for task in db.exec(select(Task)).all())
+        assert titles == ["first"] + [f"task {i}" for i in range(4)]
+        engine.dispose()
+
+
+def test_chat_tool_writes_go_through_the_writer():
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'chat.db')}"
+        engine = create_engine(url, connect_args={"check_same_thread": False})
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as db:
+            db.add(User(id=USER_ID, email="writer@example.com", hashed_password="x", name="writer"))
+            db.commit()
+        writer = SQLiteWriteQueue(url, enabled=True, batch_size=64, batch_wait_seconds=0)
+        task_inserts = []
+
+        def on_statement(conn, cursor, statement, *args):
+            if statement.startswith("INSERT INTO tasks"):
+                task_inserts.append(threading.current_thread().name)
+
+        event.listen(engine, "before_cursor_execute", on_statement)
+        original = chat_handler.engine, chat_handler.sqlite_writer
+        chat_handler.engine, chat_handler.sqlite_writer = engine, writer
+        try:
+            writer.start()
+            event.listen(writer._engine, "before_cursor_execute", on_statement)
+            reply, _, _ = asyncio.run(ChatHandler(None, USER_ID).process_message("add task buy bread"))
+        finally:
+            chat_handler.engine, chat_handler.sqlite_writer = original
+            writer.stop()
+
+        assert reply.startswith("Task added"), reply
+        assert task_inserts == ["sqlite-writer"], task_inserts
+        with Session(engine) as db:
+            assert [task.title for task in db.exec(select(Task)).all()] == ["buy bread"]
+        engine.dispose()
+
+
+def test_after_commit_runs_immediately_outside_the_writer():
+    called = []
+    after_commit(called.append, 1)
+    assert called == [1]
+
+
+if __name__ == "__main__":
+    test_group_commit_isolates_failures_and_defers_callbacks()
+    test_chat_tool_writes_go_through_the_writer()
+    test_after_commit_runs_immediately_outside_the_writer()
+    print("✅ Write queue isolates failed writes, defers cache updates, lets readers through and takes chat tool writes")
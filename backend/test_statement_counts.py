@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Statement-count regression test for the hot write paths.
+
+Runs each CRUD operation, tool handler and chat turn against a throwaway
+SQLite database and asserts how many SQL statements (and SELECTs) and
+commits it issues, so extra SELECTs, refreshes or commits show up as
+failures.
+"""
+import asyncio
+import os
+import tempfile
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlmodel import SQLModel, Session, create_engine, select
+
+import chat_handler
+import crud
+import models  # noqa: F401  # registers the Phase III tables
+from chat_handler import ChatHandler
+from database import User
+from history_cache import history_cache
+from models import Message, TaskToolInput
+from tool_registry import run_tool
+
+USER_ID = 1
+
+
+class StatementCounter:
+    """Counts SQL statements and commits issued on an engine."""
+
+    def __init__(self, engine):
+        self.statements = []
+        self.commits = 0
+        event.listen(engine, "before_cursor_execute", self._on_statement)
+        event.listen(engine, "commit", self._on_commit)
+
+    def _on_statement(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(" ".join(statement.split()))
+
+    def _on_commit(self, conn):
+        self.commits += 1
+
+    def selects(self, table=None):
+        return [s for s in self.statements if s.startswith("SELECT") and (table is None or f"FROM {table} " in s + " ")]
+
+    @contextmanager
+    def expect(self, label, statements, commits, selects=None, conversation_selects=None):
+        self.statements, self.commits = [], 0
+        yield
+        kinds = [s.split()[0] for s in self.statements]
+        assert len(self.statements) == statements and self.commits == commits, (
+            f"{label}: {len(self.statements)} statements {kinds} and {self.commits} commits, "
+            f"expected {statements} and {commits}"
+        )
+        if selects is not None:
+            assert len(self.selects()) == selects, (label, self.selects())
+        if conversation_selects is not None:
+            assert len(self.selects("conversations")) == conversation_selects, (label, self.selects("conversations"))
+
+
+async def scripted_model(user_id, user_input, history=None, preformatted=False, conversation_id=None):
+    """Stands in for Gemini: asks for list_tasks, then answers."""
+    if user_input:
+        return {"content": "", "tool_calls": [{"name": "list_tasks", "arguments": {}}]}
+    return {"content": "Here they are.", "tool_calls": [], "error": None}
+
+
+def run_checks(engine, counter):
+    with Session(engine) as db:
+        with counter.expect("create_task", statements=1, commits=1):
+            task = crud.create_task(db, TaskToolInput(title="milk"), USER_ID)
+        with counter.expect("reading a created task", statements=0, commits=0):
+            assert task.title == "milk" and task.id
+
+        with counter.expect("update_task", statements=1, commits=1):
+            task = crud.update_task(db, task.id, TaskToolInput(title="oat milk", priority=None), USER_ID)
+        with counter.expect("reading an updated task", statements=0, commits=0):
+            assert task.title == "oat milk" and task.priority == "medium"
+        with counter.expect("update_task on another user's task", statements=1, commits=1):
+            assert crud.update_task(db, task.id, TaskToolInput(title="x"), USER_ID + 1) is None
+
+        with counter.expect("toggle_task_completion", statements=1, commits=1):
+            assert crud.toggle_task_completion(db, task.id, USER_ID).completed is True
+
+        with counter.expect("complete_task tool", statements=1, commits=1):
+            assert run_tool(db, USER_ID, "complete_task", {"task_id": task.id})["success"]
+        with counter.expect("update_task tool", statements=1, commits=1):
+            assert run_tool(db, USER_ID, "update_task", {"task_id": task.id, "priority": "high"})["success"]
+        with counter.expect("delete_task tool", statements=1, commits=1):
+            assert run_tool(db, USER_ID, "delete_task", {"task_id": task.id})["title"] == "oat milk"
+        with counter.expect("delete_task tool, missing task", statements=1, commits=1):
+            assert not run_tool(db, USER_ID, "delete_task", {"task_id": task.id})["success"]
+
+        other = crud.create_task(db, TaskToolInput(title="eggs"), USER_ID)
+        with counter.expect("delete_task", statements=1, commits=1):
+            assert crud.delete_task(db, other.id, USER_ID) is True
+
+        with counter.expect("create_conversation", statements=1, commits=1):
+            conversation = crud.create_conversation(db, USER_ID)
+        with counter.expect("create_message", statements=2, commits=1):
+            message = crud.create_message(db, conversation.id, USER_ID, "user", "hello")
+        with counter.expect("reading a created message", statements=0, commits=0):
+            assert message.id and message.content == "hello"
+        with counter.expect("update_conversation_title", statements=1, commits=1):
+            assert crud.update_conversation_title(db, conversation.id, USER_ID, "Hi").title == "Hi"
+
+        # The conversation is already known to this session, so the turn is
+        # user message, tool call message, tool, tool result message and
+        # final reply: 2 + 2 + 1 + 2 + 2 statements, no SELECT
+        handler = ChatHandler(db, USER_ID)
+        with counter.expect("fast-path chat turn", statements=9, commits=5, selects=0):
+            reply, _, _ = asyncio.run(handler.process_message("add task buy bread", conversation.id))
+        assert reply.startswith("Task added"), reply
+
+    # Each new session is a new request and checks ownership once
+    with Session(engine) as db:
+        with counter.expect("messages endpoint", statements=2, commits=0, conversation_selects=1):
+            assert crud.get_conversation(db, conversation.id, USER_ID)
+            assert crud.get_conversation_messages(db, conversation.id, USER_ID)
+        with counter.expect("another user's conversation", statements=1, commits=0, conversation_selects=1):
+            assert crud.get_conversation(db, conversation.id, USER_ID + 1) is None
+
+    # Agent turn with a history cache miss and a model-formatted tool:
+    # conversation, summary, messages and tasks are each selected once, plus
+    # the message count checked by both history reads (miss, then hit)
+    history_cache.invalidate(conversation.id)
+    original_model, chat_handler.run_agent = chat_handler.run_agent, scripted_model
+    try:
+        with Session(engine) as db:
+            handler = ChatHandler(db, USER_ID)
+            with counter.expect("agent chat turn", statements=14, commits=4, selects=6, conversation_selects=3):
+                reply, _, _ = asyncio.run(handler.process_message("what is on my list?", conversation.id))
+            assert reply == "Here they are.", reply
+    finally:
+        chat_handler.run_agent = original_model
+
+    # Deleting forgets the memoized conversation
+    with Session(engine) as db:
+        assert crud.get_conversation(db, conversation.id, USER_ID)
+        with counter.expect("delete_conversation", statements=3, commits=1, selects=0):
+            assert crud.delete_conversation(db, conversation.id, USER_ID)
+        with counter.expect("messages of a deleted conversation", statements=1, commits=0):
+            assert db.exec(select(Message).where(Message.conversation_id == conversation.id)).all() == []
+        with counter.expect("deleted conversation", statements=1, commits=0, conversation_selects=1):
+            assert crud.get_conversation(db, conversation.id, USER_ID) is None
+
+
+def test_write_paths_statement_counts():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'counts.db')}")
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as db:
+            db.add(User(id=USER_ID, email="counts@example.com", hashed_password="x", name="counts"))
+            db.commit()
+        counter = StatementCounter(engine)
+        try:
+            run_checks(engine, counter)
+        finally:
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    test_write_paths_statement_counts()
+    print("✅ Statement counts match for CRUD writes, tool handlers and chat turns")
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Test for the rolling summary trigger (summarizer.py).
+
+Checks that a conversation under SUMMARY_TRIGGER_MESSAGES is turned down
+from its stored message counters, without selecting its messages.
+
+Uses a throwaway, migrated SQLite database (see testing_db.py).
+"""
+import asyncio
+
+from sqlalchemy import event
+from sqlmodel import Session
+
+import crud
+import summarizer
+from database import settings
+from testing_db import throwaway_database
+
+USER_ID = 1
+
+
+def test_short_conversation_is_not_loaded():
+    with throwaway_database([USER_ID], write_queue=False) as (engine, _):
+        original_engine = summarizer.engine
+        summarizer.engine = engine
+        try:
+            with Session(engine) as db:
+                conversation = crud.create_conversation(db, USER_ID)
+                for i in range(settings.SUMMARY_TRIGGER_MESSAGES):
+                    crud.create_message(db, conversation.id, USER_ID, "user", f"message {i}")
+
+            statements = []
+            event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+            assert asyncio.run(summarizer.maybe_summarize_conversation(conversation.id, USER_ID)) is False
+            assert statements and not any("FROM messages" in statement for statement in statements), statements
+        finally:
+            summarizer.engine = original_engine
+
+
+if __name__ == "__main__":
+    test_short_conversation_is_not_loaded()
+    print("✅ Conversations under the summary threshold are not loaded")
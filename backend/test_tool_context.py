@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Concurrency stress test for per-request MCP tool context.
+
+Runs tool calls for several hundred simulated users at the same time, both
+through the MCP call_tool entry point (tool_context) and through
+ChatHandler's parallel executor (worker threads), then checks that every
+task ended up with the user that created it.
+
+Uses a throwaway, migrated SQLite database (see testing_db.py).
+"""
+import asyncio
+import json
+import random
+
+from sqlmodel import Session, select
+
+from chat_handler import ChatHandler
+from database import Task
+from mcp_server import call_tool, tool_context
+from testing_db import throwaway_database
+
+USERS = 300
+CALLS_PER_USER = 3
+FIRST_USER_ID = 1
+
+
+async def run_as_user_via_context(user_id: int):
+    """Tool calls through call_tool, yielding to other users between steps."""
+    titles = []
+    with tool_context(user_id):
+        for i in range(CALLS_PER_USER):
+            await asyncio.sleep(random.random() / 100)
+            title = f"ctx-{user_id}-{i}"
+            result = await call_tool("add_task", {"title": title})
+            assert json.loads(result[0].text)["success"], result[0].text
+            titles.append(title)
+        await asyncio.sleep(random.random() / 100)
+        listed = json.loads((await call_tool("list_tasks", {}))[0].text)["tasks"]
+    return user_id, titles, [task["title"] for task in listed]
+
+
+async def run_as_user_via_handler(user_id: int):
+    """Several tool calls in one turn, executed on worker threads."""
+    handler = ChatHandler(None, user_id)
+    titles = [f"handler-{user_id}-{i}" for i in range(CALLS_PER_USER)]
+    calls = [{"name": "add_task", "arguments": {"title": title}} for title in titles]
+    results = await handler._execute_tool_calls(calls)
+    assert all(r["result"].get("success") for r in results), results
+    return user_id, titles, None
+
+
+async def stress():
+    user_ids = range(FIRST_USER_ID, FIRST_USER_ID + USERS)
+    jobs = [run_as_user_via_context(u) if u % 2 else run_as_user_via_handler(u) for u in user_ids]
+    return await asyncio.gather(*jobs)
+
+
+def test_tool_calls_never_cross_users():
+    user_ids = range(FIRST_USER_ID, FIRST_USER_ID + USERS)
+    with throwaway_database(user_ids) as (engine, _):
+        outcomes = asyncio.run(stress())
+
+        for user_id, titles, listed in outcomes:
+            if listed is not None:
+                # list_tasks ran as this user and saw only this user's tasks
+                assert sorted(listed) == sorted(titles), (user_id, listed)
+
+        with Session(engine) as db:
+            tasks = db.exec(select(Task)).all()
+    assert len(tasks) == USERS * CALLS_PER_USER
+    for task in tasks:
+        owner = int(task.title.split("-")[1])
+        assert task.user_id == owner, f"task {task.title!r} stored for user {task.user_id}"
+
+
+if __name__ == "__main__":
+    test_tool_calls_never_cross_users()
+    print(f"✅ {USERS} concurrent users x {CALLS_PER_USER} tool calls: no cross-user tool calls")
@@ -0,0 +1,63 @@
+"""
+Throwaway database for the tests that drive ChatHandler and the MCP tools
+end to end.
+
+throwaway_database() creates a file-backed SQLite database in a temporary
+directory, applies the migrations, seeds the given users and points the
+modules that open their own sessions (database.get_db, ChatHandler's
+phases and its write queue) at it for the duration of the block, so the
+tests never touch DATABASE_URL. The task and history caches are cleared
+on the way in and out.
+"""
+
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Tuple
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+import chat_handler
+import database
+from database import User, apply_sqlite_pragmas, settings, sqlite_engine_options
+from history_cache import history_cache
+from migrations import upgrade
+from sqlite_writer import SQLiteWriteQueue
+from task_cache import task_cache
+
+
+@contextmanager
+def throwaway_database(user_ids: Iterable[int], write_queue: bool = True) -> Iterator[Tuple[Engine, SQLiteWriteQueue]]:
+    """Yield (engine, write queue) for a migrated SQLite file with the given users."""
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'test.db')}"
+        engine = create_engine(url, **sqlite_engine_options())
+        event.listen(engine, "connect", apply_sqlite_pragmas)
+        upgrade(engine)
+        with Session(engine) as db:
+            db.add_all([
+                User(id=user_id, email=f"user{user_id}@example.com", hashed_password="x", name=f"user {user_id}")
+                for user_id in user_ids
+            ])
+            db.commit()
+
+        writer = SQLiteWriteQueue(
+            url, enabled=write_queue,
+            batch_size=settings.SQLITE_WRITE_BATCH_SIZE,
+            batch_wait_seconds=settings.SQLITE_WRITE_BATCH_WAIT_MS / 1000,
+        )
+        original = database.engine, chat_handler.engine, chat_handler.sqlite_writer
+        database.engine, chat_handler.engine, chat_handler.sqlite_writer = engine, engine, writer
+        # Both caches are per process and keyed by IDs other databases reuse
+        task_cache.clear()
+        history_cache.clear()
+        try:
+            yield engine, writer
+        finally:
+            database.engine, chat_handler.engine, chat_handler.sqlite_writer = original
+            writer.stop()
+            engine.dispose()
+            task_cache.clear()
+            history_cache.clear()
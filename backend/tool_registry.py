@@ -0,0 +1,440 @@
+"""
+Phase III Task Tool Registry
+Single definition of the task management tools, built once at import.
+
+Each ToolSpec carries the tool's name, description, JSON input schema and
+handler. mcp_server builds its MCP Tool list from TOOLS and agent_tools
+builds the GenAI FunctionDeclarations from the same specs, so the two can
+no longer drift apart.
+
+Handlers take (db, user_id, arguments) and return the result as a plain
+dict. In-process callers use the dict as is; it is only serialized when it
+leaves the process (MCP transport) or is persisted with a message.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from crud import (
+    create_task,
+    create_tasks,
+    complete_tasks,
+    delete_tasks,
+    get_tasks_page,
+    update_task
+)
+from models import TaskToolInput
+
+VALID_PRIORITIES = ["low", "medium", "high"]
+MAX_BATCH_SIZE = 50
+LIST_PAGE_SIZE = 100
+
+ToolHandler = Callable[[Any, int, Dict[str, Any]], Dict[str, Any]]
+
+
+@dataclass(frozen=True)
+class ToolSpec:
+    """A task tool: what the model sees (name, description, schema) and what runs."""
+    name: str
+    description: str
+    input_schema: Dict[str, Any]
+    handler: ToolHandler
+    mutates: bool = True  # Writes tasks: queued on SQLite, and remote calls invalidate the local task cache
+
+
+def _error(message: str) -> Dict[str, Any]:
+    return {"success": False, "error": message}
+
+
+def handle_add_task(db, user_id: int, args: Dict[str, Any]) -> Dict[str, Any]:
+    """Handle add_task tool call."""
+    title = args.get("title")
+    if not title:
+        return _error("Title is required")
+    if len(title) > 255:
+        return _error("Title must be 255 characters or less")
+
+    description = args.get("description")
+    if description and len(description) > 1000:
+        return _error("Description must be 1000 characters or less")
+
+    priority = args.get("priority") or "medium"
+    if priority not in VALID_PRIORITIES:
+        return _error(f"Priority must be one of: {', '.join(VALID_PRIORITIES)}")
+
+    task_input = TaskToolInput(
+        title=title,
+        description=description,
+        completed=False,
+        priority=priority
+    )
+    task = create_task(db, task_input, user_id)
+
+    return {
+        "success": True,
+        "task_id": task.id,
+        "status": "created",
+        "title": task.title
+    }
+
+
+def handle_list_tasks(db, user_id: int, args: Dict[str, Any]) -> Dict[str, Any]:
+    """Handle list_tasks tool call."""
+    status_filter = args.get("status", "all")
+
+    if status_filter == "pending":
+        filter_completed = False
+    elif status_filter == "completed":
+        filter_completed = True
+    else:
+        filter_completed = None
+
+    try:
+        limit = min(max(int(args.get("limit") or LIST_PAGE_SIZE), 1), LIST_PAGE_SIZE)
+        tasks, next_cursor = get_tasks_page(db, user_id, limit=limit, cursor=args.get("cursor") or "",
+                                            filter_completed=filter_completed)
+    except (TypeError, ValueError) as e:
+        return _error(str(e))
+
+    task_list = [
+        {
+            "id": task.id,
+            "title": task.title,
+            "description": task.description,
+            "completed": task.completed,
+            "priority": task.priority
+        }
+        for task in tasks
+    ]
+    result = {
+        "success": True,
+        "tasks": task_list,
+        "count": len(task_list)
+    }
+    if next_cursor:
+        result["next_cursor"] = next_cursor
+    return result
+
+
+def handle_complete_task(db, user_id: int, args: Dict[str, Any]) -> Dict[str, Any]:
+    """Handle complete_task tool call."""
+    task_id = args.get("task_id")
+    if task_id is None:
+        return _error("task_id is required")
+
+    task = update_task(db, task_id, TaskToolInput(completed=True, priority=None), user_id)
+    if not task:
+        return _error(f"Task with ID {task_id} not found")
+
+    return {
+        "success": True,
+        "task_id": task.id,
+        "status": "completed",
+        "title": task.title
+    }
+
+
+def handle_delete_task(db, user_id: int, args: Dict[str, Any]) -> Dict[str, Any]:
+    """Handle delete_task tool call."""
+    task_id = args.get("task_id")
+    if task_id is None:
+        return _error("task_id is required")
+
+    # One DELETE ... RETURNING gives both ownership check and title
+    deleted = delete_tasks(db, [task_id], user_id)
+    if not deleted:
+        return _error(f"Task with ID {task_id} not found")
+
+    return {
+        "success": True,
+        "task_id": task_id,
+        "status": "deleted",
+        "title": deleted[0].title
+    }
+
+
+def handle_update_task(db, user_id: int, args: Dict[str, Any]) -> Dict[str, Any]:
+    """Handle update_task tool call."""
+    task_id = args.get("task_id")
+    if task_id is None:
+        return _error("task_id is required")
+
+    title = args.get("title")
+    if title and len(title) > 255:
+        return _error("Title must be 255 characters or less")
+
+    description = args.get("description")
+    if description and len(description) > 1000:
+        return _error("Description must be 1000 characters or less")
+
+    priority = args.get("priority")
+    if priority is not None and priority not in VALID_PRIORITIES:
+        return _error(f"Priority must be one of: {', '.join(VALID_PRIORITIES)}")
+
+    # priority=None leaves the stored priority untouched
+    task_input = TaskToolInput(
+        title=title,
+        description=description,
+        priority=priority
+    )
+    task = update_task(db, task_id, task_input, user_id)
+    if not task:
+        return _error(f"Task with ID {task_id} not found")
+
+    return {
+        "success": True,
+        "task_id": task.id,
+        "status": "updated",
+        "title": task.title
+    }
+
+
+def _batch_response(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """One result for a whole batch, with a result per item."""
+    failed = sum(1 for result in results if "error" in result)
+    return {
+        "success": failed == 0,
+        "results": results,
+        "succeeded": len(results) - failed,
+        "failed": failed
+    }
+
+
+def _parse_task_ids(args: Dict[str, Any]):
+    """Return (task_ids, None) or (None, error message) for the batch tools."""
+    task_ids = args.get("task_ids")
+    if not isinstance(task_ids, list) or not task_ids:
+        return None, "task_ids must be a non-empty list"
+    if len(task_ids) > MAX_BATCH_SIZE:
+        return None, f"At most {MAX_BATCH_SIZE} tasks per call"
+    try:
+        # Gemini sends numbers as floats; keep order, drop duplicates
+        return list(dict.fromkeys(int(task_id) for task_id in task_ids)), None
+    except (TypeError, ValueError):
+        return None, "task_ids must be integers"
+
+
+def handle_add_tasks(db, user_id: int, args: Dict[str, Any]) -> Dict[str, Any]:
+    """Handle add_tasks tool call."""
+    items = args.get("tasks")
+    if not isinstance(items, list) or not items:
+        return _error("tasks must be a non-empty list")
+    if len(items) > MAX_BATCH_SIZE:
+        return _error(f"At most {MAX_BATCH_SIZE} tasks per call")
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        item = item if isinstance(item, dict) else {}
+        title = item.get("title")
+        description = item.get("description")
+        priority = item.get("priority") or "medium"
+        if not title:
+            results[index] = {"error": "Title is required"}
+        elif len(title) > 255:
+            results[index] = {"title": title[:50], "error": "Title must be 255 characters or less"}
+        elif description and len(description) > 1000:
+            results[index] = {"title": title, "error": "Description must be 1000 characters or less"}
+        elif priority not in VALID_PRIORITIES:
+            results[index] = {"title": title, "error": f"Priority must be one of: {', '.join(VALID_PRIORITIES)}"}
+        else:
+            valid.append((index, TaskToolInput(title=title, description=description, completed=False, priority=priority)))
+
+    created = create_tasks(db, [task_input for _, task_input in valid], user_id)
+    for (index, _), row in zip(valid, created):
+        results[index] = {"task_id": row.id, "title": row.title, "status": "created"}
+    return _batch_response(results)
+
+
+def handle_complete_tasks(db, user_id: int, args: Dict[str, Any]) -> Dict[str, Any]:
+    """Handle complete_tasks tool call."""
+    task_ids, error = _parse_task_ids(args)
+    if error:
+        return _error(error)
+
+    completed = {row.id: row.title for row in complete_tasks(db, task_ids, user_id)}
+    return _batch_response([
+        {"task_id": task_id, "title": completed[task_id], "status": "completed"} if task_id in completed
+        else {"task_id": task_id, "error": f"Task with ID {task_id} not found"}
+        for task_id in task_ids
+    ])
+
+
+def handle_delete_tasks(db, user_id: int, args: Dict[str, Any]) -> Dict[str, Any]:
+    """Handle delete_tasks tool call."""
+    task_ids, error = _parse_task_ids(args)
+    if error:
+        return _error(error)
+
+    deleted = {row.id: row.title for row in delete_tasks(db, task_ids, user_id)}
+    return _batch_response([
+        {"task_id": task_id, "title": deleted[task_id], "status": "deleted"} if task_id in deleted
+        else {"task_id": task_id, "error": f"Task with ID {task_id} not found"}
+        for task_id in task_ids
+    ])
+
+
+_TITLE_SCHEMA = {
+    "type": "string",
+    "description": "Task title (required, 1-255 characters)"
+}
+_DESCRIPTION_SCHEMA = {
+    "type": "string",
+    "description": "Task description (optional, max 1000 characters)"
+}
+_PRIORITY_SCHEMA = {
+    "type": "string",
+    "enum": VALID_PRIORITIES,
+    "description": "Task priority (defaults to 'medium' if not specified)"
+}
+_NEW_TASK_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": _TITLE_SCHEMA,
+        "description": _DESCRIPTION_SCHEMA,
+        "priority": _PRIORITY_SCHEMA
+    },
+    "required": ["title"]
+}
+
+
+def _task_id_schema(description: str) -> Dict[str, Any]:
+    return {
+        "type": "object",
+        "properties": {
+            "task_id": {
+                "type": "integer",
+                "description": description
+            }
+        },
+        "required": ["task_id"]
+    }
+
+
+def _task_ids_schema(description: str) -> Dict[str, Any]:
+    return {
+        "type": "object",
+        "properties": {
+            "task_ids": {
+                "type": "array",
+                "items": {"type": "integer"},
+                "description": f"{description} (1-{MAX_BATCH_SIZE})"
+            }
+        },
+        "required": ["task_ids"]
+    }
+
+
+_SPECS = [
+    ToolSpec(
+        name="add_task",
+        description="Create a new task for the user. Use when the user wants to add a new todo item.",
+        input_schema=_NEW_TASK_SCHEMA,
+        handler=handle_add_task
+    ),
+    ToolSpec(
+        name="list_tasks",
+        description="Retrieve tasks from the list. Use when user asks to see, show, or list tasks.",
+        input_schema={
+            "type": "object",
+            "properties": {
+                "status": {
+                    "type": "string",
+                    "enum": ["all", "pending", "completed"],
+                    "description": "Filter tasks by status (defaults to 'all')"
+                },
+                "cursor": {
+                    "type": "string",
+                    "description": "next_cursor from a previous list_tasks result, to get the following page"
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": f"Tasks per page (1-{LIST_PAGE_SIZE}, defaults to {LIST_PAGE_SIZE})"
+                }
+            },
+            "required": []
+        },
+        handler=handle_list_tasks,
+        mutates=False
+    ),
+    ToolSpec(
+        name="complete_task",
+        description="Mark a task as complete. Use when user indicates a task is done.",
+        input_schema=_task_id_schema("The task ID to mark as completed"),
+        handler=handle_complete_task
+    ),
+    ToolSpec(
+        name="delete_task",
+        description="Remove a task from the list. Use when user wants to delete/remove/cancel a task.",
+        input_schema=_task_id_schema("The task ID to delete"),
+        handler=handle_delete_task
+    ),
+    ToolSpec(
+        name="update_task",
+        description="Modify task title, description or priority. Use when user wants to change/update/rename a task.",
+        input_schema={
+            "type": "object",
+            "properties": {
+                "task_id": {
+                    "type": "integer",
+                    "description": "The task ID to update"
+                },
+                "title": {
+                    "type": "string",
+                    "description": "New task title (optional)"
+                },
+                "description": {
+                    "type": "string",
+                    "description": "New task description (optional)"
+                },
+                "priority": {
+                    "type": "string",
+                    "enum": VALID_PRIORITIES,
+                    "description": "New task priority (optional)"
+                }
+            },
+            "required": ["task_id"]
+        },
+        handler=handle_update_task
+    ),
+    # Batch variants: one call, one commit and one result payload for several items
+    ToolSpec(
+        name="add_tasks",
+        description="Create several tasks at once. Use instead of repeated add_task calls when the user names more than one item.",
+        input_schema={
+            "type": "object",
+            "properties": {
+                "tasks": {
+                    "type": "array",
+                    "description": f"Tasks to create (1-{MAX_BATCH_SIZE})",
+                    "items": _NEW_TASK_SCHEMA
+                }
+            },
+            "required": ["tasks"]
+        },
+        handler=handle_add_tasks
+    ),
+    ToolSpec(
+        name="complete_tasks",
+        description="Mark several tasks as complete at once. Use instead of repeated complete_task calls.",
+        input_schema=_task_ids_schema("The task IDs to mark as completed"),
+        handler=handle_complete_tasks
+    ),
+    ToolSpec(
+        name="delete_tasks",
+        description="Remove several tasks at once. Use instead of repeated delete_task calls.",
+        input_schema=_task_ids_schema("The task IDs to delete"),
+        handler=handle_delete_tasks
+    ),
+]
+
+# Name -> spec, in the order the tools are offered to the model
+TOOLS: Dict[str, ToolSpec] = {spec.name: spec for spec in _SPECS}
+
+
+def run_tool(db, user_id: int, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """Run a tool in-process and return its result dict (no serialization)."""
+    spec = TOOLS.get(name)
+    if spec is None:
+        return _error(f"Unknown tool: {name}")
+    return spec.handler(db, user_id, arguments or {})
@@ -0,0 +1,146 @@
+"""
+Phase III LLM Usage Ledger
+Records every Gemini call (tokens, latency, tool calls, error class) in
+the llm_usage table.
+
+Calls only append to an in-memory buffer; a background task writes the
+buffer in batches every settings.USAGE_FLUSH_INTERVAL_SECONDS, or sooner
+once settings.USAGE_BATCH_SIZE rows are waiting, so accounting never adds
+a database round trip to a chat turn. Rows still buffered at shutdown are
+flushed by stop(). If the database is unavailable, rows are kept and
+retried, up to settings.USAGE_MAX_BUFFER rows. On SQLite the batch is one
+write on the group-committing writer (see sqlite_writer.py).
+"""
+
+import asyncio
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from sqlmodel import Session
+
+from database import engine, settings
+from metrics import metrics
+from models import LLMUsage
+from sqlite_writer import sqlite_writer
+
+logger = logging.getLogger(__name__)
+
+
+def _write_rows(db: Session, rows) -> None:
+    db.add_all(rows)
+    db.commit()
+
+
+class UsageLedger:
+    """Buffered, batch-written log of model calls."""
+
+    def __init__(self, flush_interval: float, batch_size: int, max_buffer: int):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._buffer = deque(maxlen=max_buffer)
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def record(
+        self,
+        user_id: int,
+        call_type: str,
+        model: Optional[str],
+        latency_seconds: float,
+        conversation_id: Optional[int] = None,
+        response: Any = None,
+        tool_calls: int = 0,
+        error: Optional[Exception] = None,
+    ) -> None:
+        """Buffer one model call. response may be any GenAI response with usage_metadata."""
+        usage = getattr(response, "usage_metadata", None)
+        row = LLMUsage(
+            user_id=user_id,
+            conversation_id=conversation_id,
+            call_type=call_type,
+            model=model,
+            prompt_tokens=getattr(usage, "prompt_token_count", 0) or 0,
+            output_tokens=getattr(usage, "candidates_token_count", 0) or 0,
+            total_tokens=getattr(usage, "total_token_count", 0) or 0,
+            latency_ms=latency_seconds * 1000,
+            tool_calls=tool_calls,
+            error_class=type(error).__name__ if error is not None else None,
+            created_at=datetime.now(timezone.utc),
+        )
+        with self._lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                metrics.increment("usage_ledger.dropped")
+            self._buffer.append(row)
+            pending = len(self._buffer)
+        wakeup, loop = self._wakeup, self._loop
+        if pending >= self.batch_size and wakeup is not None:
+            loop.call_soon_threadsafe(wakeup.set)
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def flush(self) -> int:
+        """Write all buffered rows in one transaction. Returns the number written."""
+        with self._lock:
+            rows = list(self._buffer)
+            self._buffer.clear()
+        if not rows:
+            return 0
+        try:
+            if sqlite_writer.enabled:
+                sqlite_writer.run(_write_rows, rows)
+            else:
+                with Session(engine) as db:
+                    _write_rows(db, rows)
+        except Exception as e:
+            logger.error(f"Failed to write {len(rows)} usage row(s); will retry: {e}")
+            with self._lock:
+                # Put them back in front of anything recorded meanwhile
+                self._buffer.extendleft(reversed(rows))
+            metrics.increment("usage_ledger.flush_errors")
+            return 0
+        metrics.increment("usage_ledger.rows_written", len(rows))
+        return len(rows)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await asyncio.to_thread(self.flush)
+
+    def start(self) -> None:
+        """Start the background writer on the running event loop."""
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background writer and flush what is left."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wakeup = None
+        await asyncio.to_thread(self.flush)
+
+
+usage_ledger = UsageLedger(
+    flush_interval=settings.USAGE_FLUSH_INTERVAL_SECONDS,
+    batch_size=settings.USAGE_BATCH_SIZE,
+    max_buffer=settings.USAGE_MAX_BUFFER,
+)
+
+metrics.register_gauge("usage_ledger.pending", lambda: usage_ledger.pending)